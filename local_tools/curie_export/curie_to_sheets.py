@@ -409,9 +409,10 @@ def load_curie_results(
     # Get SQL query
     final_query = unified_query.replace("{analysis_name}", experiment_name)
 
-    # Execute query
-    snowhook = SnowflakeHook()
-    results_df = snowhook.query_snowflake(final_query, method='pandas')
+    # Execute query, streaming Arrow batches and converting to pandas once at the end
+    # (fetch_pandas_all holds every per-batch frame and their concatenation at once)
+    with SnowflakeHook() as snowhook:
+        results_df = snowhook.query_snowflake(final_query, method='batches').to_pandas()
 
     # Basic error checking
     if results_df.empty:
@@ -0,0 +1,227 @@
+"""
+Approximate nearest-neighbour (IVF) index over chunk embeddings
+
+A coarse k-means quantizer partitions the normalized BGE embeddings into inverted
+lists. A query only scores the rows of the ``nprobe`` closest lists, which gives the
+searcher a semantic candidate set independent of keyword matches.
+"""
+
+import json
+import os
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+try:
+    from .config import LOCAL_INDEX_DIR, ANN_NPROBE
+except ImportError:
+    from config import LOCAL_INDEX_DIR, ANN_NPROBE
+
+
+CENTROIDS_FILE = "ivf_centroids.npy"
+LIST_ROWS_FILE = "ivf_list_rows.npy"
+LIST_OFFSETS_FILE = "ivf_list_offsets.npy"
+ANN_META_FILE = "ivf_meta.json"
+INDEX_FILES = (CENTROIDS_FILE, LIST_ROWS_FILE, LIST_OFFSETS_FILE, ANN_META_FILE)
+
+
+class IVFIndex:
+    """Inverted-file ANN index; rows refer to rows of the LocalVectorIndex matrix"""
+
+    def __init__(self, index_dir: Optional[Path] = None):
+        self.index_dir = Path(index_dir or LOCAL_INDEX_DIR)
+        self.centroids: Optional[np.ndarray] = None
+        self.list_rows: Optional[np.ndarray] = None
+        self.list_offsets: Optional[np.ndarray] = None
+
+    @property
+    def is_loaded(self) -> bool:
+        return self.centroids is not None
+
+    @property
+    def n_lists(self) -> int:
+        return 0 if self.centroids is None else int(self.centroids.shape[0])
+
+    def build(self, embeddings: np.ndarray, n_lists: Optional[int] = None,
+              iterations: int = 20, seed: int = 42, row_offset: int = 0,
+              build_id: Optional[str] = None) -> bool:
+        """
+        Train the coarse quantizer and write inverted lists to disk
+
+        Args:
+            embeddings: Normalized embedding matrix (rows = chunks)
+            n_lists: Number of inverted lists (default: ~sqrt(number of chunks))
+            iterations: k-means iterations
+            seed: Random seed for centroid initialisation
+            row_offset: Added to stored rows, for a shard built on a slice of the full matrix
+            build_id: Build of the vector index this IVF belongs to (checked by ``load``)
+
+        Returns:
+            True if the index was written successfully, False otherwise
+        """
+        try:
+            matrix = np.asarray(embeddings, dtype=np.float32)
+            n_rows = matrix.shape[0]
+            if n_rows == 0:
+                print("No embeddings to build ANN index from")
+                return False
+
+            n_lists = max(1, min(n_lists or int(np.sqrt(n_rows)), n_rows))
+            centroids, assignments = self._spherical_kmeans(matrix, n_lists, iterations, seed)
+
+            # CSR layout: rows grouped by list, offsets[i]:offsets[i + 1] is list i
+            list_rows = np.argsort(assignments, kind='stable').astype(np.int64) + row_offset
+            counts = np.bincount(assignments, minlength=n_lists)
+            list_offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+
+            self.index_dir.mkdir(parents=True, exist_ok=True)
+            for file_name, array in ((CENTROIDS_FILE, centroids), (LIST_ROWS_FILE, list_rows),
+                                     (LIST_OFFSETS_FILE, list_offsets)):
+                tmp_path = (self.index_dir / file_name).with_suffix('.tmp.npy')
+                np.save(tmp_path, array)
+                os.replace(tmp_path, self.index_dir / file_name)
+
+            tmp_meta = (self.index_dir / ANN_META_FILE).with_suffix('.tmp.json')
+            with open(tmp_meta, 'w', encoding='utf-8') as f:
+                json.dump({'n_rows': int(n_rows), 'n_lists': int(n_lists), 'iterations': iterations,
+                           'row_offset': int(row_offset), 'build_id': build_id}, f)
+            os.replace(tmp_meta, self.index_dir / ANN_META_FILE)
+
+            print(f"Wrote IVF ANN index ({n_lists} lists over {n_rows} chunks) to {self.index_dir}")
+            return self.load(build_id=build_id, n_rows=n_rows)
+
+        except Exception as e:
+            print(f"Error building ANN index: {e}")
+            return False
+
+    @staticmethod
+    def _spherical_kmeans(matrix: np.ndarray, n_lists: int, iterations: int,
+                          seed: int) -> Tuple[np.ndarray, np.ndarray]:
+        """k-means on the unit sphere (cosine similarity), returns (centroids, assignments)"""
+        rng = np.random.default_rng(seed)
+        centroids = matrix[rng.choice(matrix.shape[0], size=n_lists, replace=False)].copy()
+        assignments = np.zeros(matrix.shape[0], dtype=np.int64)
+
+        for iteration in range(iterations):
+            new_assignments = np.argmax(matrix @ centroids.T, axis=1)
+            if iteration > 0 and np.array_equal(new_assignments, assignments):
+                break
+            assignments = new_assignments
+
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, matrix)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+
+            # Re-seed empty lists with random rows
+            empty = norms[:, 0] == 0
+            if empty.any():
+                sums[empty] = matrix[rng.choice(matrix.shape[0], size=int(empty.sum()), replace=False)]
+                norms[empty] = 1.0
+            centroids = sums / norms
+
+        return centroids.astype(np.float32), assignments
+
+    def load(self, build_id: Optional[str] = None, n_rows: Optional[int] = None) -> bool:
+        """
+        Load centroids and inverted lists
+
+        Args:
+            build_id: Reject an index trained for another build of the vector index
+            n_rows: Reject an index not trained over this many rows
+
+        Returns:
+            True if the index is available, False otherwise
+        """
+        paths = [self.index_dir / name for name in (CENTROIDS_FILE, LIST_ROWS_FILE, LIST_OFFSETS_FILE)]
+        if not all(path.exists() for path in paths):
+            return False
+
+        try:
+            meta_path = self.index_dir / ANN_META_FILE
+            meta = {}
+            if meta_path.exists():
+                with open(meta_path, 'r', encoding='utf-8') as f:
+                    meta = json.load(f)
+            if build_id is not None and meta.get('build_id') != build_id:
+                print(f"Ignoring ANN index in {self.index_dir}: built for another vector index build")
+                return False
+
+            centroids = np.load(paths[0])
+            list_rows = np.load(paths[1], mmap_mode='r')
+            list_offsets = np.load(paths[2])
+            if n_rows is not None and (meta.get('n_rows', len(list_rows)) != n_rows or len(list_rows) != n_rows):
+                print(f"Ignoring ANN index in {self.index_dir}: {len(list_rows)} rows, expected {n_rows}")
+                return False
+
+            self.centroids, self.list_rows, self.list_offsets = centroids, list_rows, list_offsets
+            return True
+        except Exception as e:
+            print(f"Error loading ANN index: {e}")
+            self.centroids = None
+            return False
+
+    def search(self, embeddings: np.ndarray, query_embedding: np.ndarray, k: int,
+               nprobe: int = ANN_NPROBE, row_mask: Optional[np.ndarray] = None,
+               row_range: Optional[Tuple[int, int]] = None) -> List[Tuple[int, float]]:
+        """
+        Approximate top-k rows by cosine similarity
+
+        Args:
+            embeddings: Normalized embedding matrix the index was built on
+            query_embedding: Query embedding vector
+            k: Number of neighbours to return
+            nprobe: Number of closest inverted lists to scan
+            row_mask: Optional boolean mask of eligible rows (e.g. category filter).
+                nprobe is widened until k eligible rows are found or all lists are scanned.
+            row_range: Optional (start, end) range of eligible rows (e.g. a team within a category shard)
+
+        Returns:
+            List of (row, similarity) tuples, best first
+        """
+        query_vec = np.asarray(query_embedding, dtype=np.float32)
+        query_norm = np.linalg.norm(query_vec)
+        if query_norm == 0:
+            return []
+        query_vec = query_vec / query_norm
+
+        rows = self.candidate_rows(query_vec, k, nprobe=nprobe, row_mask=row_mask, row_range=row_range)
+        if not len(rows):
+            return []
+
+        similarities = embeddings[rows] @ query_vec
+        top = np.argsort(-similarities)[:k]
+        return [(int(rows[i]), float(similarities[i])) for i in top]
+
+    def candidate_rows(self, query_vec: np.ndarray, k: int, nprobe: int = ANN_NPROBE,
+                       row_mask: Optional[np.ndarray] = None,
+                       row_range: Optional[Tuple[int, int]] = None) -> np.ndarray:
+        """
+        Eligible rows of the ``nprobe`` inverted lists closest to a normalized query
+
+        Lets callers score the probed rows themselves (e.g. on quantized codes). See
+        ``search`` for the arguments.
+
+        Returns:
+            Sorted row array (sequential access into the memory-mapped matrix)
+        """
+        if not self.is_loaded or k <= 0:
+            return np.empty(0, dtype=np.int64)
+
+        list_order = np.argsort(-(self.centroids @ query_vec))
+        nprobe = max(1, min(nprobe, self.n_lists))
+
+        while True:
+            probed = list_order[:nprobe]
+            rows = np.concatenate([
+                self.list_rows[self.list_offsets[i]:self.list_offsets[i + 1]] for i in probed
+            ])
+            if row_mask is not None and len(rows):
+                rows = rows[row_mask[rows]]
+            if row_range is not None and len(rows):
+                rows = rows[(rows >= row_range[0]) & (rows < row_range[1])]
+            if len(rows) >= k or nprobe >= self.n_lists:
+                break
+            nprobe = min(nprobe * 2, self.n_lists)
+
+        return np.sort(rows)
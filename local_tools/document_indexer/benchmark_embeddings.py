@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Parity check and throughput benchmark for the embedding backends
+
+Embeds the chunks of the local corpus with the PyTorch (sentence-transformers)
+backend and the int8 ONNX Runtime backend, reports per-chunk cosine similarity
+between the two, and texts/second for each backend.
+"""
+
+import sys
+import time
+import argparse
+from pathlib import Path
+
+import numpy as np
+
+# Add current directory to path for imports
+sys.path.insert(0, str(Path(__file__).parent))
+
+try:
+    from document_processor import DocumentProcessor
+    from embedding_generator import BGEEmbeddingGenerator
+    from config import EMBEDDING_NUM_THREADS
+except ImportError as e:
+    print(f"Import error: {e}")
+    print("Make sure you're running from the document_indexer directory")
+    sys.exit(1)
+
+
+PARITY_THRESHOLD = 0.99
+
+
+def encode_timed(generator, texts, repeats):
+    """Encode texts `repeats` times, returning (embeddings, best seconds)"""
+    best = float('inf')
+    embeddings = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        embeddings = generator.generate_embeddings(texts, show_progress_bar=False)
+        best = min(best, time.perf_counter() - start)
+    return embeddings, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare torch and ONNX int8 embedding backends')
+    parser.add_argument('--context-root', required=True,
+                       help='Root directory containing context folders')
+    parser.add_argument('--limit', type=int, default=0,
+                       help='Only embed the first N chunks (0 = all)')
+    parser.add_argument('--threads', type=int, default=EMBEDDING_NUM_THREADS,
+                       help='Inference threads for both backends (0 = library default)')
+    parser.add_argument('--repeats', type=int, default=1,
+                       help='Timed runs per backend (best run is reported)')
+
+    args = parser.parse_args()
+
+    chunks = DocumentProcessor(Path(args.context_root)).process_all_documents()
+    if args.limit:
+        chunks = chunks[:args.limit]
+    if not chunks:
+        print("❌ No documents found to embed")
+        return False
+
+    texts = [BGEEmbeddingGenerator.chunk_embedding_text(chunk) for chunk in chunks]
+    print(f"\n📄 Benchmarking {len(texts)} chunks ({sum(len(t) for t in texts) / len(texts):.0f} chars avg)")
+
+    results = {}
+    for backend in ("torch", "onnx"):
+        generator = BGEEmbeddingGenerator(use_cache=False, backend=backend, num_threads=args.threads)
+
+        start = time.perf_counter()
+        if not generator.load_model():
+            print(f"❌ Failed to load {backend} backend")
+            return False
+        load_seconds = time.perf_counter() - start
+
+        # Warm-up so one-off graph initialisation is not timed
+        generator.generate_embeddings(texts[:8], show_progress_bar=False)
+
+        embeddings, seconds = encode_timed(generator, texts, args.repeats)
+        if embeddings is None:
+            print(f"❌ {backend} backend failed to embed")
+            return False
+
+        results[backend] = np.asarray(embeddings, dtype=np.float32)
+        print(f"⚡ {backend:5s}: load {load_seconds:.1f}s, encode {seconds:.2f}s "
+              f"({len(texts) / seconds:.1f} chunks/s)")
+
+    # Both backends return normalized embeddings, so the row-wise dot product is the cosine
+    cosines = np.sum(results["torch"] * results["onnx"], axis=1)
+    print(f"\n📊 Cosine(torch, onnx int8): min {cosines.min():.4f}, "
+          f"p1 {np.percentile(cosines, 1):.4f}, mean {cosines.mean():.4f}")
+
+    if cosines.min() < PARITY_THRESHOLD:
+        worst = int(np.argmin(cosines))
+        print(f"❌ Parity check failed: {int((cosines < PARITY_THRESHOLD).sum())} chunks below "
+              f"{PARITY_THRESHOLD} (worst: {chunks[worst].get('relative_path')})")
+        return False
+
+    print(f"✅ Parity check passed (all chunks ≥ {PARITY_THRESHOLD})")
+    return True
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+End-to-end benchmark for hybrid document search
+
+Indexes the local corpus into a scratch directory (no Snowflake connection), then runs
+a labeled query set through ``DualTableHybridSearcher.search_documents_with_context`` under
+several configurations:
+
+- ``sql``: keyword scoring and embeddings in SQL, against a full local table mirror
+- ``local_bm25``: local inverted BM25 index, embeddings from the tables
+- ``local_ann``: local BM25, vector and ANN indexes (the production setup)
+- ``local_ann_bm25=X``: ``local_ann`` with other BM25 / embedding weights
+
+For each configuration it reports p50/p95 latency, recall@k and MRR over the distinct
+documents returned. ``--output`` saves the report; ``--baseline`` compares against a
+saved report and exits non-zero on latency or quality regressions.
+"""
+
+import sys
+import json
+import time
+import argparse
+from pathlib import Path
+
+import numpy as np
+
+# Add current directory to path for imports
+sys.path.insert(0, str(Path(__file__).parent))
+
+try:
+    from document_processor import DocumentProcessor
+    from embedding_generator import BGEEmbeddingGenerator
+    from dual_table_uploader import DualTableUploader
+    from dual_table_search import DualTableHybridSearcher
+    from bm25_index import InvertedBM25Index
+    from local_mirror import LocalMirror
+    from search_cache import SearchResultCache
+    from index_documents_dual import group_chunks_by_document, embed_chunks, update_local_indexes
+    from near_duplicates import mark_near_duplicates
+except ImportError as e:
+    print(f"Import error: {e}")
+    print("Make sure you're running from the document_indexer directory")
+    sys.exit(1)
+
+
+DEFAULT_QUERIES = Path(__file__).parent / "benchmark_queries.json"
+DEFAULT_OUTPUT_DIR = Path(__file__).parent / "benchmark_index"
+WEIGHT_VARIANTS = [(0.5, 0.5), (0.7, 0.3), (1.0, 0.0)]
+
+
+def load_queries(path):
+    """Labeled queries: [{"query": ..., "relevant": [relative_path, ...], "category": optional}]"""
+    with open(path, 'r', encoding='utf-8') as f:
+        queries = json.load(f)
+    return [query for query in queries if query.get('query') and query.get('relevant')]
+
+
+def build_benchmark_indexes(context_root, output_dir, embedding_generator):
+    """
+    Index the corpus twice into ``output_dir``: ``sql/`` holds only a table mirror with
+    embeddings (for the SQL path), ``local/`` the local indexes and a regular mirror
+
+    Returns:
+        Tuple of (sql mirror, local index dir), or None on failure
+    """
+    chunks = DocumentProcessor(Path(context_root)).process_all_documents()
+    if not chunks:
+        print("❌ No documents found to index")
+        return None
+
+    stats = mark_near_duplicates(chunks)
+    chunks = embed_chunks(embedding_generator, chunks)
+    if any('embedding' not in chunk for chunk in chunks):
+        print("❌ Failed to generate embeddings")
+        return None
+    documents_chunks = group_chunks_by_document(chunks)
+    print(f"📄 Indexed {len(documents_chunks)} documents, {len(chunks)} chunks "
+          f"({stats['duplicates']} near-duplicates)")
+
+    uploader = DualTableUploader()
+    sql_mirror = LocalMirror(output_dir / "sql", uploader.document_table, uploader.chunk_table,
+                             keep_embeddings=True)
+    document_records, chunk_records = uploader.prepare_records(documents_chunks)
+    if not sql_mirror.build(document_records, chunk_records):
+        return None
+
+    local_dir = output_dir / "local"
+    update_local_indexes(uploader, documents_chunks, local_dir)
+    return sql_mirror, local_dir
+
+
+def make_searchers(sql_mirror, local_dir, embedding_generator):
+    """Searcher per configuration (result caching disabled so every query is timed cold)"""
+    def searcher(mirror, index_dir, bm25_index=None):
+        return DualTableHybridSearcher(local_mirror=mirror, local_index_dir=index_dir, bm25_index=bm25_index,
+                                       embedding_generator=embedding_generator,
+                                       result_cache=SearchResultCache(max_size=0))
+
+    bm25_index = InvertedBM25Index(local_dir)
+    if not bm25_index.load():
+        print("⚠️  Local BM25 index missing, skipping local_bm25")
+        bm25_index = None
+
+    local_mirror = LocalMirror(local_dir, sql_mirror.document_table, sql_mirror.chunk_table)
+    configs = [("sql", searcher(sql_mirror, sql_mirror.index_dir), (0.3, 0.7))]
+    if bm25_index is not None:
+        configs.append(("local_bm25", searcher(sql_mirror, sql_mirror.index_dir, bm25_index), (0.3, 0.7)))
+    configs.append(("local_ann", searcher(local_mirror, local_dir), (0.3, 0.7)))
+    for weights in WEIGHT_VARIANTS:
+        configs.append((f"local_ann_bm25={weights[0]:g}", searcher(local_mirror, local_dir), weights))
+    return configs
+
+
+def evaluate(searcher, weights, queries, top_k, repeats):
+    """
+    Run every query ``repeats`` times (after one warm-up pass)
+
+    Returns:
+        Dict with latency percentiles (ms), recall@k and MRR
+    """
+    bm25_weight, embedding_weight = weights
+    latencies = []
+    recalls = []
+    reciprocal_ranks = []
+
+    for query in queries:
+        search = lambda: searcher.search_documents_with_context(
+            query['query'], category=query.get('category'), top_k=top_k,
+            bm25_weight=bm25_weight, embedding_weight=embedding_weight
+        )
+        results = search()
+        for _ in range(repeats):
+            start = time.perf_counter()
+            search()
+            latencies.append((time.perf_counter() - start) * 1000)
+
+        ranked = list(dict.fromkeys(result.get('relative_path') for result in results))[:top_k]
+        relevant = set(query['relevant'])
+        recalls.append(len(relevant.intersection(ranked)) / len(relevant))
+        rank = next((i + 1 for i, path in enumerate(ranked) if path in relevant), None)
+        reciprocal_ranks.append(1.0 / rank if rank else 0.0)
+
+    return {
+        'p50_ms': float(np.percentile(latencies, 50)),
+        'p95_ms': float(np.percentile(latencies, 95)),
+        f'recall@{top_k}': float(np.mean(recalls)),
+        'mrr': float(np.mean(reciprocal_ranks)),
+    }
+
+
+def check_regressions(report, baseline, max_latency_regression, max_quality_drop):
+    """Regressions of ``report`` against ``baseline`` (configurations present in both)"""
+    failures = []
+    for name, metrics in report['configs'].items():
+        previous = baseline.get('configs', {}).get(name)
+        if not previous:
+            continue
+        for metric in ('p50_ms', 'p95_ms'):
+            if metric in previous and metrics[metric] > previous[metric] * (1 + max_latency_regression):
+                failures.append(f"{name} {metric}: {previous[metric]:.1f} -> {metrics[metric]:.1f}")
+        for metric, value in metrics.items():
+            if metric.startswith('recall@') or metric == 'mrr':
+                if metric in previous and value < previous[metric] - max_quality_drop:
+                    failures.append(f"{name} {metric}: {previous[metric]:.3f} -> {value:.3f}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark hybrid search latency and quality offline')
+    parser.add_argument('--context-root', required=True,
+                       help='Root directory containing context folders')
+    parser.add_argument('--queries', default=str(DEFAULT_QUERIES),
+                       help='Labeled query set (JSON)')
+    parser.add_argument('--output-dir', default=str(DEFAULT_OUTPUT_DIR),
+                       help='Scratch directory for the benchmark indexes')
+    parser.add_argument('--top-k', type=int, default=5,
+                       help='Results per query (recall@k cutoff)')
+    parser.add_argument('--repeats', type=int, default=5,
+                       help='Timed runs per query')
+    parser.add_argument('--output',
+                       help='Write the report to this JSON file')
+    parser.add_argument('--baseline',
+                       help='Fail on regressions against this saved report')
+    parser.add_argument('--max-latency-regression', type=float, default=0.25,
+                       help='Allowed p50/p95 latency increase over the baseline (fraction)')
+    parser.add_argument('--max-quality-drop', type=float, default=0.02,
+                       help='Allowed absolute drop in recall@k / MRR from the baseline')
+
+    args = parser.parse_args()
+
+    queries = load_queries(args.queries)
+    if not queries:
+        print(f"❌ No labeled queries in {args.queries}")
+        return False
+
+    embedding_generator = BGEEmbeddingGenerator()
+    if not embedding_generator.load_model():
+        print("❌ Failed to load the embedding model")
+        return False
+
+    indexes = build_benchmark_indexes(args.context_root, Path(args.output_dir), embedding_generator)
+    if indexes is None:
+        return False
+
+    print(f"\n⏱️  {len(queries)} queries, top_k={args.top_k}, {args.repeats} timed runs each")
+    report = {'queries': len(queries), 'top_k': args.top_k, 'repeats': args.repeats, 'configs': {}}
+    for name, searcher, weights in make_searchers(*indexes, embedding_generator):
+        report['configs'][name] = dict(evaluate(searcher, weights, queries, args.top_k, args.repeats),
+                                       bm25_weight=weights[0], embedding_weight=weights[1])
+
+    recall_key = f'recall@{args.top_k}'
+    print(f"\n{'config':<22} {'p50 ms':>8} {'p95 ms':>8} {recall_key:>10} {'MRR':>6}")
+    for name, metrics in report['configs'].items():
+        print(f"{name:<22} {metrics['p50_ms']:>8.1f} {metrics['p95_ms']:>8.1f} "
+              f"{metrics[recall_key]:>10.3f} {metrics['mrr']:>6.3f}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"\n💾 Report written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        failures = check_regressions(report, baseline, args.max_latency_regression, args.max_quality_drop)
+        if failures:
+            print("\n❌ Regressions against baseline:")
+            for failure in failures:
+                print(f"  {failure}")
+            return False
+        print("\n✅ No regressions against baseline")
+
+    return True
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,296 @@
+"""
+Persisted inverted BM25 index over chunk tokens
+
+Built at index time from the ``bm25_tokens`` produced by ``DocumentProcessor`` and
+queried locally, replacing the per-search ``REGEXP_COUNT`` scan in Snowflake with
+Okapi BM25 (IDF weighting and document length normalization).
+
+Rows are clustered by category and team (see ``index_shards``) and each postings
+list is sorted by row, so a filtered search only reads the slice of every postings
+list that falls inside its shard. IDF stays global, so scores match an unsharded index.
+"""
+
+import json
+import os
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+try:
+    from .index_shards import ShardMap, cluster_order
+    from .config import LOCAL_INDEX_DIR, BM25_K1, BM25_B
+except ImportError:
+    from index_shards import ShardMap, cluster_order
+    from config import LOCAL_INDEX_DIR, BM25_K1, BM25_B
+
+
+POSTINGS_FILE = "bm25_postings.npz"
+BM25_META_FILE = "bm25_meta.json"
+
+
+class InvertedBM25Index:
+    """Inverted index (CSR postings lists, document frequencies, length norms) keyed by chunk_id"""
+
+    def __init__(self, index_dir: Optional[Path] = None, k1: float = BM25_K1, b: float = BM25_B):
+        self.index_dir = Path(index_dir or LOCAL_INDEX_DIR)
+        self.k1 = k1
+        self.b = b
+        self.chunk_ids: List[str] = []
+        self.categories: List[Optional[str]] = []
+        self.subcategories: List[Optional[str]] = []
+        self.document_ids: List[Optional[str]] = []
+        self.term_to_id: Dict[str, int] = {}
+        self.posting_offsets: Optional[np.ndarray] = None
+        self.posting_rows: Optional[np.ndarray] = None
+        self.posting_tfs: Optional[np.ndarray] = None
+        self.doc_lengths: Optional[np.ndarray] = None
+        self.avg_doc_length = 0.0
+        self.shard_map: Optional[ShardMap] = None
+
+    @property
+    def is_loaded(self) -> bool:
+        return self.posting_offsets is not None
+
+    def build(self, chunk_ids: Sequence[str], chunk_tokens: Sequence[Sequence[str]],
+              categories: Optional[Sequence[Optional[str]]] = None,
+              subcategories: Optional[Sequence[Optional[str]]] = None,
+              document_ids: Optional[Sequence[Optional[str]]] = None) -> bool:
+        """
+        Build postings lists from tokenized chunks and write them to disk
+
+        Args:
+            chunk_ids: Chunk IDs (same IDs as the CHUNK_ID column in Snowflake)
+            chunk_tokens: BM25 tokens per chunk, in the same order
+            categories: Optional document category per chunk
+            subcategories: Optional document subcategory per chunk
+            document_ids: Optional document ID per chunk (required for incremental updates)
+
+        Returns:
+            True if the index was written successfully, False otherwise
+        """
+        if not chunk_ids or len(chunk_ids) != len(chunk_tokens):
+            print(f"Cannot build BM25 index: {len(chunk_ids)} chunk ids vs {len(chunk_tokens)} token lists")
+            return False
+
+        return self._write(chunk_ids, [Counter(tokens) for tokens in chunk_tokens],
+                           categories, subcategories, document_ids)
+
+    def update(self, remove_document_ids: Sequence[str], chunk_ids: Sequence[str],
+               chunk_tokens: Sequence[Sequence[str]], categories: Sequence[Optional[str]],
+               subcategories: Sequence[Optional[str]], document_ids: Sequence[str]) -> bool:
+        """
+        Incrementally replace documents in an existing index
+
+        Term counts of unchanged chunks are recovered from the postings lists, so
+        only the new chunks need to be tokenized.
+
+        Args:
+            remove_document_ids: Documents that were changed or deleted
+            chunk_ids: New chunk IDs to add
+            chunk_tokens: BM25 tokens per new chunk
+            categories: Document category per new chunk
+            subcategories: Document subcategory per new chunk
+            document_ids: Document ID per new chunk
+
+        Returns:
+            True if the index was updated, False if it must be rebuilt from scratch
+        """
+        if not self.is_loaded and not self.load():
+            print("No existing BM25 index to update")
+            return False
+
+        if any(document_id is None for document_id in self.document_ids):
+            print("Existing BM25 index has no document ids, a full rebuild is required")
+            return False
+
+        # Invert the postings lists back into per-chunk term counts
+        terms = sorted(self.term_to_id, key=self.term_to_id.get)
+        term_counts: List[Dict[str, int]] = [{} for _ in self.chunk_ids]
+        for term_id, term in enumerate(terms):
+            start, end = self.posting_offsets[term_id], self.posting_offsets[term_id + 1]
+            for row, tf in zip(self.posting_rows[start:end], self.posting_tfs[start:end]):
+                term_counts[row][term] = int(tf)
+
+        removed = set(remove_document_ids)
+        keep = [row for row, document_id in enumerate(self.document_ids) if document_id not in removed]
+
+        return self._write(
+            [self.chunk_ids[row] for row in keep] + list(chunk_ids),
+            [term_counts[row] for row in keep] + [Counter(tokens) for tokens in chunk_tokens],
+            [self.categories[row] for row in keep] + list(categories),
+            [self.subcategories[row] for row in keep] + list(subcategories),
+            [self.document_ids[row] for row in keep] + list(document_ids),
+        )
+
+    def _write(self, chunk_ids: Sequence[str], term_counts: Sequence[Dict[str, int]],
+               categories: Optional[Sequence[Optional[str]]],
+               subcategories: Optional[Sequence[Optional[str]]],
+               document_ids: Optional[Sequence[Optional[str]]]) -> bool:
+        """Write postings lists built from per-chunk term counts, then reload"""
+        try:
+            n_rows = len(chunk_ids)
+            categories = list(categories) if categories is not None else [None] * n_rows
+            subcategories = list(subcategories) if subcategories is not None else [None] * n_rows
+            document_ids = list(document_ids) if document_ids is not None else [None] * n_rows
+
+            # Cluster rows by category/team so each shard is a contiguous row range
+            order = cluster_order(categories, subcategories, document_ids)
+            chunk_ids = [chunk_ids[row] for row in order]
+            term_counts = [term_counts[row] for row in order]
+            categories = [categories[row] for row in order]
+            subcategories = [subcategories[row] for row in order]
+            document_ids = [document_ids[row] for row in order]
+
+            postings: Dict[str, List[tuple]] = {}
+            doc_lengths = np.zeros(len(chunk_ids), dtype=np.float32)
+
+            for row, counts in enumerate(term_counts):
+                doc_lengths[row] = sum(counts.values())
+                for term, tf in counts.items():
+                    postings.setdefault(term, []).append((row, tf))
+
+            terms = sorted(postings)
+            counts = np.array([len(postings[term]) for term in terms], dtype=np.int64)
+            offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+            rows = np.fromiter((row for term in terms for row, _ in postings[term]), dtype=np.int32,
+                               count=int(offsets[-1]))
+            tfs = np.fromiter((tf for term in terms for _, tf in postings[term]), dtype=np.float32,
+                              count=int(offsets[-1]))
+
+            self.index_dir.mkdir(parents=True, exist_ok=True)
+            tmp_postings = self.index_dir / f"{POSTINGS_FILE}.tmp.npz"
+            tmp_meta = self.index_dir / f"{BM25_META_FILE}.tmp"
+
+            np.savez(tmp_postings, offsets=offsets, rows=rows, tfs=tfs, doc_lengths=doc_lengths)
+            with open(tmp_meta, 'w', encoding='utf-8') as f:
+                json.dump({
+                    'terms': terms,
+                    'chunk_ids': chunk_ids,
+                    'categories': categories,
+                    'subcategories': subcategories,
+                    'document_ids': document_ids,
+                    'shards': ShardMap.from_rows(categories, subcategories).runs,
+                }, f)
+
+            os.replace(tmp_postings, self.index_dir / POSTINGS_FILE)
+            os.replace(tmp_meta, self.index_dir / BM25_META_FILE)
+
+            print(f"Wrote BM25 index ({len(terms)} terms over {len(chunk_ids)} chunks) to {self.index_dir}")
+            return self.load()
+
+        except Exception as e:
+            print(f"Error building BM25 index: {e}")
+            return False
+
+    def load(self) -> bool:
+        """
+        Load postings lists and metadata
+
+        Returns:
+            True if the index is available, False otherwise
+        """
+        postings_path = self.index_dir / POSTINGS_FILE
+        meta_path = self.index_dir / BM25_META_FILE
+        if not postings_path.exists() or not meta_path.exists():
+            return False
+
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+
+            with np.load(postings_path) as data:
+                self.posting_offsets = data['offsets']
+                self.posting_rows = data['rows']
+                self.posting_tfs = data['tfs']
+                self.doc_lengths = data['doc_lengths']
+
+            self.term_to_id = {term: term_id for term_id, term in enumerate(meta['terms'])}
+            self.chunk_ids = meta['chunk_ids']
+            self.categories = meta.get('categories') or [None] * len(self.chunk_ids)
+            self.subcategories = meta.get('subcategories') or [None] * len(self.chunk_ids)
+            self.document_ids = meta.get('document_ids') or [None] * len(self.chunk_ids)
+            self.avg_doc_length = float(self.doc_lengths.mean()) if len(self.doc_lengths) else 0.0
+            # Indexes written before sharding are not clustered and fall back to row masks
+            self.shard_map = ShardMap(meta['shards']) if 'shards' in meta else None
+            return True
+
+        except Exception as e:
+            print(f"Error loading BM25 index: {e}")
+            self.posting_offsets = None
+            return False
+
+    def idf(self, term: str) -> float:
+        """Okapi BM25 inverse document frequency (0.0 for unknown terms)"""
+        term_id = self.term_to_id.get(term)
+        if term_id is None:
+            return 0.0
+        df = float(self.posting_offsets[term_id + 1] - self.posting_offsets[term_id])
+        n_docs = float(len(self.chunk_ids))
+        return float(np.log(1.0 + (n_docs - df + 0.5) / (df + 0.5)))
+
+    def row_mask(self, category: Optional[str] = None, subcategory: Optional[str] = None) -> Optional[np.ndarray]:
+        """Boolean mask of rows matching the category/subcategory filter (None if unfiltered)"""
+        if not category and not subcategory:
+            return None
+
+        mask = np.ones(len(self.chunk_ids), dtype=bool)
+        if category:
+            mask &= np.array([value == category for value in self.categories], dtype=bool)
+        if subcategory:
+            mask &= np.array([value == subcategory for value in self.subcategories], dtype=bool)
+        return mask
+
+    def search(self, query_tokens: Sequence[str], k: int, category: Optional[str] = None,
+               subcategory: Optional[str] = None) -> Dict[str, float]:
+        """
+        Top-k chunks by BM25 score
+
+        Args:
+            query_tokens: Tokenized query (see ``tokenize_for_bm25``)
+            k: Number of results to return
+            category: Optional category filter
+            subcategory: Optional subcategory filter (team)
+
+        Returns:
+            Dictionary mapping chunk_id -> BM25 score (only chunks with score > 0), best first
+        """
+        if not self.is_loaded or k <= 0:
+            return {}
+
+        # A filtered search scores only its shard's rows: [first_row, last_row)
+        row_range = self.shard_map.row_range(category, subcategory) if self.shard_map else None
+        first_row, last_row = row_range if row_range is not None else (0, len(self.chunk_ids))
+        if first_row >= last_row:
+            return {}
+
+        scores = np.zeros(last_row - first_row, dtype=np.float32)
+        doc_lengths = self.doc_lengths[first_row:last_row]
+        length_norm = self.k1 * (1.0 - self.b + self.b * doc_lengths / max(self.avg_doc_length, 1e-9))
+
+        for term in set(query_tokens):
+            term_id = self.term_to_id.get(term)
+            if term_id is None:
+                continue
+            start, end = self.posting_offsets[term_id], self.posting_offsets[term_id + 1]
+            rows = self.posting_rows[start:end]
+            tfs = self.posting_tfs[start:end]
+            if row_range is not None:
+                # Postings are sorted by row, so the shard is a contiguous slice
+                lo, hi = np.searchsorted(rows, (first_row, last_row))
+                rows, tfs = rows[lo:hi], tfs[lo:hi]
+            rows = rows - first_row
+            scores[rows] += self.idf(term) * tfs * (self.k1 + 1.0) / (tfs + length_norm[rows])
+
+        if row_range is None:
+            mask = self.row_mask(category, subcategory)
+            if mask is not None:
+                scores[~mask] = 0.0
+
+        matched = np.flatnonzero(scores > 0)
+        if not len(matched):
+            return {}
+
+        top = matched[np.argsort(-scores[matched])[:k]]
+        return {self.chunk_ids[first_row + row]: float(scores[row]) for row in top}
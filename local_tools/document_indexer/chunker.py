@@ -0,0 +1,346 @@
+"""
+Token-aware, structure-aware document chunking
+
+Documents are cut at structural boundaries (markdown headings, paragraphs, fenced code
+blocks and SQL statements) and chunks are sized by the embedding model's tokenizer, so
+the text embedded for every chunk fits the model's sequence limit instead of being
+silently truncated at 512 tokens. Each chunk records its token count and, with the
+model tokenizer available, the token ids of its embedding text, so the embedder does
+not tokenize it a second time.
+"""
+
+import re
+from functools import lru_cache
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    from transformers import AutoTokenizer
+    TOKENIZER_AVAILABLE = True
+except ImportError:
+    TOKENIZER_AVAILABLE = False
+
+try:
+    from .config import (
+        BGE_MODEL_NAME, BGE_MODEL_LOCAL_PATH, CHUNK_MAX_TOKENS, CHUNK_MIN_TOKENS, CHUNK_OVERLAP_TOKENS
+    )
+except ImportError:
+    from config import (
+        BGE_MODEL_NAME, BGE_MODEL_LOCAL_PATH, CHUNK_MAX_TOKENS, CHUNK_MIN_TOKENS, CHUNK_OVERLAP_TOKENS
+    )
+
+
+_SPECIAL_TOKENS = 2  # [CLS] and [SEP]
+_MIN_CONTENT_TOKENS = 16  # Smallest useful content budget next to the file name/path prefix
+_FENCE = re.compile(r'^\s*(```|~~~)\s*([\w+-]*)')
+_HEADING = re.compile(r'^#{1,6}\s')
+_SQL_STATEMENT_END = re.compile(r';\s*(--.*)?$')
+# Without the model tokenizer: letters in pieces of 6, digits in pieces of 3, punctuation
+# one token each, which over-counts WordPiece for typical text
+_ESTIMATE_TOKEN = re.compile(r'[A-Za-z]{1,6}|\d{1,3}|[^\sA-Za-z\d]')
+
+Span = Tuple[int, int, int]  # (start, end, tokens)
+
+
+def embedding_text(chunk: Dict) -> str:
+    """Text sent to the embedding model for a document chunk"""
+    text_parts = [
+        chunk.get('file_name', ''),
+        chunk.get('relative_path', ''),
+        chunk.get('content', '')
+    ]
+    # Add category-specific text
+    if chunk.get('category') == 'table_context':
+        if 'database' in chunk and 'schema' in chunk and 'table_name' in chunk:
+            text_parts.append(f"{chunk['database']}.{chunk['schema']}.{chunk['table_name']}")
+
+    return ' '.join(filter(None, text_parts))
+
+
+class ChunkTokenizer:
+    """Token counts and offsets from the embedding model's tokenizer, or a conservative estimate"""
+
+    def __init__(self, model_path: Path = BGE_MODEL_LOCAL_PATH, model_name: str = BGE_MODEL_NAME):
+        self.tokenizer = None
+        if TOKENIZER_AVAILABLE:
+            source = model_path if (Path(model_path) / "tokenizer_config.json").exists() else model_name
+            try:
+                self.tokenizer = AutoTokenizer.from_pretrained(str(source))
+            except Exception as e:
+                print(f"Warning: could not load tokenizer {source}: {e}")
+        if self.tokenizer is None:
+            print("Warning: model tokenizer not available, chunks are sized by an estimated token count")
+
+    @property
+    def exact(self) -> bool:
+        return self.tokenizer is not None
+
+    def count(self, text: str) -> int:
+        """Tokens in text, without special tokens"""
+        if self.tokenizer is None:
+            return sum(1 for _ in _ESTIMATE_TOKEN.finditer(text))
+        return len(self.tokenizer(text, add_special_tokens=False, verbose=False)['input_ids'])
+
+    def offsets(self, text: str) -> List[Tuple[int, int]]:
+        """Character span of every token in text"""
+        if self.tokenizer is not None and self.tokenizer.is_fast:
+            return [tuple(span) for span in self.tokenizer(text, add_special_tokens=False, verbose=False,
+                                                           return_offsets_mapping=True)['offset_mapping']]
+        return [match.span() for match in _ESTIMATE_TOKEN.finditer(text)]
+
+    def encode(self, text: str) -> Optional[List[int]]:
+        """Model input ids of text (with special tokens), or None without the model tokenizer"""
+        if self.tokenizer is None:
+            return None
+        return self.tokenizer(text, add_special_tokens=True, verbose=False)['input_ids']
+
+
+@lru_cache(maxsize=1)
+def get_chunk_tokenizer() -> ChunkTokenizer:
+    """Tokenizer shared by every document chunked in this process"""
+    return ChunkTokenizer()
+
+
+def structural_blocks(content: str, content_type: str) -> List[Dict]:
+    """
+    Split a document into structural blocks
+
+    Markdown is split into paragraphs and fenced code blocks, with a heading kept
+    together with the block that follows it; SQL files into statements; everything
+    else into paragraphs.
+
+    Returns:
+        Blocks as dicts with start/end character offsets, ``heading`` and ``sql`` flags
+    """
+    markdown = content_type in ('markdown', 'text')
+    sql = content_type == 'sql'
+    blocks = []
+    current = None
+    fence = None
+    pos = 0
+
+    def close():
+        nonlocal current
+        if current is not None and content[current['start']:current['end']].strip():
+            blocks.append(current)
+        current = None
+
+    def open_block(start: int, heading: bool = False) -> Dict:
+        close()
+        return {'start': start, 'end': start, 'heading': heading, 'sql': sql, 'open_heading': heading}
+
+    for line in content.splitlines(keepends=True):
+        start, end = pos, pos + len(line)
+        pos = end
+        stripped = line.strip()
+
+        if fence:
+            current['end'] = end
+            if stripped.startswith(fence):
+                fence = None
+                close()
+            continue
+
+        fence_match = _FENCE.match(line) if markdown else None
+        if fence_match:
+            if current is None or not current['open_heading']:
+                current = open_block(start)
+            fence = fence_match.group(1)
+            current.update(end=end, open_heading=False, sql=fence_match.group(2).lower() == 'sql')
+            continue
+
+        if markdown and _HEADING.match(line):
+            # Consecutive headings stay in one block
+            if current is None or not current['open_heading']:
+                current = open_block(start, heading=True)
+            current['end'] = end
+            continue
+
+        if not stripped:
+            if current is not None and not current['open_heading'] and not sql:
+                close()
+            elif current is not None:
+                current['end'] = end
+            continue
+
+        if current is None:
+            current = open_block(start)
+        current.update(end=end, open_heading=False)
+        if sql and _SQL_STATEMENT_END.search(line.rstrip()):
+            close()
+
+    close()
+    return blocks
+
+
+def _sub_spans(content: str, start: int, end: int, is_boundary: Callable[[str], bool]) -> List[Tuple[int, int]]:
+    """Split [start, end) after every line for which ``is_boundary`` holds"""
+    spans = []
+    piece_start = pos = start
+    for line in content[start:end].splitlines(keepends=True):
+        pos += len(line)
+        if is_boundary(line):
+            spans.append((piece_start, pos))
+            piece_start = pos
+    if piece_start < end:
+        spans.append((piece_start, end))
+    return [span for span in spans if content[span[0]:span[1]].strip()]
+
+
+def _token_windows(content: str, start: int, end: int, budget: int, overlap: int,
+                   tokenizer: ChunkTokenizer) -> List[Span]:
+    """Cut a span with no usable structure into overlapping windows of at most ``budget`` tokens"""
+    text = content[start:end]
+    offsets = tokenizer.offsets(text)
+    budget = max(budget, 1)
+
+    def word_start(i: int) -> bool:
+        return offsets[i][0] == 0 or text[offsets[i][0] - 1].isspace()
+
+    windows = []
+    i = 0
+    while i < len(offsets):
+        j = min(i + budget, len(offsets))
+        if j < len(offsets):
+            # End on a word boundary so the window re-tokenizes to the same tokens
+            k = j
+            while k > i + budget // 2 and not word_start(k):
+                k -= 1
+            if k > i + budget // 2:
+                j = k
+        windows.append((start + offsets[i][0], start + offsets[j - 1][1], j - i))
+        if j >= len(offsets):
+            break
+        next_i = max(j - overlap, i + 1)
+        while next_i < j and not word_start(next_i):
+            next_i += 1
+        i = next_i
+    return windows
+
+
+def _fit(content: str, start: int, end: int, budget: int, overlap: int, tokenizer: ChunkTokenizer,
+         sql: bool = False, level: int = 0) -> List[Span]:
+    """
+    Pieces of [start, end) of at most ``budget`` tokens each
+
+    Oversized spans are split at SQL statement ends (SQL only), then blank lines, then
+    line ends; a single line that is still too long is cut into token windows.
+    """
+    tokens = tokenizer.count(content[start:end])
+    if tokens <= budget:
+        return [(start, end, tokens)]
+
+    splitters = [
+        lambda line: bool(_SQL_STATEMENT_END.search(line.rstrip())) if sql else False,
+        lambda line: not line.strip(),
+        lambda line: True,
+    ]
+    for next_level in range(level, len(splitters)):
+        parts = _sub_spans(content, start, end, splitters[next_level])
+        if len(parts) > 1:
+            pieces = []
+            for part_start, part_end in parts:
+                pieces.extend(_fit(content, part_start, part_end, budget, overlap, tokenizer, sql, next_level + 1))
+            return _pack(pieces, budget)
+
+    return _token_windows(content, start, end, budget, overlap, tokenizer)
+
+
+def _pack(pieces: List[Span], budget: int) -> List[Span]:
+    """Merge consecutive pieces while they fit the budget"""
+    packed: List[Span] = []
+    for start, end, tokens in pieces:
+        if packed and start >= packed[-1][1] and packed[-1][2] + tokens <= budget:
+            packed[-1] = (packed[-1][0], end, packed[-1][2] + tokens)
+        else:
+            packed.append((start, end, tokens))
+    return packed
+
+
+def chunk_document(content: str, metadata: Dict, tokenizer: Optional[ChunkTokenizer] = None,
+                   max_tokens: int = CHUNK_MAX_TOKENS, min_tokens: int = CHUNK_MIN_TOKENS,
+                   overlap: int = CHUNK_OVERLAP_TOKENS) -> List[Dict]:
+    """
+    Split a document into chunks whose embedding text fits ``max_tokens``
+
+    Args:
+        content: Document content
+        metadata: Document metadata (copied onto every chunk)
+        tokenizer: Tokenizer used for sizing (default: the embedding model's)
+        max_tokens: Model sequence limit, including special tokens and the file name/path prefix
+        min_tokens: A heading starts a new chunk once the current chunk holds this many tokens
+        overlap: Token overlap between windows of a block that has to be cut mid-structure
+
+    Returns:
+        List of chunk dictionaries with ``token_count`` (and ``token_ids`` when exact)
+    """
+    tokenizer = tokenizer or get_chunk_tokenizer()
+    prefix_tokens = tokenizer.count(embedding_text(dict(metadata, content='')))
+    prefix_fits = max_tokens - _SPECIAL_TOKENS - prefix_tokens >= _MIN_CONTENT_TOKENS
+    if prefix_fits:
+        budget = max_tokens - _SPECIAL_TOKENS - prefix_tokens
+    else:
+        # The prefix (e.g. a very deep relative_path) fills the sequence: size chunks by content
+        # alone and embed a truncated text, instead of cutting the document into slivers
+        budget = max_tokens - _SPECIAL_TOKENS
+
+    if tokenizer.count(content) <= budget:
+        # Small document, return as single chunk
+        groups = [(0, len(content))]
+    else:
+        groups = []
+        group_tokens = 0
+        for block in structural_blocks(content, metadata.get('content_type', '')):
+            pieces = _fit(content, block['start'], block['end'], budget, overlap, tokenizer, block['sql'])
+            for i, (start, end, tokens) in enumerate(pieces):
+                starts_section = block['heading'] and i == 0 and group_tokens >= min_tokens
+                if groups and not starts_section and start >= groups[-1][1] and group_tokens + tokens <= budget:
+                    groups[-1] = (groups[-1][0], end)
+                    group_tokens += tokens
+                else:
+                    groups.append((start, end))
+                    group_tokens = tokens
+
+    whole_document = groups == [(0, len(content))]
+    chunks = []
+    while groups:
+        start, end = groups.pop(0)
+        chunk_text = content if whole_document else content[start:end].strip()
+        if not chunk_text.strip():
+            continue
+
+        chunk_metadata = metadata.copy()
+        chunk_metadata.update({
+            'chunk_id': len(chunks),
+            'chunk_count': -1,  # Will be updated after all chunks are created
+            'chunk_start': start,
+            'chunk_end': end,
+            'content': chunk_text
+        })
+        text = embedding_text(chunk_metadata)
+        token_ids = tokenizer.encode(text)
+        token_count = len(token_ids) if token_ids is not None else tokenizer.count(text) + _SPECIAL_TOKENS
+
+        if token_count > max_tokens and prefix_fits:
+            # Token counts of pieces are not always additive; re-split this group tighter
+            pieces = _fit(content, start, end, max(budget - (token_count - max_tokens), 1), overlap, tokenizer)
+            if len(pieces) > 1:
+                groups[:0] = [(piece_start, piece_end) for piece_start, piece_end, _ in pieces]
+                continue
+
+        if token_ids is not None and len(token_ids) > max_tokens:
+            # Still too long (oversized prefix, or a group that cannot be split further): truncate, keeping [SEP]
+            token_ids = token_ids[:max_tokens - 1] + token_ids[-1:]
+            token_count = len(token_ids)
+        chunk_metadata['token_count'] = token_count
+        if token_ids is not None:
+            chunk_metadata['token_ids'] = np.asarray(token_ids, dtype=np.int32)
+        chunks.append(chunk_metadata)
+
+    # Update chunk counts
+    for chunk in chunks:
+        chunk['chunk_count'] = len(chunks)
+
+    return chunks
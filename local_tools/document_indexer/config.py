@@ -14,18 +14,67 @@ load_dotenv(dotenv_path=env_path)
 # Model configuration
 BGE_MODEL_NAME = "BAAI/bge-small-en-v1.5"
 BGE_MODEL_LOCAL_PATH = Path(__file__).parent / "models" / "bge-small-en-v1.5"
+ONNX_MODEL_LOCAL_PATH = Path(__file__).parent / "models" / "bge-small-en-v1.5-onnx"
+
+# Embedding inference: "torch" (sentence-transformers) or "onnx" (ONNX Runtime, int8 quantized)
+EMBEDDING_BACKEND = os.getenv("DOCUMENT_EMBEDDING_BACKEND", "torch")
+EMBEDDING_NUM_THREADS = int(os.getenv("DOCUMENT_EMBEDDING_THREADS", "0"))  # 0 = library default
+EMBEDDING_BATCH_SIZE = 32
+EMBEDDING_MAX_BATCH_TOKENS = 8192  # Padded tokens per batch for the ONNX backend
 
 # Document processing configuration
-CHUNK_SIZE = 1000  # Characters per chunk for large documents
-CHUNK_OVERLAP = 200  # Overlap between chunks
+# Chunks are sized in model tokens: file name + path + chunk content must fit the model's sequence limit
+CHUNK_MAX_TOKENS = 512  # BGE sequence limit, including [CLS]/[SEP]
+CHUNK_MIN_TOKENS = 128  # A heading starts a new chunk once the current one holds this many tokens
+CHUNK_OVERLAP_TOKENS = 64  # Overlap only where a single paragraph/statement/line must be cut
 SUPPORTED_EXTENSIONS = ['.md', '.sql', '.txt', '.json', '.yaml', '.yml']
 
+# Near-duplicate chunk detection (MinHash over word shingles, LSH banding)
+NEAR_DUPLICATE_THRESHOLD = float(os.getenv("DOCUMENT_NEAR_DUPLICATE_THRESHOLD", "0.8"))  # Estimated Jaccard
+MINHASH_PERMUTATIONS = 64
+MINHASH_BANDS = 16  # 16 bands x 4 rows: pairs above ~0.5 Jaccard become candidates
+SHINGLE_SIZE = 5  # Words per shingle
+
 # Snowflake configuration (now configurable via .env)
 SNOWFLAKE_DATABASE = os.getenv("SNOWFLAKE_DATABASE", "proddb")
 SNOWFLAKE_SCHEMA = os.getenv("SNOWFLAKE_SCHEMA", "fionafan")
 DOCUMENT_TABLE = os.getenv("DOCUMENT_INDEX_TABLE", "document_index_community")
 CHUNK_TABLE = os.getenv("CHUNK_INDEX_TABLE", "chunk_index_community")
 
+# Local index configuration (memory-mapped embeddings and search structures)
+LOCAL_INDEX_DIR = Path(os.getenv("DOCUMENT_LOCAL_INDEX_DIR", str(Path(__file__).parent / "local_index")))
+EMBEDDING_CACHE_DIR = Path(os.getenv("DOCUMENT_EMBEDDING_CACHE_DIR", str(LOCAL_INDEX_DIR / "embedding_cache")))
+
+# Search-time query embedding LRU (set DOCUMENT_QUERY_EMBEDDING_CACHE_PATH to persist it across restarts)
+QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv("DOCUMENT_QUERY_EMBEDDING_CACHE_SIZE", "1024"))
+QUERY_EMBEDDING_CACHE_PATH = os.getenv("DOCUMENT_QUERY_EMBEDDING_CACHE_PATH")
+
+# Search-time LRU of document bodies (full_content) keyed by document_hash
+DOCUMENT_BODY_CACHE_SIZE = int(os.getenv("DOCUMENT_BODY_CACHE_SIZE", "256"))
+
+# Search result cache (cleared whenever an index upload bumps the index generation)
+SEARCH_RESULT_CACHE_SIZE = int(os.getenv("DOCUMENT_SEARCH_RESULT_CACHE_SIZE", "512"))
+SEARCH_RESULT_CACHE_TTL_SECONDS = int(os.getenv("DOCUMENT_SEARCH_RESULT_CACHE_TTL_SECONDS", "3600"))
+# Seconds between checks of the document table for uploads made from other machines
+INDEX_GENERATION_CHECK_SECONDS = int(os.getenv("DOCUMENT_INDEX_GENERATION_CHECK_SECONDS", "60"))
+
+# Search backend: "snowflake" (default), "local" (offline mirror only) or "auto" (mirror when present)
+SEARCH_MODE = os.getenv("DOCUMENT_SEARCH_MODE", "snowflake")
+
+# Seconds between health checks of a long-lived searcher's Snowflake session
+CONNECTION_HEALTH_CHECK_SECONDS = int(os.getenv("DOCUMENT_CONNECTION_HEALTH_CHECK_SECONDS", "300"))
+
+# ANN candidate generation (IVF over chunk embeddings)
+ANN_NPROBE = 8  # Inverted lists scanned per query
+ANN_CANDIDATE_MULTIPLIER = 3  # Semantic candidates per query = top_k * multiplier
+ANN_SHARD_MIN_ROWS = 2048  # Categories with fewer chunks are scanned exactly instead of via their own IVF shard
+
+# Embedding storage: "float16" (half-precision vectors, scanned directly), "int8" (opt-in:
+# int8 codes with a per-vector scale are scanned and the shortlist is re-scored against the
+# float16 vectors; the float array is kept in Snowflake) or "none" (float32 arrays only).
+EMBEDDING_QUANTIZATION = os.getenv("DOCUMENT_EMBEDDING_QUANTIZATION", "float16")
+QUANTIZED_RESCORE_MULTIPLIER = 4  # int8 shortlist re-scored at full precision = k * multiplier
+
 # GitHub configuration
 GITHUB_REPO = os.getenv("GITHUB_REPO", "jfan-nux/cursor-analytics-mcp")
 GITHUB_BRANCH = os.getenv("GITHUB_BRANCH", "main")
@@ -58,6 +107,8 @@ CONTENT_TYPE_MAPPING = {
 }
 
 # BM25 preprocessing configuration
+BM25_K1 = 1.5  # Term frequency saturation
+BM25_B = 0.75  # Document length normalization
 BM25_MIN_TOKEN_LENGTH = 2
 BM25_STOPWORDS = {
     'the', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by',
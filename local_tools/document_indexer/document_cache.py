@@ -0,0 +1,73 @@
+"""
+Search-time document body cache
+
+Document bodies (``full_content``) are only fetched for the final top-k hits of a
+search. ``DocumentBodyCache`` keeps recently returned bodies in a bounded LRU keyed
+by ``document_hash`` (a hash of the content itself), so a body is never stale and
+repeat hits on the same document skip the fetch entirely.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional
+
+try:
+    from .config import DOCUMENT_BODY_CACHE_SIZE
+except ImportError:
+    from config import DOCUMENT_BODY_CACHE_SIZE
+
+
+class DocumentBodyCache:
+    """Thread-safe bounded LRU of document_hash -> full document content"""
+
+    def __init__(self, max_size: int = DOCUMENT_BODY_CACHE_SIZE):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, document_hash: Optional[str]) -> Optional[str]:
+        """Cached body for the hash (marks it most recently used), or None"""
+        if not document_hash:
+            return None
+
+        with self._lock:
+            body = self._entries.get(document_hash)
+            if body is None:
+                return None
+            self._entries.move_to_end(document_hash)
+            self.hits += 1
+            return body
+
+    def get_many(self, document_hashes: Iterable[Optional[str]]) -> Dict[str, str]:
+        """Cached bodies of the hashes that are cached (marked most recently used); the rest count as misses"""
+        bodies = {}
+        with self._lock:
+            for document_hash in document_hashes:
+                if not document_hash or document_hash in bodies:
+                    continue
+                body = self._entries.get(document_hash)
+                if body is None:
+                    self.misses += 1
+                    continue
+                self._entries.move_to_end(document_hash)
+                self.hits += 1
+                bodies[document_hash] = body
+        return bodies
+
+    def put(self, document_hash: Optional[str], body: Optional[str]):
+        """Store a body, evicting the least recently used entries beyond max_size"""
+        if self.max_size <= 0 or not document_hash or body is None:
+            return
+
+        with self._lock:
+            self._entries[document_hash] = body
+            self._entries.move_to_end(document_hash)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, int]:
+        """Entry count and hit/miss counters"""
+        with self._lock:
+            return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses}
@@ -3,22 +3,52 @@ Document processing module for extracting, chunking, and preparing documents for
 """
 
 import hashlib
+import os
 import re
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, Iterator, List, Optional, Set, Tuple
 import json
 from datetime import datetime
 
 try:
     from .config import (
-        CHUNK_SIZE, CHUNK_OVERLAP, SUPPORTED_EXTENSIONS, CONTEXT_CATEGORIES,
+        SUPPORTED_EXTENSIONS, CONTEXT_CATEGORIES,
         BM25_MIN_TOKEN_LENGTH, BM25_STOPWORDS, CONTENT_TYPE_MAPPING
     )
+    from .chunker import chunk_document
 except ImportError:
     from config import (
-        CHUNK_SIZE, CHUNK_OVERLAP, SUPPORTED_EXTENSIONS, CONTEXT_CATEGORIES,
+        SUPPORTED_EXTENSIONS, CONTEXT_CATEGORIES,
         BM25_MIN_TOKEN_LENGTH, BM25_STOPWORDS, CONTENT_TYPE_MAPPING
     )
+    from chunker import chunk_document
+
+
+def tokenize_for_bm25(text: str) -> List[str]:
+    """
+    Tokenize text for BM25 (shared by indexing and query processing)
+    
+    Args:
+        text: Raw text content
+        
+    Returns:
+        List of processed tokens
+    """
+    # Convert to lowercase
+    text = text.lower()
+    
+    # Replace punctuation and special characters with spaces
+    text = re.sub(r'[^a-z0-9\s]', ' ', text)
+    
+    # Split into tokens
+    tokens = text.split()
+    
+    # Remove short tokens and stopwords
+    return [
+        token for token in tokens
+        if len(token) >= BM25_MIN_TOKEN_LENGTH and token not in BM25_STOPWORDS
+    ]
 
 
 class DocumentProcessor:
@@ -27,19 +57,22 @@ class DocumentProcessor:
     def __init__(self, context_root: Path):
         self.context_root = Path(context_root)
         
-    def extract_metadata(self, file_path: Path) -> Dict:
+    def extract_metadata(self, file_path: Path, content: Optional[str] = None) -> Dict:
         """
         Extract metadata from a file path and content (UPDATED)
         
         Args:
             file_path: Path to the file
+            content: File content if already read (avoids a second read)
             
         Returns:
             Dictionary containing metadata
         """
         try:
-            content = file_path.read_text(encoding='utf-8', errors='ignore')
+            if content is None:
+                content = file_path.read_text(encoding='utf-8', errors='ignore')
             relative_path = file_path.relative_to(self.context_root)
+            file_stat = file_path.stat()
             
             # Determine category based on path
             category = self._determine_category(relative_path)
@@ -47,9 +80,9 @@ class DocumentProcessor:
             # Extract subcategory and document title
             subcategory, document_title = self._extract_subcategory_and_title(relative_path, category)
             
-            # Create hashes for change detection
-            file_hash = hashlib.md5(content.encode()).hexdigest()
-            document_hash = hashlib.sha256(content.encode()).hexdigest()
+            # Create hash for change detection (file_hash kept as an alias for older consumers)
+            document_hash = self.content_hash(content)
+            file_hash = document_hash
             
             # Basic metadata
             metadata = {
@@ -62,10 +95,10 @@ class DocumentProcessor:
                 'subcategory': subcategory,
                 'document_title': document_title,
                 'content_type': CONTENT_TYPE_MAPPING.get(file_path.suffix, 'unknown'),
-                'file_size': file_path.stat().st_size,
+                'file_size': file_stat.st_size,
                 'file_hash': file_hash,
                 'document_hash': document_hash,
-                'last_modified': datetime.fromtimestamp(file_path.stat().st_mtime).isoformat(),
+                'last_modified': datetime.fromtimestamp(file_stat.st_mtime).isoformat(),
                 'processed_at': datetime.now().isoformat()
             }
             
@@ -81,6 +114,11 @@ class DocumentProcessor:
             print(f"Error extracting metadata from {file_path}: {e}")
             return {}
     
+    @staticmethod
+    def content_hash(content: str) -> str:
+        """Document hash used for change detection (sha256 of the UTF-8 content)"""
+        return hashlib.sha256(content.encode()).hexdigest()
+    
     def _determine_category(self, relative_path: Path) -> str:
         """Determine document category based on path"""
         path_str = str(relative_path)
@@ -230,67 +268,21 @@ class DocumentProcessor:
     
     def chunk_content(self, content: str, metadata: Dict) -> List[Dict]:
         """
-        Split large content into chunks for better search
+        Split content into chunks for better search
+        
+        Chunks follow the document structure (headings, paragraphs, code fences, SQL
+        statements) and are sized in embedding-model tokens, so nothing is truncated
+        at embedding time (see chunker.chunk_document).
         
         Args:
             content: Document content
             metadata: Document metadata
             
         Returns:
-            List of chunk dictionaries
+            List of chunk dictionaries (with token_count, and token_ids when the
+            model tokenizer is available)
         """
-        if len(content) <= CHUNK_SIZE:
-            # Small document, return as single chunk
-            chunk_metadata = metadata.copy()
-            chunk_metadata.update({
-                'chunk_id': 0,
-                'chunk_count': 1,
-                'chunk_start': 0,
-                'chunk_end': len(content),
-                'content': content
-            })
-            return [chunk_metadata]
-        
-        # Split into overlapping chunks
-        chunks = []
-        chunk_id = 0
-        start = 0
-        
-        while start < len(content):
-            end = min(start + CHUNK_SIZE, len(content))
-            
-            # Try to break at word boundaries
-            if end < len(content):
-                # Look for the last space or newline in the chunk
-                last_break = max(
-                    content.rfind(' ', start, end),
-                    content.rfind('\n', start, end)
-                )
-                if last_break > start + CHUNK_SIZE // 2:  # Only use if break is not too early
-                    end = last_break
-            
-            chunk_content = content[start:end].strip()
-            if chunk_content:  # Only add non-empty chunks
-                chunk_metadata = metadata.copy()
-                chunk_metadata.update({
-                    'chunk_id': chunk_id,
-                    'chunk_count': -1,  # Will be updated after all chunks are created
-                    'chunk_start': start,
-                    'chunk_end': end,
-                    'content': chunk_content
-                })
-                chunks.append(chunk_metadata)
-                chunk_id += 1
-            
-            # Move start position with overlap
-            start = max(start + CHUNK_SIZE - CHUNK_OVERLAP, end)
-        
-        # Update chunk counts
-        total_chunks = len(chunks)
-        for chunk in chunks:
-            chunk['chunk_count'] = total_chunks
-        
-        return chunks
+        return chunk_document(content, metadata)
     
     def preprocess_text_for_bm25(self, text: str) -> List[str]:
         """
@@ -302,67 +294,116 @@ class DocumentProcessor:
         Returns:
             List of processed tokens
         """
-        # Convert to lowercase
-        text = text.lower()
+        return tokenize_for_bm25(text)
+    
+    def iter_document_files(self) -> Iterator[Path]:
+        """Yield all supported files under the context root (single directory walk)"""
+        extensions = set(SUPPORTED_EXTENSIONS)
+        for file_path in self.context_root.rglob("*"):
+            if file_path.suffix in extensions and file_path.is_file():
+                yield file_path
+    
+    def compute_document_hashes(self) -> Dict[str, str]:
+        """
+        Content hash of every document, without chunking (for incremental indexing)
         
-        # Replace punctuation and special characters with spaces
-        text = re.sub(r'[^a-z0-9\s]', ' ', text)
+        Returns:
+            Dict mapping relative_path -> document_hash (same hash as extract_metadata)
+        """
+        hashes = {}
         
-        # Split into tokens
-        tokens = text.split()
+        if not self.context_root.exists():
+            print(f"Context root {self.context_root} does not exist")
+            return hashes
         
-        # Filter tokens
-        processed_tokens = []
-        for token in tokens:
-            # Remove short tokens and stopwords
-            if len(token) >= BM25_MIN_TOKEN_LENGTH and token not in BM25_STOPWORDS:
-                processed_tokens.append(token)
+        for file_path in self.iter_document_files():
+            try:
+                content = file_path.read_text(encoding='utf-8', errors='ignore')
+                hashes[str(file_path.relative_to(self.context_root))] = self.content_hash(content)
+            except Exception as e:
+                print(f"Error hashing {file_path}: {e}")
         
-        return processed_tokens
+        return hashes
     
-    def process_all_documents(self) -> List[Dict]:
+    def process_document(self, file_path: Path) -> List[Dict]:
         """
-        Process all documents in the context folder
+        Extract metadata, chunk and tokenize a single document (reads the file once)
         
+        Args:
+            file_path: Path to the file
+            
         Returns:
-            List of processed document chunks with metadata
+            List of chunk dictionaries (empty on error)
         """
-        all_chunks = []
+        try:
+            content = file_path.read_text(encoding='utf-8', errors='ignore')
+            
+            # Extract metadata
+            metadata = self.extract_metadata(file_path, content)
+            if not metadata:
+                return []
+            
+            # Create chunks
+            chunks = self.chunk_content(content, metadata)
+            
+            # Add BM25 tokens to each chunk
+            for chunk in chunks:
+                chunk['bm25_tokens'] = self.preprocess_text_for_bm25(
+                    f"{chunk['file_name']} {chunk['relative_path']} {chunk['content']}"
+                )
+                chunk['bm25_text'] = ' '.join(chunk['bm25_tokens'])
+            
+            return chunks
+            
+        except Exception as e:
+            print(f"Error processing {file_path}: {e}")
+            return []
+    
+    def iter_document_chunks(self, relative_paths: Optional[Set[str]] = None,
+                             workers: Optional[int] = None) -> Iterator[Dict]:
+        """
+        Stream processed chunks, fanning chunking and BM25 tokenization out to a process pool
         
+        Args:
+            relative_paths: Optional subset of documents (relative paths) to process
+            workers: Worker processes (default: CPU count; 1 processes serially)
+            
+        Yields:
+            Document chunks with metadata, in file order
+        """
         if not self.context_root.exists():
             print(f"Context root {self.context_root} does not exist")
-            return all_chunks
-        
-        # Find all supported files
-        for extension in SUPPORTED_EXTENSIONS:
-            for file_path in self.context_root.rglob(f"*{extension}"):
-                try:
-                    print(f"Processing: {file_path}")
-                    
-                    # Extract metadata
-                    metadata = self.extract_metadata(file_path)
-                    if not metadata:
-                        continue
-                    
-                    # Read content
-                    content = file_path.read_text(encoding='utf-8', errors='ignore')
-                    
-                    # Create chunks
-                    chunks = self.chunk_content(content, metadata)
-                    
-                    # Add BM25 tokens to each chunk
-                    for chunk in chunks:
-                        chunk['bm25_tokens'] = self.preprocess_text_for_bm25(
-                            f"{chunk['file_name']} {chunk['relative_path']} {chunk['content']}"
-                        )
-                        chunk['bm25_text'] = ' '.join(chunk['bm25_tokens'])
-                    
-                    all_chunks.extend(chunks)
-                    
-                except Exception as e:
-                    print(f"Error processing {file_path}: {e}")
-                    continue
+            return
+        
+        file_paths = [
+            file_path for file_path in self.iter_document_files()
+            if relative_paths is None or str(file_path.relative_to(self.context_root)) in relative_paths
+        ]
+        workers = min(workers or os.cpu_count() or 1, len(file_paths))
+        
+        if workers <= 1:
+            for file_path in file_paths:
+                yield from self.process_document(file_path)
+            return
+        
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            chunksize = max(1, len(file_paths) // (workers * 4))
+            for chunks in executor.map(self.process_document, file_paths, chunksize=chunksize):
+                yield from chunks
+    
+    def process_all_documents(self, relative_paths: Optional[Set[str]] = None,
+                              workers: Optional[int] = None) -> List[Dict]:
+        """
+        Process all documents in the context folder
         
+        Args:
+            relative_paths: Optional subset of documents (relative paths) to process
+            workers: Worker processes (default: CPU count; 1 processes serially)
+            
+        Returns:
+            List of processed document chunks with metadata
+        """
+        all_chunks = list(self.iter_document_chunks(relative_paths, workers))
         print(f"Processed {len(all_chunks)} document chunks from {self.context_root}")
         return all_chunks
     
@@ -370,7 +411,8 @@ class DocumentProcessor:
         """Save processed documents to JSON file for inspection"""
         try:
             with open(output_path, 'w', encoding='utf-8') as f:
-                json.dump(chunks, f, indent=2, ensure_ascii=False)
+                # token_ids are numpy arrays
+                json.dump(chunks, f, indent=2, ensure_ascii=False, default=lambda value: value.tolist())
             print(f"Saved {len(chunks)} chunks to {output_path}")
         except Exception as e:
             print(f"Error saving processed documents: {e}")
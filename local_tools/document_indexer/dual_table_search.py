@@ -4,8 +4,10 @@ Hybrid search functionality for dual-table structure (document_index + chunk_ind
 
 import sys
 import re
+import time
+import threading
 from pathlib import Path
-from typing import List, Dict, Optional, Tuple
+from typing import List, Dict, Optional, Tuple, Union
 import numpy as np
 import json
 
@@ -24,17 +26,42 @@ except ImportError:
 
 try:
     from .embedding_generator import BGEEmbeddingGenerator
-    from .config import SNOWFLAKE_DATABASE, SNOWFLAKE_SCHEMA, DOCUMENT_TABLE, CHUNK_TABLE
+    from .vector_index import LocalVectorIndex
+    from .bm25_index import InvertedBM25Index
+    from .local_mirror import LocalMirror
+    from .document_cache import DocumentBodyCache
+    from .search_cache import SearchResultCache, read_index_generation
+    from .quantization import decode_embedding
+    from .document_processor import tokenize_for_bm25
+    from .config import SNOWFLAKE_DATABASE, SNOWFLAKE_SCHEMA, DOCUMENT_TABLE, CHUNK_TABLE, ANN_CANDIDATE_MULTIPLIER
+    from .config import CONNECTION_HEALTH_CHECK_SECONDS, INDEX_GENERATION_CHECK_SECONDS
 except ImportError:
     from embedding_generator import BGEEmbeddingGenerator
-    from config import SNOWFLAKE_DATABASE, SNOWFLAKE_SCHEMA, DOCUMENT_TABLE, CHUNK_TABLE
+    from vector_index import LocalVectorIndex
+    from bm25_index import InvertedBM25Index
+    from local_mirror import LocalMirror
+    from document_cache import DocumentBodyCache
+    from search_cache import SearchResultCache, read_index_generation
+    from quantization import decode_embedding
+    from document_processor import tokenize_for_bm25
+    from config import SNOWFLAKE_DATABASE, SNOWFLAKE_SCHEMA, DOCUMENT_TABLE, CHUNK_TABLE, ANN_CANDIDATE_MULTIPLIER
+    from config import CONNECTION_HEALTH_CHECK_SECONDS, INDEX_GENERATION_CHECK_SECONDS
 
 
 class DualTableHybridSearcher:
     """Hybrid search using BM25 and embedding similarity with dual-table structure"""
     
+    # BGE instruction prefix used for search_documents queries
+    QUERY_PREFIX = "Represent this sentence for searching relevant passages:"
+    
     def __init__(self, database: str = SNOWFLAKE_DATABASE, schema: str = SNOWFLAKE_SCHEMA,
-                 document_table: str = DOCUMENT_TABLE, chunk_table: str = CHUNK_TABLE):
+                 document_table: str = DOCUMENT_TABLE, chunk_table: str = CHUNK_TABLE,
+                 vector_index: Optional[LocalVectorIndex] = None, local_index_dir: Optional[Path] = None,
+                 bm25_index: Optional[InvertedBM25Index] = None,
+                 embedding_generator: Optional[BGEEmbeddingGenerator] = None,
+                 local_mirror: Optional[LocalMirror] = None,
+                 document_cache: Optional[DocumentBodyCache] = None,
+                 result_cache: Optional[SearchResultCache] = None):
         self.database = database
         self.schema = schema
         self.document_table = document_table
@@ -42,24 +69,85 @@ class DualTableHybridSearcher:
         self.document_full_table = f"{database}.{schema}.{document_table}"
         self.chunk_full_table = f"{database}.{schema}.{chunk_table}"
         self.hook = None
-        self.embedding_generator = None
+        self._hook_lock = threading.Lock()
+        self._last_health_check = 0.0
+        self.embedding_generator = embedding_generator
+        self.local_mirror = local_mirror
+        self.vector_index = vector_index
+        self.local_index_dir = local_index_dir
+        self._vector_index_checked = vector_index is not None
+        self.bm25_index = bm25_index
+        self._bm25_index_checked = bm25_index is not None
+        self._chunk_columns: Optional[set] = None
+        self.document_cache = document_cache if document_cache is not None else DocumentBodyCache()
+        self.result_cache = result_cache if result_cache is not None else SearchResultCache()
+        self._remote_generation: Optional[str] = None
+        self._last_generation_check = float('-inf')
+        self._index_generation = (read_index_generation(local_index_dir), None)
         
     def get_snowflake_hook(self) -> Optional[SnowflakeHook]:
-        """Get Snowflake connection hook with correct database/schema context"""
+        """
+        Get Snowflake connection hook with correct database/schema context
+        
+        In local mode (``local_mirror`` set) this returns a stand-in that runs the
+        same SQL against the offline SQLite mirror, so no connection is opened.
+        """
+        if self.local_mirror is not None:
+            if not self.hook:
+                self.hook = self.local_mirror.get_hook({
+                    self.document_full_table: self.local_mirror.document_table,
+                    self.chunk_full_table: self.local_mirror.chunk_table,
+                })
+            return self.hook
+        
         if SnowflakeHook is None:
             return None
         
         try:
-            if not self.hook:
-                self.hook = SnowflakeHook(
-                    database=self.database,
-                    schema=self.schema
-                )
+            with self._hook_lock:
+                if not self.hook:
+                    self.hook = SnowflakeHook(
+                        database=self.database,
+                        schema=self.schema
+                    )
             return self.hook
         except Exception as e:
             print(f"Error connecting to Snowflake: {e}")
             return None
     
+    def ensure_connection(self, check_interval: float = CONNECTION_HEALTH_CHECK_SECONDS) -> bool:
+        """
+        Make sure a long-lived searcher still has a usable Snowflake session
+        
+        Pings the session at most once per ``check_interval`` seconds and reconnects
+        if it has expired or been closed, so a searcher shared across requests pays
+        no per-call setup. Always True in local mode.
+        
+        Returns:
+            True if the searcher can run queries, False otherwise
+        """
+        hook = self.get_snowflake_hook()
+        if not hook:
+            return False
+        if self.local_mirror is not None:
+            return True
+        
+        now = time.monotonic()
+        if now - self._last_health_check < check_interval:
+            return True
+        
+        with self._hook_lock:
+            if now - self._last_health_check < check_interval:
+                return True
+            if not hook.ping():
+                try:
+                    hook.reconnect()
+                except Exception as e:
+                    print(f"Error reconnecting to Snowflake: {e}")
+                    return False
+            self._last_health_check = time.monotonic()
+        return True
+    
     def extract_keywords(self, query: str) -> List[str]:
         """Extract meaningful keywords from a search query"""
         # Convert to uppercase for matching
@@ -91,6 +179,306 @@ class DualTableHybridSearcher:
                 return None
         return self.embedding_generator
     
+    def get_vector_index(self) -> Optional[LocalVectorIndex]:
+        """Get the local memory-mapped vector index (lazy loading, None if not built)"""
+        if not self._vector_index_checked:
+            self._vector_index_checked = True
+            vector_index = LocalVectorIndex(self.local_index_dir)
+            if vector_index.load():
+                self.vector_index = vector_index
+        
+        if self.vector_index is not None and self.vector_index.is_loaded:
+            return self.vector_index
+        return None
+    
+    def get_bm25_index(self) -> Optional[InvertedBM25Index]:
+        """Get the local inverted BM25 index (lazy loading, None if not built)"""
+        if not self._bm25_index_checked:
+            self._bm25_index_checked = True
+            bm25_index = InvertedBM25Index(self.local_index_dir)
+            if bm25_index.load():
+                self.bm25_index = bm25_index
+        
+        if self.bm25_index is not None and self.bm25_index.is_loaded:
+            return self.bm25_index
+        return None
+    
+    def _remote_index_generation(self) -> Optional[str]:
+        """
+        Stamp of the document table (row count and latest processed_at), so uploads made
+        from another machine are noticed too; queried at most every
+        INDEX_GENERATION_CHECK_SECONDS. None in local mode or until the first successful check.
+        """
+        if self.local_mirror is not None:
+            return None
+        
+        now = time.monotonic()
+        if now - self._last_generation_check < INDEX_GENERATION_CHECK_SECONDS:
+            return self._remote_generation
+        self._last_generation_check = now
+        
+        hook = self.get_snowflake_hook()
+        if not hook:
+            return self._remote_generation
+        try:
+            result = hook.query_snowflake(
+                f"SELECT COUNT(*) AS documents, MAX(processed_at) AS processed_at FROM {self.document_full_table}",
+                method='pandas'
+            )
+            documents, processed_at = result.iloc[0, 0], result.iloc[0, 1]
+            self._remote_generation = f"{documents}:{processed_at}"
+        except Exception as e:
+            print(f"Error checking index generation: {e}")
+        return self._remote_generation
+    
+    def _check_index_generation(self):
+        """
+        Drop cached results after an index upload, and reload the local indexes after a
+        local upload bumped the generation stamp (loading them if none existed before)
+        """
+        local_generation = read_index_generation(self.local_index_dir)
+        generation = (local_generation, self._remote_index_generation())
+        previous = self._index_generation
+        if generation == previous:
+            return
+        
+        self._index_generation = generation
+        if local_generation == previous[0] and previous[1] is None:
+            # First look at the document table: nothing is known to have changed
+            return
+        
+        self.result_cache.clear()
+        self._chunk_columns = None
+        if local_generation == previous[0]:
+            return
+        
+        # Swap in freshly loaded indexes so concurrent searches never see a half-reloaded one
+        vector_index = LocalVectorIndex(self.vector_index.index_dir if self.vector_index is not None
+                                        else self.local_index_dir)
+        if vector_index.load():
+            self.vector_index = vector_index
+            self._vector_index_checked = True
+        bm25_index = InvertedBM25Index(self.bm25_index.index_dir if self.bm25_index is not None
+                                       else self.local_index_dir)
+        if bm25_index.load():
+            self.bm25_index = bm25_index
+            self._bm25_index_checked = True
+    
+    def _chunk_table_columns(self) -> set:
+        """Lowercase column names of the chunk table (looked up once; empty if unavailable)"""
+        if self._chunk_columns is None:
+            hook = self.get_snowflake_hook()
+            try:
+                result = hook.query_snowflake(f"SELECT * FROM {self.chunk_full_table} LIMIT 0", method='pandas')
+                self._chunk_columns = {str(column).lower() for column in result.columns}
+            except Exception as e:
+                print(f"Error reading chunk table columns: {e}")
+                self._chunk_columns = set()
+        return self._chunk_columns
+    
+    def _embedding_columns(self, alias: str = "c.") -> List[str]:
+        """Stored embedding columns of the chunk table (float array, plus quantized codes if present)"""
+        columns = [f"{alias}embedding"]
+        if 'embedding_q' in self._chunk_table_columns():
+            columns += [f"{alias}embedding_q", f"{alias}embedding_scale"]
+        return columns
+    
+    def _canonical_chunk_condition(self) -> Optional[str]:
+        """Predicate excluding near-duplicate chunks (None for tables without duplicate_of)"""
+        if 'duplicate_of' in self._chunk_table_columns():
+            return "c.duplicate_of IS NULL"
+        return None
+    
+    def _chunk_filter_conditions(self, category: Optional[str], subcategory: Optional[str]) -> List[str]:
+        """
+        Category filters on the chunk table itself (alias ``c``)
+        
+        The chunk table is clustered by (category, subcategory, document_id), so these
+        predicates let Snowflake prune micro-partitions instead of scanning every chunk
+        and filtering through the join. Tables created before the columns existed get
+        no extra predicates (the document-level filter still applies).
+        """
+        if not category and not subcategory:
+            return []
+        
+        if not {'category', 'subcategory'} <= self._chunk_table_columns():
+            return []
+        
+        conditions = []
+        if category:
+            conditions.append(f"c.category = '{category}'")
+        if subcategory:
+            conditions.append(f"c.subcategory = '{subcategory}'")
+        return conditions
+    
+    def _cached_results(self, cache_key: Tuple) -> Optional[List[Dict]]:
+        """Results cached for this key under the current index generation, or None"""
+        self._check_index_generation()
+        return self.result_cache.get(cache_key)
+    
+    def _cache_results(self, cache_key: Tuple, results: List[Dict]):
+        # Empty results may come from a failed query, so only real hits are cached
+        if results:
+            self.result_cache.put(cache_key, results)
+    
+    def get_bm25_candidates(self, query: str, k: int, category: Optional[str] = None,
+                            subcategory: Optional[str] = None) -> Optional[Dict[str, float]]:
+        """
+        Keyword candidates scored by the local BM25 index
+        
+        Scores are divided by the best score so they sit on the same 0-1 scale as
+        cosine similarity and the bm25/embedding weights keep their meaning.
+        
+        Args:
+            query: Search query string
+            k: Number of candidates to return
+            category: Optional category filter
+            subcategory: Optional subcategory filter (team)
+            
+        Returns:
+            Dictionary mapping chunk_id -> normalized BM25 score, or None if no local index is available
+        """
+        bm25_index = self.get_bm25_index()
+        if bm25_index is None:
+            return None
+        
+        try:
+            scores = bm25_index.search(tokenize_for_bm25(query), k, category=category, subcategory=subcategory)
+        except Exception as e:
+            print(f"Error querying local BM25 index: {e}")
+            return None
+        
+        if not scores:
+            return {}
+        max_score = max(scores.values())
+        return {chunk_id: score / max_score for chunk_id, score in scores.items()}
+    
+    @staticmethod
+    def _parse_embedding(value) -> Optional[List[float]]:
+        """Parse an embedding returned from Snowflake (stored as JSON string)"""
+        if isinstance(value, str):
+            value = json.loads(value) if value.startswith('[') else None
+        if value is not None and len(value) > 1:
+            return list(value)
+        return None
+    
+    @classmethod
+    def _row_embedding(cls, row: Dict) -> Optional[List[float]]:
+        """Embedding of a chunk row: the float array, or the quantized codes when only those are stored"""
+        value = row.get('embedding')
+        embedding = cls._parse_embedding(value) if isinstance(value, (str, list, np.ndarray)) else None
+        if embedding is None and isinstance(row.get('embedding_q'), (bytes, bytearray)):
+            decoded = decode_embedding(row['embedding_q'], row.get('embedding_scale'))
+            embedding = decoded.tolist() if decoded is not None else None
+        return embedding
+    
+    def compute_semantic_scores(self, hook: SnowflakeHook, chunks: List[Dict],
+                                query_embedding: np.ndarray) -> Dict[str, float]:
+        """
+        Cosine similarity between the query and each candidate chunk
+        
+        Uses the local vector index when available. Chunks missing from the index
+        (e.g. index built before the latest upload) fall back to their Snowflake
+        embeddings, either already present on the chunk rows or fetched in one query.
+        
+        Args:
+            hook: Snowflake connection hook
+            chunks: Candidate chunk rows (must contain chunk_id)
+            query_embedding: Query embedding vector
+            
+        Returns:
+            Dictionary mapping chunk_id -> cosine similarity
+        """
+        chunk_ids = [chunk['chunk_id'] for chunk in chunks]
+        scores: Dict[str, float] = {}
+        
+        vector_index = self.get_vector_index()
+        if vector_index:
+            scores = vector_index.score(query_embedding, chunk_ids)
+        
+        missing_ids = [chunk_id for chunk_id in chunk_ids if chunk_id not in scores]
+        if not missing_ids:
+            return scores
+        
+        embedding_keys = ('embedding', 'embedding_q')
+        raw_embeddings = {chunk['chunk_id']: chunk for chunk in chunks
+                          if any(chunk.get(key) is not None for key in embedding_keys)}
+        to_fetch = [chunk_id for chunk_id in missing_ids if chunk_id not in raw_embeddings]
+        if to_fetch:
+            try:
+                id_list = ', '.join(f"'{chunk_id}'" for chunk_id in to_fetch)
+                result = hook.query_snowflake(
+                    f"SELECT chunk_id, {', '.join(self._embedding_columns(alias=''))} "
+                    f"FROM {self.chunk_full_table} WHERE chunk_id IN ({id_list})"
+                )
+                if result is not None and not result.empty:
+                    raw_embeddings.update((row['chunk_id'], row) for row in result.to_dict('records'))
+            except Exception as e:
+                print(f"Error fetching chunk embeddings: {e}")
+        
+        parsed_ids = []
+        parsed_embeddings = []
+        for chunk_id in missing_ids:
+            try:
+                embedding = self._row_embedding(raw_embeddings.get(chunk_id, {}))
+            except Exception as e:
+                print(f"Error parsing embedding for chunk {chunk_id}: {e}")
+                embedding = None
+            if embedding:
+                parsed_ids.append(chunk_id)
+                parsed_embeddings.append(embedding)
+        
+        if parsed_embeddings:
+            doc_vecs = np.asarray(parsed_embeddings, dtype=np.float32)
+            doc_norms = np.linalg.norm(doc_vecs, axis=1)
+            doc_norms[doc_norms == 0] = 1.0
+            query_vec = np.asarray(query_embedding, dtype=np.float32)
+            query_norm = np.linalg.norm(query_vec) or 1.0
+            similarities = (doc_vecs @ query_vec) / (doc_norms * query_norm)
+            scores.update(zip(parsed_ids, similarities.tolist()))
+        
+        return scores
+    
+    def get_ann_candidates(self, query_embedding: Optional[np.ndarray], top_k: int,
+                           category: Optional[str] = None, subcategory: Optional[str] = None) -> List[str]:
+        """
+        Semantic candidate chunk IDs from the local ANN index (no keyword match required)
+        
+        Args:
+            query_embedding: Query embedding vector (None disables ANN candidates)
+            top_k: Number of final results requested
+            category: Optional category filter
+            subcategory: Optional subcategory filter (team)
+            
+        Returns:
+            List of candidate chunk IDs, best first
+        """
+        vector_index = self.get_vector_index()
+        if vector_index is None or query_embedding is None:
+            return []
+        
+        try:
+            neighbours = vector_index.search(
+                query_embedding, top_k * ANN_CANDIDATE_MULTIPLIER, category=category, subcategory=subcategory
+            )
+            return list(neighbours.keys())
+        except Exception as e:
+            print(f"Error getting ANN candidates: {e}")
+            return []
+    
+    @staticmethod
+    def _ann_union_clause(source: str, ann_chunk_ids: List[str]) -> str:
+        """SQL that appends ANN candidate rows from `source` not already in keyword_candidates"""
+        if not ann_chunk_ids:
+            return ""
+        id_list = ', '.join(f"'{chunk_id}'" for chunk_id in ann_chunk_ids)
+        return f"""
+            UNION ALL
+            SELECT *
+            FROM {source}
+            WHERE chunk_id IN ({id_list})
+              AND chunk_id NOT IN (SELECT chunk_id FROM keyword_candidates)"""
+    
     def calculate_cosine_similarity(self, query_embedding: np.ndarray, doc_embeddings: List[List[float]]) -> List[float]:
         """
         Calculate cosine similarity between query and document embeddings
@@ -150,268 +538,463 @@ class DualTableHybridSearcher:
         Returns:
             List of search results with context chunks
         """
+        cache_key = SearchResultCache.key_for('context', query, category, subcategory, top_k,
+                                              bm25_weight, embedding_weight, context_window)
+        results = self._cached_results(cache_key)
+        if results is None:
+            results = self._search_documents_with_context(query, category, subcategory, top_k,
+                                                          bm25_weight, embedding_weight, context_window)
+            self._cache_results(cache_key, results)
+        return results
+    
+    def _search_documents_with_context(self, query: str, category: Optional[str], subcategory: Optional[str],
+                                       top_k: int, bm25_weight: float, embedding_weight: float,
+                                       context_window: int) -> List[Dict]:
+        """Uncached ``search_documents_with_context``"""
         hook = self.get_snowflake_hook()
         if not hook:
             return []
         
         try:
-            # Step 1: Filter documents first
-            doc_filter_conditions = []
-            if category:
-                doc_filter_conditions.append(f"category = '{category}'")
-            if subcategory:
-                doc_filter_conditions.append(f"subcategory = '{subcategory}'")
-            
-            doc_where_clause = ""
-            if doc_filter_conditions:
-                doc_where_clause = f"WHERE {' AND '.join(doc_filter_conditions)}"
-            
-            # Extract keywords from query
-            keywords = self.extract_keywords(query)
-            if not keywords:
-                return []
+            # Query embedding drives both ANN candidate generation and re-ranking
+            embedding_generator = self.get_embedding_generator()
+            query_embedding = None
             
-            keyword_regex = self.build_keyword_regex(keywords)
-            
-            # Step 2: Get filtered documents and their chunks with hybrid search
-            hybrid_search_query = f"""
-            WITH filtered_documents AS (
-                SELECT document_id, document_hash, chunk_count, full_content,
-                       relative_path, file_name, category, subcategory, document_title,
-                       content_type, github_file_url, github_branch, last_modified
-                FROM {self.document_full_table}
-                {doc_where_clause}
-            ),
-            filtered_chunks AS (
-                SELECT 
-                    fd.document_id,
-                    fd.document_hash,
-                    fd.chunk_count,
-                    fd.full_content,
-                    fd.relative_path,
-                    fd.file_name,
-                    fd.category,
-                    fd.subcategory,
-                    fd.document_title,
-                    fd.content_type,
-                    fd.github_file_url,
-                    fd.github_branch,
-                    fd.last_modified,
-                    c.chunk_id,
-                    c.chunk_hash,
-                    c.content,
-                    c.bm25_text,
-                    c.embedding,
-                    c.content_length,
-                    c.chunk_start,
-                    c.chunk_end,
-                    -- Calculate BM25 score using dynamic keyword matching
-                    (REGEXP_COUNT(UPPER(c.bm25_text), '{keyword_regex}') * 0.4 +
-                     REGEXP_COUNT(UPPER(c.content), '{keyword_regex}') * 0.3 +
-                     REGEXP_COUNT(UPPER(fd.document_title), '{keyword_regex}') * 0.2 +
-                     REGEXP_COUNT(UPPER(fd.file_name), '{keyword_regex}') * 0.1) as bm25_score,
-                    -- Add row number for chunk ordering within document
-                    ROW_NUMBER() OVER (PARTITION BY fd.document_id ORDER BY c.chunk_start) as chunk_order
-                FROM filtered_documents fd
-                JOIN {self.chunk_full_table} c ON fd.document_id = c.document_id
+            if embedding_generator:
+                query_embedding = embedding_generator.generate_single_embedding(query)
+            
+            hybrid_search_query, local_bm25_scores = self._context_candidates_query(
+                query, query_embedding, category, subcategory, top_k
             )
-            SELECT *
-            FROM filtered_chunks
-            WHERE bm25_score > 0
-            ORDER BY bm25_score DESC
-            LIMIT {top_k * 3}  -- Get more for re-ranking with embeddings
-            """
+            if hybrid_search_query is None:
+                return []
             
             result = hook.query_snowflake(hybrid_search_query)
             if result is None or result.empty:
                 return []
             
-            # Convert to dictionaries
-            chunks = result.to_dict('records')
-            
-            if not chunks:
+            # Step 3-4: Score and re-rank the candidates
+            top_chunks = self._rank_context_chunks(
+                hook, result.to_dict('records'), local_bm25_scores, query_embedding,
+                top_k, bm25_weight, embedding_weight
+            )
+            if not top_chunks:
                 return []
             
-            # Step 3: Add semantic search scoring
-            embedding_generator = self.get_embedding_generator()
-            query_embedding = None
+            # Step 5: Document metadata and bodies for the hits only (bodies from cache when possible)
+            self._attach_documents(hook, top_chunks)
             
-            if embedding_generator:
-                query_embedding = embedding_generator.generate_single_embedding(query)
+            # Step 6: Get context windows for all selected chunks in one round trip
+            return self._get_chunk_context_windows(hook, top_chunks, context_window)
             
-            # Calculate combined scores and add semantic similarity
-            for chunk in chunks:
-                semantic_score = 0.0
-                
-                if query_embedding is not None and chunk.get('embedding'):
-                    try:
-                        # Parse embedding from database (stored as JSON string)
-                        doc_embedding = chunk['embedding']
-                        if isinstance(doc_embedding, str):
-                            # Parse JSON string to list
-                            doc_embedding = json.loads(doc_embedding) if doc_embedding.startswith('[') else None
-                        
-                        if doc_embedding and isinstance(doc_embedding, list) and len(doc_embedding) > 1:
-                            # Calculate cosine similarity
-                            doc_emb_array = np.array(doc_embedding, dtype=float)
-                            query_emb_array = np.array(query_embedding, dtype=float)
-                            
-                            # Normalize vectors
-                            doc_norm = np.linalg.norm(doc_emb_array)
-                            query_norm = np.linalg.norm(query_emb_array)
-                            
-                            if doc_norm > 0 and query_norm > 0:
-                                semantic_score = np.dot(doc_emb_array, query_emb_array) / (doc_norm * query_norm)
-                                semantic_score = max(0, semantic_score)  # Ensure non-negative
-                    except Exception as e:
-                        print(f"Error calculating cosine similarity: {e}")
-                        semantic_score = 0.0
-                
-                # Combine BM25 and semantic scores
-                bm25_score = float(chunk.get('bm25_score', 0.0))
-                combined_score = (bm25_weight * bm25_score) + (embedding_weight * semantic_score)
-                
-                chunk['semantic_score'] = semantic_score
-                chunk['combined_score'] = combined_score
+        except Exception as e:
+            print(f"Error in enhanced hybrid search: {e}")
+            return []
+
+    def _context_candidates_query(self, query: str, query_embedding: Optional[np.ndarray],
+                                  category: Optional[str], subcategory: Optional[str],
+                                  top_k: int) -> Tuple[Optional[str], Optional[Dict[str, float]]]:
+        """
+        Candidate-phase SQL for ``search_documents_with_context`` (ids and scores only)
+        
+        Returns:
+            Tuple of (SQL, or None when there are no candidates; local BM25 scores, or
+            None when keyword scoring runs in Snowflake)
+        """
+        # Step 1: Filter documents first
+        doc_filter_conditions = []
+        if category:
+            doc_filter_conditions.append(f"category = '{category}'")
+        if subcategory:
+            doc_filter_conditions.append(f"subcategory = '{subcategory}'")
+        
+        doc_where_clause = ""
+        if doc_filter_conditions:
+            doc_where_clause = f"WHERE {' AND '.join(doc_filter_conditions)}"
+        
+        # Extract keywords from query
+        keywords = self.extract_keywords(query)
+        
+        # Semantic-only candidates that may share no keyword with the query
+        ann_chunk_ids = self.get_ann_candidates(query_embedding, top_k, category, subcategory)
+        
+        # Keyword candidates from the local BM25 index replace the REGEXP_COUNT scan when available
+        local_bm25_scores = self.get_bm25_candidates(query, top_k * 3, category, subcategory)
+        
+        if local_bm25_scores is not None:
+            candidate_ids = list(dict.fromkeys(list(local_bm25_scores) + ann_chunk_ids))
+            if not candidate_ids:
+                return None, local_bm25_scores
             
-            # Step 4: Re-rank by combined score and take top_k
-            chunks.sort(key=lambda x: x['combined_score'], reverse=True)
-            top_chunks = chunks[:top_k]
+            candidate_list = ', '.join(f"'{chunk_id}'" for chunk_id in candidate_ids)
+            doc_filter_conditions.append(
+                f"document_id IN (SELECT document_id FROM {self.chunk_full_table} WHERE chunk_id IN ({candidate_list}))"
+            )
+            doc_where_clause = f"WHERE {' AND '.join(doc_filter_conditions)}"
+            bm25_expression = "0"
+            candidate_select = f"""
+        SELECT *
+        FROM filtered_chunks
+        WHERE chunk_id IN ({candidate_list})"""
+        else:
+            if not keywords and not ann_chunk_ids:
+                return None, None
             
-            # Step 5: Get context windows for each selected chunk
-            results_with_context = []
+            if keywords:
+                keyword_regex = self.build_keyword_regex(keywords)
+                bm25_expression = f"""(REGEXP_COUNT(UPPER(c.bm25_text), '{keyword_regex}') * 0.4 +
+                 REGEXP_COUNT(UPPER(c.content), '{keyword_regex}') * 0.3 +
+                 REGEXP_COUNT(UPPER(fd.document_title), '{keyword_regex}') * 0.2 +
+                 REGEXP_COUNT(UPPER(fd.file_name), '{keyword_regex}') * 0.1)"""
+            else:
+                bm25_expression = "0"
             
-            for selected_chunk in top_chunks:
-                context_result = self._get_chunk_context_window(
-                    hook, 
-                    selected_chunk, 
-                    context_window
-                )
-                results_with_context.append(context_result)
+            # Near-duplicates score 0 rather than being filtered out, so chunk_order
+            # still counts every chunk of the document for context windows
+            canonical_condition = self._canonical_chunk_condition()
+            if canonical_condition and keywords:
+                bm25_expression = f"CASE WHEN {canonical_condition} THEN {bm25_expression} ELSE 0 END"
+            candidate_select = f""",
+        keyword_candidates AS (
+            SELECT *
+            FROM filtered_chunks
+            WHERE bm25_score > 0
+            ORDER BY bm25_score DESC
+            LIMIT {top_k * 3}  -- Get more for re-ranking with embeddings
+        )
+        SELECT *
+        FROM keyword_candidates{self._ann_union_clause('filtered_chunks', ann_chunk_ids)}"""
+        
+        # Embeddings only need to travel over the wire when there is no local vector index
+        embedding_column = "" if self.get_vector_index() else f"{', '.join(self._embedding_columns())},"
+        
+        chunk_filter_conditions = self._chunk_filter_conditions(category, subcategory)
+        chunk_where_clause = ""
+        if chunk_filter_conditions:
+            chunk_where_clause = f"WHERE {' AND '.join(chunk_filter_conditions)}"
+        
+        # Step 2: Candidate phase returns ids and scores only; document metadata,
+        # bodies and neighbour chunks are fetched for the final top_k
+        hybrid_search_query = f"""
+        WITH filtered_documents AS (
+            SELECT document_id, document_hash, chunk_count, document_title, file_name
+            FROM {self.document_full_table}
+            {doc_where_clause}
+        ),
+        filtered_chunks AS (
+            SELECT 
+                fd.document_id,
+                fd.document_hash,
+                fd.chunk_count,
+                c.chunk_id,
+                {embedding_column}
+                c.chunk_start,
+                -- Calculate BM25 score using dynamic keyword matching
+                {bm25_expression} as bm25_score,
+                -- Add row number for chunk ordering within document
+                ROW_NUMBER() OVER (PARTITION BY fd.document_id ORDER BY c.chunk_start) as chunk_order
+            FROM filtered_documents fd
+            JOIN {self.chunk_full_table} c ON fd.document_id = c.document_id
+            {chunk_where_clause}
+        ){candidate_select}
+        """
+        return hybrid_search_query, local_bm25_scores
+
+    def _rank_context_chunks(self, hook: SnowflakeHook, chunks: List[Dict],
+                             local_bm25_scores: Optional[Dict[str, float]],
+                             query_embedding: Optional[np.ndarray], top_k: int,
+                             bm25_weight: float, embedding_weight: float) -> List[Dict]:
+        """Combine BM25 and (non-negative) semantic scores and return the top_k candidate chunks"""
+        if not chunks:
+            return []
+        
+        if local_bm25_scores is not None:
+            for chunk in chunks:
+                chunk['bm25_score'] = local_bm25_scores.get(chunk['chunk_id'], 0.0)
+        
+        # Add semantic search scoring
+        semantic_scores = {}
+        if query_embedding is not None:
+            semantic_scores = self.compute_semantic_scores(hook, chunks, query_embedding)
+        
+        # Calculate combined scores and add semantic similarity
+        for chunk in chunks:
+            semantic_score = max(0.0, semantic_scores.get(chunk['chunk_id'], 0.0))  # Ensure non-negative
             
-            return results_with_context
+            # Combine BM25 and semantic scores
+            bm25_score = float(chunk.get('bm25_score', 0.0))
+            combined_score = (bm25_weight * bm25_score) + (embedding_weight * semantic_score)
             
-        except Exception as e:
-            print(f"Error in enhanced hybrid search: {e}")
-            return []
+            chunk['semantic_score'] = semantic_score
+            chunk['combined_score'] = combined_score
+            for key in ('embedding', 'embedding_q', 'embedding_scale'):
+                chunk.pop(key, None)
+        
+        # Re-rank by combined score and take top_k
+        chunks.sort(key=lambda x: x['combined_score'], reverse=True)
+        return chunks[:top_k]
 
-    def _get_chunk_context_window(self, hook: SnowflakeHook, selected_chunk: Dict, context_window: int = 2) -> Dict:
+    def _attach_documents(self, hook: SnowflakeHook, chunks: List[Dict]):
+        """Merge document metadata and full_content into the selected chunks (one query)"""
+        documents = self._fetch_documents(hook, {chunk['document_id']: chunk['document_hash'] for chunk in chunks})
+        for chunk in chunks:
+            chunk.update(documents.get(chunk['document_id'], {}))
+
+    # Document-level columns returned with each hit (full_content comes from the body cache)
+    DOCUMENT_METADATA_COLUMNS = (
+        'document_id', 'document_hash', 'chunk_count', 'relative_path', 'file_name', 'category',
+        'subcategory', 'document_title', 'content_type', 'github_file_url', 'github_branch', 'last_modified'
+    )
+    
+    def _fetch_documents(self, hook: SnowflakeHook, document_hashes: Dict[str, str]) -> Dict[str, Dict]:
         """
-        Get context window around a selected chunk (selected + preceding + following chunks)
+        Metadata and full content for the documents of the final hits, in one query
+        
+        ``full_content`` is only projected for documents whose body is not already in
+        the document body cache; the rest are filled from the cache.
         
         Args:
             hook: Snowflake connection hook
-            selected_chunk: The main chunk that was found by search
+            document_hashes: Mapping of document_id -> document_hash for the hits
+            
+        Returns:
+            Dictionary mapping document_id -> document metadata (including full_content)
+        """
+        if not document_hashes:
+            return {}
+        
+        # Read cached bodies up front: fetched bodies put below may evict them from the LRU
+        cached = self.document_cache.get_many(document_hashes.values())
+        fetch_ids = {document_id for document_id, document_hash in document_hashes.items()
+                     if document_hash not in cached}
+        
+        if fetch_ids:
+            fetch_list = ', '.join(f"'{document_id}'" for document_id in sorted(fetch_ids))
+            body_column = f"CASE WHEN document_id IN ({fetch_list}) THEN full_content END AS full_content"
+        else:
+            body_column = "NULL AS full_content"
+        
+        document_list = ', '.join(f"'{document_id}'" for document_id in document_hashes)
+        result = hook.query_snowflake(f"""
+            SELECT {', '.join(self.DOCUMENT_METADATA_COLUMNS)},
+                   {body_column}
+            FROM {self.document_full_table}
+            WHERE document_id IN ({document_list})
+            """)
+        rows = [] if result is None or result.empty else result.to_dict('records')
+        
+        documents = {}
+        for row in rows:
+            # An all-NULL column comes back as NaN, so test for an actual string
+            if isinstance(row.get('full_content'), str):
+                self.document_cache.put(row['document_hash'], row['full_content'])
+            elif row['document_id'] in fetch_ids:
+                row['full_content'] = ''  # NULL in the table
+            else:
+                row['full_content'] = cached[document_hashes[row['document_id']]]
+            documents[row['document_id']] = row
+        return documents
+    
+    def _fetch_chunk_rows(self, hook: SnowflakeHook, chunk_ids: List[str]) -> Dict[str, Dict]:
+        """
+        Chunk content and document metadata for the final hits of ``search_documents``
+        
+        Args:
+            hook: Snowflake connection hook
+            chunk_ids: Chunk IDs of the hits
+            
+        Returns:
+            Dictionary mapping chunk_id -> result row
+        """
+        if not chunk_ids:
+            return {}
+        
+        chunk_list = ', '.join(f"'{chunk_id}'" for chunk_id in chunk_ids)
+        result = hook.query_snowflake(f"""
+            SELECT 
+                d.document_id,
+                d.document_hash,
+                c.chunk_id,
+                c.chunk_hash,
+                d.relative_path,
+                d.file_name,
+                d.file_path,
+                d.category,
+                d.subcategory,
+                d.document_title,
+                d.content_type,
+                c.content,
+                c.content_length,
+                d.database_name,
+                d.schema_name,
+                d.table_name,
+                d.query_name,
+                d.query_type,
+                d.referenced_tables,
+                d.github_file_url,
+                d.github_branch,
+                d.github_commit_sha,
+                d.last_modified,
+                d.processed_at
+            FROM {self.document_full_table} d
+            JOIN {self.chunk_full_table} c ON d.document_id = c.document_id
+            WHERE c.chunk_id IN ({chunk_list})
+            """)
+        if result is None or result.empty:
+            return {}
+        return {row['chunk_id']: row for row in result.to_dict('records')}
+
+    @staticmethod
+    def _context_range(selected_chunk: Dict, context_window: int) -> Tuple[int, int]:
+        """Chunk order range to return for a selected chunk (whole document if it has 5 or fewer chunks)"""
+        chunk_count = selected_chunk['chunk_count']
+        if chunk_count <= 5:
+            return 1, chunk_count
+        
+        selected_chunk_order = selected_chunk['chunk_order']
+        return (max(1, selected_chunk_order - context_window),
+                min(chunk_count, selected_chunk_order + context_window))
+
+    def _get_chunk_context_windows(self, hook: SnowflakeHook, selected_chunks: List[Dict],
+                                   context_window: int = 2) -> List[Dict]:
+        """
+        Get context windows around several selected chunks with a single query
+        
+        Neighbour chunks for every hit are fetched in one batched query and
+        stitched client-side, instead of one round trip per hit.
+        
+        Args:
+            hook: Snowflake connection hook
+            selected_chunks: Chunks found by search, in rank order
             context_window: Number of chunks before/after to include
             
         Returns:
-            Dictionary with selected chunk + context chunks + metadata
+            List of context results, in the same order as selected_chunks
         """
+        if not selected_chunks:
+            return []
+        
         try:
-            document_id = selected_chunk['document_id']
-            chunk_count = selected_chunk['chunk_count'] 
-            selected_chunk_order = selected_chunk['chunk_order']
+            ranges = [(chunk['document_id'], *self._context_range(chunk, context_window))
+                      for chunk in selected_chunks]
+            document_list = ', '.join(sorted({f"'{document_id}'" for document_id, _, _ in ranges}))
+            range_conditions = '\n                   OR '.join(
+                f"(document_id = '{document_id}' AND chunk_order BETWEEN {start_order} AND {end_order})"
+                for document_id, start_order, end_order in dict.fromkeys(ranges)
+            )
             
-            # If document has 5 or fewer chunks, return all chunks
-            if chunk_count <= 5:
-                context_query = f"""
+            context_query = f"""
+            WITH ordered_chunks AS (
                 SELECT 
+                    c.document_id,
                     c.chunk_id,
                     c.chunk_hash,
                     c.content,
                     c.content_length,
                     c.chunk_start,
                     c.chunk_end,
-                    ROW_NUMBER() OVER (ORDER BY c.chunk_start) as chunk_order
+                    ROW_NUMBER() OVER (PARTITION BY c.document_id ORDER BY c.chunk_start) as chunk_order
                 FROM {self.chunk_full_table} c
-                WHERE c.document_id = '{document_id}'
-                ORDER BY c.chunk_start
-                """
-            else:
-                # Get context window: selected chunk ± context_window
-                start_order = max(1, selected_chunk_order - context_window)
-                end_order = min(chunk_count, selected_chunk_order + context_window)
-                
-                context_query = f"""
-                WITH ordered_chunks AS (
-                    SELECT 
-                        c.chunk_id,
-                        c.chunk_hash,
-                        c.content,
-                        c.content_length,
-                        c.chunk_start,
-                        c.chunk_end,
-                        ROW_NUMBER() OVER (ORDER BY c.chunk_start) as chunk_order
-                    FROM {self.chunk_full_table} c
-                    WHERE c.document_id = '{document_id}'
-                )
-                SELECT *
-                FROM ordered_chunks
-                WHERE chunk_order BETWEEN {start_order} AND {end_order}
-                ORDER BY chunk_order
-                """
+                WHERE c.document_id IN ({document_list})
+            )
+            SELECT *
+            FROM ordered_chunks
+            WHERE {range_conditions}
+            ORDER BY document_id, chunk_order
+            """
             
             context_result = hook.query_snowflake(context_query)
+            rows = [] if context_result is None or context_result.empty else context_result.to_dict('records')
+            
+            # Stitch each hit's window together from the shared result
+            rows_by_document = {}
+            for row in rows:
+                rows_by_document.setdefault(row.pop('document_id'), []).append(row)
             
-            if context_result is None or context_result.empty:
+            results = []
+            for selected_chunk, (document_id, start_order, end_order) in zip(selected_chunks, ranges):
+                context_chunks = [
+                    row for row in rows_by_document.get(document_id, [])
+                    if start_order <= row['chunk_order'] <= end_order
+                ]
                 # Fallback to just the selected chunk
-                context_chunks = [selected_chunk]
-            else:
-                context_chunks = context_result.to_dict('records')
-            
-            # Combine selected chunk metadata with context chunks
-            result = {
-                # Document-level metadata from selected chunk
-                'document_id': selected_chunk['document_id'],
-                'document_hash': selected_chunk['document_hash'], 
-                'document_title': selected_chunk['document_title'],
-                'relative_path': selected_chunk['relative_path'],
-                'file_name': selected_chunk['file_name'],
-                'category': selected_chunk['category'],
-                'subcategory': selected_chunk['subcategory'],
-                'content_type': selected_chunk['content_type'],
-                'github_file_url': selected_chunk['github_file_url'],
-                'github_branch': selected_chunk['github_branch'],
-                'last_modified': selected_chunk['last_modified'],
-                
-                # Search-specific metadata
-                'selected_chunk_id': selected_chunk['chunk_id'],
-                'bm25_score': selected_chunk.get('bm25_score', 0.0),
-                'semantic_score': selected_chunk.get('semantic_score', 0.0),
-                'combined_score': selected_chunk.get('combined_score', 0.0),
-                
-                # Context information
-                'chunk_count': chunk_count,
-                'context_window_size': len(context_chunks),
-                'is_full_document': chunk_count <= 5,
-                
-                # All chunks in context window
-                'context_chunks': context_chunks,
-                
-                # Combined content from context window
-                'context_content': '\n\n'.join([chunk['content'] for chunk in context_chunks]),
-                
-                # Full document content (if available)
-                'full_content': selected_chunk.get('full_content', '')
-            }
+                results.append(self._build_context_result(selected_chunk, context_chunks or [selected_chunk]))
             
-            return result
+            return results
             
         except Exception as e:
-            print(f"Error getting chunk context window: {e}")
-            # Fallback to just the selected chunk
-            return {
-                'document_id': selected_chunk.get('document_id'),
-                'document_title': selected_chunk.get('document_title'),
-                'github_file_url': selected_chunk.get('github_file_url'),
-                'github_branch': selected_chunk.get('github_branch'),
-                'category': selected_chunk.get('category'),
-                'subcategory': selected_chunk.get('subcategory'),
-                'selected_chunk_id': selected_chunk.get('chunk_id'),
-                'context_chunks': [selected_chunk],
-                'context_content': selected_chunk.get('content', ''),
-                'error': str(e)
-            }
+            print(f"Error getting chunk context windows: {e}")
+            return [self._context_fallback(selected_chunk, e) for selected_chunk in selected_chunks]
+
+    def _get_chunk_context_window(self, hook: SnowflakeHook, selected_chunk: Dict, context_window: int = 2) -> Dict:
+        """
+        Get context window around a selected chunk (selected + preceding + following chunks)
+        
+        Args:
+            hook: Snowflake connection hook
+            selected_chunk: The main chunk that was found by search
+            context_window: Number of chunks before/after to include
+            
+        Returns:
+            Dictionary with selected chunk + context chunks + metadata
+        """
+        return self._get_chunk_context_windows(hook, [selected_chunk], context_window)[0]
+
+    @staticmethod
+    def _build_context_result(selected_chunk: Dict, context_chunks: List[Dict]) -> Dict:
+        """Combine selected chunk metadata with its context chunks"""
+        chunk_count = selected_chunk['chunk_count']
+        
+        return {
+            # Document-level metadata from selected chunk
+            'document_id': selected_chunk.get('document_id'),
+            'document_hash': selected_chunk.get('document_hash'), 
+            'document_title': selected_chunk.get('document_title'),
+            'relative_path': selected_chunk.get('relative_path'),
+            'file_name': selected_chunk.get('file_name'),
+            'category': selected_chunk.get('category'),
+            'subcategory': selected_chunk.get('subcategory'),
+            'content_type': selected_chunk.get('content_type'),
+            'github_file_url': selected_chunk.get('github_file_url'),
+            'github_branch': selected_chunk.get('github_branch'),
+            'last_modified': selected_chunk.get('last_modified'),
+            
+            # Search-specific metadata
+            'selected_chunk_id': selected_chunk.get('chunk_id'),
+            'bm25_score': selected_chunk.get('bm25_score', 0.0),
+            'semantic_score': selected_chunk.get('semantic_score', 0.0),
+            'combined_score': selected_chunk.get('combined_score', 0.0),
+            
+            # Context information
+            'chunk_count': chunk_count,
+            'context_window_size': len(context_chunks),
+            'is_full_document': chunk_count <= 5,
+            
+            # All chunks in context window
+            'context_chunks': context_chunks,
+            
+            # Combined content from context window
+            'context_content': '\n\n'.join([chunk.get('content', '') for chunk in context_chunks]),
+            
+            # Full document content (if available)
+            'full_content': selected_chunk.get('full_content', '')
+        }
+
+    @staticmethod
+    def _context_fallback(selected_chunk: Dict, error: Exception) -> Dict:
+        """Context result holding just the selected chunk (used when the context query fails)"""
+        return {
+            'document_id': selected_chunk.get('document_id'),
+            'document_title': selected_chunk.get('document_title'),
+            'github_file_url': selected_chunk.get('github_file_url'),
+            'github_branch': selected_chunk.get('github_branch'),
+            'category': selected_chunk.get('category'),
+            'subcategory': selected_chunk.get('subcategory'),
+            'selected_chunk_id': selected_chunk.get('chunk_id'),
+            'context_chunks': [selected_chunk],
+            'context_content': selected_chunk.get('content', ''),
+            'error': str(error)
+        }
 
     def search_documents(
         self, 
@@ -436,132 +1019,321 @@ class DualTableHybridSearcher:
         Returns:
             List of search results with scores
         """
+        cache_key = SearchResultCache.key_for('documents', query, category, subcategory, top_k,
+                                              bm25_weight, embedding_weight)
+        results = self._cached_results(cache_key)
+        if results is None:
+            results = self._search_documents(query, category, subcategory, top_k, bm25_weight, embedding_weight)
+            self._cache_results(cache_key, results)
+        return results
+    
+    def _search_documents(self, query: str, category: Optional[str], subcategory: Optional[str],
+                          top_k: int, bm25_weight: float, embedding_weight: float) -> List[Dict]:
+        """Uncached ``search_documents``"""
         hook = self.get_snowflake_hook()
         if not hook:
             return []
         
         try:
-            # Build WHERE clause with category and subcategory filtering
-            where_conditions = []
-            if category:
-                where_conditions.append(f"d.category = '{category}'")
-            if subcategory:
-                where_conditions.append(f"d.subcategory = '{subcategory}'")
-            
-            where_clause = ""
-            if where_conditions:
-                where_clause = f"WHERE {' AND '.join(where_conditions)}"
+            # Generate query embedding for semantic search
+            embedding_generator = self.get_embedding_generator()
+            query_embedding = None
             
-            # Enhanced BM25 search using SQL CONTAINS with dual-table join
-            bm25_query = f"""
-            SELECT 
-                d.document_id,
-                d.document_hash,
-                c.chunk_id,
-                c.chunk_hash,
-                d.relative_path,
-                d.file_name,
-                d.file_path,
-                d.category,
-                d.subcategory,
-                d.document_title,
-                d.content_type,
-                c.content,
-                c.bm25_text,
-                c.embedding,
-                c.content_length,
-                d.database_name,
-                d.schema_name,
-                d.table_name,
-                d.query_name,
-                d.query_type,
-                d.referenced_tables,
-                d.github_file_url,
-                d.github_branch,
-                d.github_commit_sha,
-                d.last_modified,
-                d.processed_at,
-                -- Enhanced text search score with new fields
-                CASE 
+            if embedding_generator:
+                query_embedding = embedding_generator.generate_single_embedding(
+                    query, 
+                    query_prefix=self.QUERY_PREFIX
+                )
+            
+            bm25_query, local_bm25_scores = self._document_candidates_query(
+                query, query_embedding, category, subcategory, top_k
+            )
+            if bm25_query is None:
+                return []
+            
+            result = hook.query_snowflake(bm25_query)
+            if result is None or result.empty:
+                return []
+            
+            top_results = self._rank_document_chunks(
+                hook, result.to_dict('records'), local_bm25_scores, query_embedding,
+                top_k, bm25_weight, embedding_weight
+            )
+            
+            # Fetch the full rows for the top_k only
+            self._attach_chunk_rows(hook, top_results)
+            return top_results
+            
+        except Exception as e:
+            print(f"Error in hybrid search: {e}")
+            return []
+    
+    def _document_candidates_query(self, query: str, query_embedding: Optional[np.ndarray],
+                                   category: Optional[str], subcategory: Optional[str],
+                                   top_k: int) -> Tuple[Optional[str], Optional[Dict[str, float]]]:
+        """
+        Candidate-phase SQL for ``search_documents`` (ids and scores only)
+        
+        Returns:
+            Tuple of (SQL, or None when there are no candidates; local BM25 scores, or
+            None when keyword scoring runs in Snowflake)
+        """
+        # Build WHERE clause with category and subcategory filtering
+        where_conditions = []
+        if category:
+            where_conditions.append(f"d.category = '{category}'")
+        if subcategory:
+            where_conditions.append(f"d.subcategory = '{subcategory}'")
+        where_conditions.extend(self._chunk_filter_conditions(category, subcategory))
+        
+        where_clause = ""
+        if where_conditions:
+            where_clause = f"WHERE {' AND '.join(where_conditions)}"
+        
+        # Embeddings only need to travel over the wire when there is no local vector index
+        embedding_column = "" if self.get_vector_index() else f"{', '.join(self._embedding_columns())},"
+        
+        # Semantic-only candidates that may not contain the query text
+        ann_chunk_ids = self.get_ann_candidates(query_embedding, top_k, category, subcategory)
+        
+        # Keyword candidates from the local BM25 index replace the CONTAINS scan when available
+        local_bm25_scores = self.get_bm25_candidates(query, top_k * 3, category, subcategory)
+        
+        if local_bm25_scores is not None:
+            candidate_ids = list(dict.fromkeys(list(local_bm25_scores) + ann_chunk_ids))
+            if not candidate_ids:
+                return None, local_bm25_scores
+            
+            candidate_list = ', '.join(f"'{chunk_id}'" for chunk_id in candidate_ids)
+            where_conditions.append(f"c.chunk_id IN ({candidate_list})")
+            where_clause = f"WHERE {' AND '.join(where_conditions)}"
+            bm25_expression = "0.0"
+            candidate_select = """
+        SELECT *
+        FROM scored_chunks"""
+        else:
+            bm25_expression = f"""CASE 
                     WHEN CONTAINS(UPPER(c.bm25_text), UPPER('{query}')) THEN 1.0
                     WHEN CONTAINS(UPPER(c.content), UPPER('{query}')) THEN 0.8
                     WHEN CONTAINS(UPPER(d.document_title), UPPER('{query}')) THEN 0.7
                     WHEN CONTAINS(UPPER(d.file_name), UPPER('{query}')) THEN 0.6
                     WHEN CONTAINS(UPPER(d.subcategory), UPPER('{query}')) THEN 0.5
                     ELSE 0.0
-                END as bm25_score
+                END"""
+            canonical_condition = self._canonical_chunk_condition()
+            if canonical_condition:
+                where_conditions.append(canonical_condition)
+                where_clause = f"WHERE {' AND '.join(where_conditions)}"
+            candidate_select = f""",
+        keyword_candidates AS (
+            SELECT *
+            FROM scored_chunks
+            ORDER BY bm25_score DESC
+            LIMIT {top_k * 3}  -- Get more for re-ranking
+        )
+        SELECT *
+        FROM keyword_candidates{self._ann_union_clause('scored_chunks', ann_chunk_ids)}"""
+        
+        # Enhanced BM25 search using SQL CONTAINS with dual-table join
+        # (candidate phase returns ids and scores only; rows are fetched for the final top_k)
+        bm25_query = f"""
+        WITH scored_chunks AS (
+            SELECT 
+                d.document_id,
+                c.chunk_id,
+                {embedding_column}
+                -- Enhanced text search score with new fields
+                {bm25_expression} as bm25_score
             FROM {self.document_full_table} d
             JOIN {self.chunk_full_table} c ON d.document_id = c.document_id
             {where_clause}
-            ORDER BY bm25_score DESC
-            LIMIT {top_k * 3}  -- Get more for re-ranking
-            """
+        ){candidate_select}
+        """
+        return bm25_query, local_bm25_scores
+    
+    def _rank_document_chunks(self, hook: SnowflakeHook, documents: List[Dict],
+                              local_bm25_scores: Optional[Dict[str, float]],
+                              query_embedding: Optional[np.ndarray], top_k: int,
+                              bm25_weight: float, embedding_weight: float) -> List[Dict]:
+        """Combine BM25 and embedding scores and return the top_k candidate rows"""
+        if not documents:
+            return []
+        
+        if local_bm25_scores is not None:
+            for doc in documents:
+                doc['bm25_score'] = local_bm25_scores.get(doc['chunk_id'], 0.0)
+        
+        semantic_scores = {}
+        if query_embedding is not None:
+            semantic_scores = self.compute_semantic_scores(hook, documents, query_embedding)
+        
+        # Calculate combined scores
+        final_results = []
+        for doc in documents:
+            try:
+                # Get BM25 score
+                bm25_score = float(doc.get('bm25_score', 0.0))
+                
+                # Embedding similarity (0.0 if unavailable)
+                embedding_score = semantic_scores.get(doc['chunk_id'], 0.0)
+                
+                # Combined score
+                combined_score = (bm25_weight * float(bm25_score)) + (embedding_weight * embedding_score)
+                
+                # Add scores to document
+                doc['bm25_score'] = bm25_score
+                doc['embedding_score'] = embedding_score
+                doc['combined_score'] = combined_score
+                for key in ('embedding', 'embedding_q', 'embedding_scale'):
+                    doc.pop(key, None)
+                
+                final_results.append(doc)
+                
+            except Exception as e:
+                print(f"Error processing document {doc.get('document_id', 'unknown')}: {e}")
+                continue
+        
+        # Sort by combined score and return top_k
+        final_results.sort(key=lambda x: x['combined_score'], reverse=True)
+        return final_results[:top_k]
+    
+    def _attach_chunk_rows(self, hook: SnowflakeHook, results: List[Dict]):
+        """Merge chunk content and document metadata into the selected rows (one query)"""
+        rows = self._fetch_chunk_rows(hook, [doc['chunk_id'] for doc in results])
+        for doc in results:
+            doc.update(rows.get(doc['chunk_id'], {}))
+    
+    def search_many(
+        self,
+        queries: List[str],
+        categories: Optional[Union[str, List[Optional[str]]]] = None,
+        subcategories: Optional[Union[str, List[Optional[str]]]] = None,
+        top_k: int = 5,
+        bm25_weight: float = 0.3,
+        embedding_weight: float = 0.7,
+        with_context: bool = True,
+        context_window: int = 2
+    ) -> List[List[Dict]]:
+        """
+        Run several searches together
+        
+        All queries are embedded in one model call, their candidate queries are
+        combined into a single UNION ALL round trip, and the hits of every query
+        share one document/context fetch. Each query is ranked exactly as
+        ``search_documents_with_context`` (or ``search_documents`` when
+        ``with_context`` is False) would rank it.
+        
+        Args:
+            queries: Search query strings
+            categories: Category filter per query (or one category for all queries)
+            subcategories: Subcategory (team) filter per query (or one for all queries)
+            top_k: Number of top results to return per query
+            bm25_weight: Weight for BM25 score (0.0 to 1.0)
+            embedding_weight: Weight for embedding similarity (0.0 to 1.0)
+            with_context: Return context windows (True) or single chunk rows (False)
+            context_window: Number of chunks before/after to include
             
-            result = hook.query_snowflake(bm25_query)
-            if result is None or result.empty:
-                return []
+        Returns:
+            One list of search results per query, in the order of ``queries``
+        """
+        if not queries:
+            return []
+        
+        def per_query(value, name):
+            if value is None or isinstance(value, str):
+                return [value] * len(queries)
+            if len(value) != len(queries):
+                raise ValueError(f"Expected one {name} per query ({len(queries)}), got {len(value)}")
+            return list(value)
+        
+        categories = per_query(categories, "category")
+        subcategories = per_query(subcategories, "subcategory")
+        
+        # Same keys as the single-query searches, so both share cached results
+        cache_keys = [
+            SearchResultCache.key_for('context', query, category, subcategory, top_k,
+                                      bm25_weight, embedding_weight, context_window)
+            if with_context else
+            SearchResultCache.key_for('documents', query, category, subcategory, top_k,
+                                      bm25_weight, embedding_weight)
+            for query, category, subcategory in zip(queries, categories, subcategories)
+        ]
+        results = [self._cached_results(cache_key) for cache_key in cache_keys]
+        misses = [i for i, cached in enumerate(results) if cached is None]
+        
+        if misses:
+            batch_results = self._search_many(
+                [queries[i] for i in misses], [categories[i] for i in misses],
+                [subcategories[i] for i in misses], top_k, bm25_weight, embedding_weight,
+                with_context, context_window
+            )
+            for i, query_results in zip(misses, batch_results):
+                results[i] = query_results
+                self._cache_results(cache_keys[i], query_results)
+        
+        return results
+    
+    def _search_many(self, queries: List[str], categories: List[Optional[str]],
+                     subcategories: List[Optional[str]], top_k: int, bm25_weight: float,
+                     embedding_weight: float, with_context: bool, context_window: int) -> List[List[Dict]]:
+        """Uncached ``search_many`` (one filter value per query)"""
+        hook = self.get_snowflake_hook()
+        if not hook:
+            return [[] for _ in queries]
+        
+        try:
+            # One encoder call for all queries (query LRU hits are skipped)
+            query_embeddings: List[Optional[np.ndarray]] = [None] * len(queries)
+            embedding_generator = self.get_embedding_generator()
+            if embedding_generator:
+                embeddings = embedding_generator.generate_query_embeddings(
+                    queries, query_prefix=None if with_context else self.QUERY_PREFIX
+                )
+                if embeddings is not None:
+                    query_embeddings = list(embeddings)
             
-            # Convert pandas DataFrame to dictionaries
-            documents = result.to_dict('records')
+            build_candidates_query = self._context_candidates_query if with_context else self._document_candidates_query
+            candidates = [
+                build_candidates_query(query, query_embedding, category, subcategory, top_k)
+                for query, query_embedding, category, subcategory
+                in zip(queries, query_embeddings, categories, subcategories)
+            ]
             
-            if not documents:
-                return []
+            # One round trip for every query's candidates, tagged with the query position
+            rows_by_query: Dict[int, List[Dict]] = {}
+            parts = [
+                f"SELECT {i} AS query_index, candidates.* FROM ({candidate_query}) candidates"
+                for i, (candidate_query, _) in enumerate(candidates) if candidate_query
+            ]
+            if parts:
+                result = hook.query_snowflake("\nUNION ALL\n".join(parts))
+                if result is not None and not result.empty:
+                    for row in result.to_dict('records'):
+                        rows_by_query.setdefault(int(row.pop('query_index')), []).append(row)
             
-            # Generate query embedding for semantic search
-            embedding_generator = self.get_embedding_generator()
-            query_embedding = None
+            rank = self._rank_context_chunks if with_context else self._rank_document_chunks
+            ranked = [
+                rank(hook, rows_by_query.get(i, []), local_bm25_scores, query_embeddings[i],
+                     top_k, bm25_weight, embedding_weight)
+                for i, (_, local_bm25_scores) in enumerate(candidates)
+            ]
             
-            if embedding_generator:
-                query_embedding = embedding_generator.generate_single_embedding(
-                    query, 
-                    query_prefix="Represent this sentence for searching relevant passages:"
-                )
+            # Hits of all queries share one metadata fetch (and one context window query)
+            hits = [hit for results in ranked for hit in results]
+            if not hits:
+                return ranked
             
-            # Calculate combined scores
-            final_results = []
-            for doc in documents:
-                try:
-                    # Get BM25 score
-                    bm25_score = float(doc.get('bm25_score', 0.0))
-                    
-                    # Calculate embedding similarity if available
-                    embedding_score = 0.0
-                    if query_embedding is not None and doc.get('embedding'):
-                        try:
-                            doc_embedding = doc['embedding']
-                            
-                            # Parse embedding from database (stored as JSON string)
-                            if isinstance(doc_embedding, str):
-                                doc_embedding = json.loads(doc_embedding) if doc_embedding.startswith('[') else None
-                            
-                            if doc_embedding and isinstance(doc_embedding, list) and len(doc_embedding) > 1:
-                                similarities = self.calculate_cosine_similarity(query_embedding, [doc_embedding])
-                                embedding_score = similarities[0] if similarities else 0.0
-                        except Exception as e:
-                            print(f"Error calculating embedding similarity for chunk {doc.get('chunk_id', 'unknown')}: {e}")
-                            embedding_score = 0.0
-                    
-                    # Combined score
-                    combined_score = (bm25_weight * float(bm25_score)) + (embedding_weight * embedding_score)
-                    
-                    # Add scores to document
-                    doc['bm25_score'] = bm25_score
-                    doc['embedding_score'] = embedding_score
-                    doc['combined_score'] = combined_score
-                    
-                    final_results.append(doc)
-                    
-                except Exception as e:
-                    print(f"Error processing document {doc.get('document_id', 'unknown')}: {e}")
-                    continue
+            if not with_context:
+                self._attach_chunk_rows(hook, hits)
+                return ranked
             
-            # Sort by combined score and return top_k
-            final_results.sort(key=lambda x: x['combined_score'], reverse=True)
-            return final_results[:top_k]
+            self._attach_documents(hook, hits)
+            windows = iter(self._get_chunk_context_windows(hook, hits, context_window))
+            return [[next(windows) for _ in results] for results in ranked]
             
         except Exception as e:
-            print(f"Error in hybrid search: {e}")
-            return []
+            print(f"Error in batched hybrid search: {e}")
+            return [[] for _ in queries]
     
     def search_table_context(self, query: str, top_k: int = 5, team: Optional[str] = None, with_context: bool = True) -> List[Dict]:
         """
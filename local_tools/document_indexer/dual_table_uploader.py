@@ -4,17 +4,30 @@ Handles document_index and chunk_index tables separately
 """
 
 import sys
+import tempfile
+import time
 from pathlib import Path
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
 import pandas as pd
 from datetime import datetime
 import hashlib
 
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
 # Handle imports for both direct execution and module import
 try:
     from .config import SNOWFLAKE_DATABASE, SNOWFLAKE_SCHEMA, DOCUMENT_TABLE, CHUNK_TABLE, GITHUB_REPO, GITHUB_BRANCH
+    from .config import EMBEDDING_QUANTIZATION
+    from .quantization import encode_embedding
 except ImportError:
     from config import SNOWFLAKE_DATABASE, SNOWFLAKE_SCHEMA, DOCUMENT_TABLE, CHUNK_TABLE, GITHUB_REPO, GITHUB_BRANCH
+    from config import EMBEDDING_QUANTIZATION
+    from quantization import encode_embedding
 
 # Add utils to path for SnowflakeHook
 try:
@@ -28,13 +41,17 @@ class DualTableUploader:
     """Handles uploading to separate document_index and chunk_index tables"""
     
     def __init__(self, database: str = SNOWFLAKE_DATABASE, schema: str = SNOWFLAKE_SCHEMA,
-                 document_table: str = DOCUMENT_TABLE, chunk_table: str = CHUNK_TABLE):
+                 document_table: str = DOCUMENT_TABLE, chunk_table: str = CHUNK_TABLE,
+                 quantization: str = EMBEDDING_QUANTIZATION):
         self.database = database
         self.schema = schema
         self.document_table = document_table
         self.chunk_table = chunk_table
         self.document_full_table = f"{database}.{schema}.{document_table}"
         self.chunk_full_table = f"{database}.{schema}.{chunk_table}"
+        # "float16" stores embeddings as half-precision bytes instead of float arrays; "int8"
+        # adds int8 codes next to the float array (kept for exact re-scoring and syncs)
+        self.quantization = quantization
         self.hook = None
         
     def get_snowflake_hook(self) -> Optional[SnowflakeHook]:
@@ -50,21 +67,22 @@ class DualTableUploader:
             print(f"Error connecting to Snowflake: {e}")
             return None
     
-    def create_document_table(self) -> bool:
-        """Create the document_index table"""
+    def create_document_table(self, replace: bool = True) -> bool:
+        """Create the document_index table (keeps an existing table when replace is False)"""
         hook = self.get_snowflake_hook()
         if not hook:
             return False
         
         # Drop existing table first
-        try:
-            hook.query_without_result(f"DROP TABLE IF EXISTS {self.document_full_table}")
-            print(f"Dropped existing table {self.document_full_table}")
-        except Exception as e:
-            print(f"Note: Could not drop table (may not exist): {e}")
+        if replace:
+            try:
+                hook.query_without_result(f"DROP TABLE IF EXISTS {self.document_full_table}")
+                print(f"Dropped existing table {self.document_full_table}")
+            except Exception as e:
+                print(f"Note: Could not drop table (may not exist): {e}")
         
         create_table_sql = f"""
-        CREATE TABLE {self.document_full_table} (
+        CREATE TABLE {'' if replace else 'IF NOT EXISTS '}{self.document_full_table} (
             -- Document Identity & Metadata
             document_id VARCHAR(64) PRIMARY KEY,
             document_hash VARCHAR(64) NOT NULL,
@@ -109,6 +127,7 @@ class DualTableUploader:
             query_type VARCHAR(50),
             referenced_tables ARRAY
         )
+        CLUSTER BY (category, subcategory)
         """
         
         try:
@@ -119,29 +138,35 @@ class DualTableUploader:
             print(f"Error creating document table: {e}")
             return False
     
-    def create_chunk_table(self) -> bool:
-        """Create the chunk_index table"""
+    def create_chunk_table(self, replace: bool = True) -> bool:
+        """Create the chunk_index table (keeps an existing table when replace is False)"""
         hook = self.get_snowflake_hook()
         if not hook:
             return False
         
         # Drop existing table first
-        try:
-            hook.query_without_result(f"DROP TABLE IF EXISTS {self.chunk_full_table}")
-            print(f"Dropped existing table {self.chunk_full_table}")
-        except Exception as e:
-            print(f"Note: Could not drop table (may not exist): {e}")
+        if replace:
+            try:
+                hook.query_without_result(f"DROP TABLE IF EXISTS {self.chunk_full_table}")
+                print(f"Dropped existing table {self.chunk_full_table}")
+            except Exception as e:
+                print(f"Note: Could not drop table (may not exist): {e}")
         
         create_table_sql = f"""
-        CREATE TABLE {self.chunk_full_table} (
+        CREATE TABLE {'' if replace else 'IF NOT EXISTS '}{self.chunk_full_table} (
             -- Chunk Identity
             chunk_id VARCHAR(64) PRIMARY KEY,
             document_id VARCHAR(64) NOT NULL,
             chunk_hash VARCHAR(64) NOT NULL,
             
+            -- Document category, denormalized so filtered searches prune by cluster
+            category VARCHAR(50),
+            subcategory VARCHAR(200),
+            
             -- Chunk Content & Position
             content TEXT NOT NULL,
             content_length INTEGER,
+            token_count INTEGER,  -- embedding-model tokens of the embedded text (at most 512)
             chunk_start INTEGER,
             chunk_end INTEGER,
             
@@ -150,10 +175,17 @@ class DualTableUploader:
             bm25_tokens ARRAY,
             embedding ARRAY,
             embedding_dim INTEGER,
+            -- Quantized embedding (int8 codes with embedding_scale, or float16 with NULL scale)
+            embedding_q BINARY,
+            embedding_scale FLOAT,
+            
+            -- Canonical chunk_id when this chunk is a near-duplicate (excluded from search)
+            duplicate_of VARCHAR(64),
             
             -- Foreign Key to document_index table
             FOREIGN KEY (document_id) REFERENCES {self.document_full_table}(document_id)
         )
+        CLUSTER BY (category, subcategory, document_id)
         """
         
         try:
@@ -164,21 +196,84 @@ class DualTableUploader:
             print(f"Error creating chunk table: {e}")
             return False
     
-    def create_tables(self) -> bool:
-        """Create both tables"""
+    def create_tables(self, replace: bool = True) -> bool:
+        """Create both tables (keeps existing tables when replace is False)"""
         print("🏗️  Creating document and chunk tables...")
         
         # Create document table first (parent)
-        if not self.create_document_table():
+        if not self.create_document_table(replace=replace):
             return False
         
         # Create chunk table second (child with FK)
-        if not self.create_chunk_table():
+        if not self.create_chunk_table(replace=replace):
+            return False
+        
+        # Existing tables may predate the category columns and clustering keys
+        if not replace and not (self.migrate_category_clustering() and self.add_missing_chunk_columns()):
             return False
         
         print("✅ Both tables created successfully")
         return True
     
+    # Chunk columns added after the original schema (rows written earlier keep NULLs)
+    ADDED_CHUNK_COLUMNS = {
+        'embedding_q': 'BINARY',
+        'embedding_scale': 'FLOAT',
+        'duplicate_of': 'VARCHAR(64)',
+        'token_count': 'INTEGER',
+    }
+    
+    def add_missing_chunk_columns(self) -> bool:
+        """Add newer columns to an existing chunk table (old rows keep their float embedding arrays)"""
+        hook = self.get_snowflake_hook()
+        if not hook:
+            return False
+        
+        try:
+            for column, column_type in self.ADDED_CHUNK_COLUMNS.items():
+                hook.query_without_result(
+                    f"ALTER TABLE {self.chunk_full_table} ADD COLUMN IF NOT EXISTS {column} {column_type}"
+                )
+            return True
+        except Exception as e:
+            print(f"Error adding chunk columns: {e}")
+            return False
+    
+    def migrate_category_clustering(self) -> bool:
+        """
+        Add the chunk-level category columns and clustering keys to existing tables
+        
+        Idempotent: backfills only chunks whose category is still NULL.
+        """
+        hook = self.get_snowflake_hook()
+        if not hook:
+            return False
+        
+        try:
+            hook.query_without_result(f"""
+            ALTER TABLE {self.chunk_full_table} ADD COLUMN IF NOT EXISTS category VARCHAR(50)
+            """)
+            hook.query_without_result(f"""
+            ALTER TABLE {self.chunk_full_table} ADD COLUMN IF NOT EXISTS subcategory VARCHAR(200)
+            """)
+            hook.query_without_result(f"""
+            UPDATE {self.chunk_full_table} c
+            SET category = d.category, subcategory = d.subcategory
+            FROM {self.document_full_table} d
+            WHERE c.document_id = d.document_id AND c.category IS NULL
+            """)
+            hook.query_without_result(
+                f"ALTER TABLE {self.document_full_table} CLUSTER BY (category, subcategory)"
+            )
+            hook.query_without_result(
+                f"ALTER TABLE {self.chunk_full_table} CLUSTER BY (category, subcategory, document_id)"
+            )
+            print("Category columns and clustering keys verified")
+            return True
+        except Exception as e:
+            print(f"Error migrating category clustering: {e}")
+            return False
+    
     def clear_tables(self) -> bool:
         """Clear both tables"""
         hook = self.get_snowflake_hook()
@@ -195,6 +290,88 @@ class DualTableUploader:
             print(f"Error clearing tables: {e}")
             return False
     
+    @staticmethod
+    def document_id_for_path(relative_path: str) -> str:
+        """Document ID (sha256 of the relative path)"""
+        return hashlib.sha256(relative_path.encode('utf-8')).hexdigest()
+    
+    def get_indexed_document_hashes(self) -> Optional[Dict[str, str]]:
+        """
+        Content hashes of the documents currently in the document table
+        
+        Returns:
+            Dict mapping relative_path -> document_hash, or None on error
+        """
+        hook = self.get_snowflake_hook()
+        if not hook:
+            return None
+        
+        try:
+            df = hook.query_snowflake(
+                f"SELECT relative_path, document_hash FROM {self.document_full_table}"
+            )
+            return dict(zip(df['relative_path'], df['document_hash']))
+        except Exception as e:
+            print(f"Error reading indexed document hashes: {e}")
+            return None
+    
+    def get_duplicate_dependents(self, document_ids: List[str]) -> Optional[List[str]]:
+        """
+        Documents with near-duplicate chunks whose canonical chunk belongs to one of these documents
+        
+        Their duplicate_of pointers go stale when these documents change, so an
+        incremental run re-indexes them too.
+        
+        Returns:
+            Dependent document IDs (excluding the given ones), or None if the lookup failed
+        """
+        if not document_ids:
+            return []
+        
+        hook = self.get_snowflake_hook()
+        if not hook:
+            return None
+        
+        try:
+            id_list = ', '.join(f"'{document_id}'" for document_id in document_ids)
+            result = hook.query_snowflake(f"""
+            SELECT DISTINCT document_id
+            FROM {self.chunk_full_table}
+            WHERE duplicate_of IN (SELECT chunk_id FROM {self.chunk_full_table} WHERE document_id IN ({id_list}))
+              AND document_id NOT IN ({id_list})
+            """)
+            return [] if result is None or result.empty else list(result['document_id'])
+        except Exception as e:
+            print(f"Error reading near-duplicate dependents: {e}")
+            return None
+    
+    def delete_documents(self, document_ids: List[str], batch_size: int = 1000) -> bool:
+        """
+        Delete documents and their chunks
+        
+        Args:
+            document_ids: Document IDs to delete
+            batch_size: Number of IDs per DELETE statement
+        """
+        hook = self.get_snowflake_hook()
+        if not hook:
+            return False
+        
+        if not document_ids:
+            return True
+        
+        try:
+            for i in range(0, len(document_ids), batch_size):
+                id_list = ", ".join(f"'{document_id}'" for document_id in document_ids[i:i + batch_size])
+                # Delete child rows first due to FK constraint
+                hook.query_without_result(f"DELETE FROM {self.chunk_full_table} WHERE document_id IN ({id_list})")
+                hook.query_without_result(f"DELETE FROM {self.document_full_table} WHERE document_id IN ({id_list})")
+            print(f"Deleted {len(document_ids)} documents and their chunks")
+            return True
+        except Exception as e:
+            print(f"Error deleting documents: {e}")
+            return False
+    
     def prepare_document_record(self, chunks: List[Dict]) -> Dict:
         """Prepare a document record from the first chunk (document-level data)"""
         if not chunks:
@@ -204,7 +381,7 @@ class DualTableUploader:
         relative_path = first_chunk.get('relative_path', '')
         
         # Generate document ID from relative path
-        document_id = hashlib.sha256(relative_path.encode('utf-8')).hexdigest()
+        document_id = self.document_id_for_path(relative_path)
         
         # Create GitHub URL
         github_file_url = f"https://github.com/{GITHUB_REPO}/blob/{GITHUB_BRANCH}/context/{relative_path}"
@@ -248,33 +425,87 @@ class DualTableUploader:
             'REFERENCED_TABLES': first_chunk.get('referenced_tables', [])
         }
     
+    @staticmethod
+    def chunk_record_id(document_id: str, chunk_index: int) -> str:
+        """Stable CHUNK_ID of a document's chunk"""
+        return hashlib.sha256(f"{document_id}_{chunk_index}".encode('utf-8')).hexdigest()
+    
     def prepare_chunk_record(self, chunk: Dict, document_id: str) -> Dict:
         """Prepare a chunk record"""
         chunk_content = chunk.get('content', '')
-        chunk_id_base = f"{document_id}_{chunk.get('chunk_id', 0)}"
-        chunk_hash = hashlib.sha256(chunk_id_base.encode('utf-8')).hexdigest()
+        chunk_hash = self.chunk_record_id(document_id, chunk.get('chunk_id', 0))
+        
+        # Near-duplicates point at their canonical chunk (see near_duplicates.mark_near_duplicates)
+        duplicate_of = None
+        if chunk.get('duplicate_of'):
+            canonical_path, canonical_index = chunk['duplicate_of']
+            duplicate_of = self.chunk_record_id(self.document_id_for_path(canonical_path), canonical_index)
+        
+        embedding = chunk.get('embedding', [])
+        embedding_q, embedding_scale = None, None
+        if self.quantization != 'none' and len(embedding):
+            embedding_q, embedding_scale = encode_embedding(embedding, self.quantization)
+            if self.quantization == 'float16':
+                embedding = None
         
         return {
             'CHUNK_ID': chunk_hash,
             'DOCUMENT_ID': document_id,
             'CHUNK_HASH': chunk_hash,
+            'CATEGORY': chunk.get('category', 'general'),
+            'SUBCATEGORY': chunk.get('subcategory'),
             'CONTENT': chunk_content,
             'CONTENT_LENGTH': len(chunk_content),
+            'TOKEN_COUNT': chunk.get('token_count'),
             'CHUNK_START': chunk.get('chunk_start', 0),
             'CHUNK_END': chunk.get('chunk_end', 0),
             'BM25_TEXT': chunk.get('bm25_text', ''),
             'BM25_TOKENS': chunk.get('bm25_tokens', []),
-            'EMBEDDING': chunk.get('embedding', []),
-            'EMBEDDING_DIM': chunk.get('embedding_dim', 0)
+            'EMBEDDING': embedding,
+            'EMBEDDING_DIM': chunk.get('embedding_dim', 0),
+            'EMBEDDING_Q': embedding_q,
+            'EMBEDDING_SCALE': embedding_scale,
+            'DUPLICATE_OF': duplicate_of
         }
     
-    def upload_documents_and_chunks(self, documents_chunks: Dict[str, List[Dict]], batch_size: int = 100) -> bool:
+    def prepare_records(self, documents_chunks: Dict[str, List[Dict]]) -> Tuple[List[Dict], List[Dict]]:
+        """
+        Prepare document and chunk records for every document
+        
+        Args:
+            documents_chunks: Dict mapping relative_path -> list of chunks
+            
+        Returns:
+            Tuple of (document_records, chunk_records)
+        """
+        document_records = []
+        chunk_records = []
+        
+        for doc_chunks in documents_chunks.values():
+            if not doc_chunks:
+                continue
+            
+            # Prepare document record
+            doc_record = self.prepare_document_record(doc_chunks)
+            document_records.append(doc_record)
+            document_id = doc_record['DOCUMENT_ID']
+            
+            # Prepare chunk records
+            for chunk in doc_chunks:
+                chunk_records.append(self.prepare_chunk_record(chunk, document_id))
+        
+        return document_records, chunk_records
+    
+    def upload_documents_and_chunks(self, documents_chunks: Dict[str, List[Dict]], batch_size: int = 100,
+                                    replace_tables: bool = True) -> bool:
         """
         Upload documents and their chunks to the two-table structure
         
         Args:
             documents_chunks: Dict mapping document_id -> list of chunks
             batch_size: Batch size for uploads
+            replace_tables: Recreate the tables before uploading. Pass False to append
+                to existing tables (incremental indexing deletes changed documents first).
         """
         hook = self.get_snowflake_hook()
         if not hook:
@@ -285,29 +516,14 @@ class DualTableUploader:
             return True
         
         # Create tables if needed
-        if not self.create_tables():
+        if not self.create_tables(replace=replace_tables):
             return False
         
         try:
             print(f"📄 Uploading {len(documents_chunks)} documents and their chunks...")
             
-            # Prepare document records
-            document_records = []
-            chunk_records = []
-            
-            for doc_chunks in documents_chunks.values():
-                if not doc_chunks:
-                    continue
-                
-                # Prepare document record
-                doc_record = self.prepare_document_record(doc_chunks)
-                document_records.append(doc_record)
-                document_id = doc_record['DOCUMENT_ID']
-                
-                # Prepare chunk records
-                for chunk in doc_chunks:
-                    chunk_record = self.prepare_chunk_record(chunk, document_id)
-                    chunk_records.append(chunk_record)
+            # Prepare document and chunk records
+            document_records, chunk_records = self.prepare_records(documents_chunks)
             
             # Upload documents first
             print(f"📄 Uploading {len(document_records)} document records...")
@@ -332,6 +548,90 @@ class DualTableUploader:
             traceback.print_exc()
             return False
     
+    @staticmethod
+    def _write_parquet_files(records: List[Dict], directory: Path, prefix: str, rows_per_file: int) -> int:
+        """Write records to snappy-compressed Parquet files, keeping array columns as native lists"""
+        n_files = 0
+        for start in range(0, len(records), rows_per_file):
+            table = pa.Table.from_pylist(records[start:start + rows_per_file])
+            if 'EMBEDDING' in table.column_names:
+                index = table.column_names.index('EMBEDDING')
+                table = table.set_column(index, 'EMBEDDING', table['EMBEDDING'].cast(pa.list_(pa.float32())))
+            pq.write_table(table, directory / f"{prefix}_{n_files:04d}.parquet", compression='snappy')
+            n_files += 1
+        return n_files
+    
+    def bulk_upload_documents_and_chunks(self, documents_chunks: Dict[str, List[Dict]],
+                                         replace_tables: bool = True, rows_per_file: int = 50000) -> bool:
+        """
+        Upload documents and chunks through one staged Parquet load
+        
+        All records are written to a few compressed Parquet files, uploaded with a
+        single PUT to a temporary stage, and loaded with one COPY per table (plus one
+        grant per table), instead of a write_pandas round trip per 100-chunk batch.
+        
+        Args:
+            documents_chunks: Dict mapping relative_path -> list of chunks
+            replace_tables: Recreate the tables before loading (see upload_documents_and_chunks)
+            rows_per_file: Maximum rows per Parquet file
+        """
+        if not PYARROW_AVAILABLE:
+            print("pyarrow not available, falling back to batched upload")
+            return self.upload_documents_and_chunks(documents_chunks, replace_tables=replace_tables)
+        
+        hook = self.get_snowflake_hook()
+        if not hook:
+            return False
+        
+        if not documents_chunks:
+            print("No documents to upload")
+            return True
+        
+        if not self.create_tables(replace=replace_tables):
+            return False
+        
+        stage = f"{self.database}.{self.schema}.{self.chunk_table}_upload_stage"
+        
+        try:
+            start_time = time.perf_counter()
+            document_records, chunk_records = self.prepare_records(documents_chunks)
+            
+            with tempfile.TemporaryDirectory(prefix="document_index_upload_") as tmp_dir:
+                tmp_path = Path(tmp_dir)
+                n_files = self._write_parquet_files(document_records, tmp_path, "documents", rows_per_file)
+                n_files += self._write_parquet_files(chunk_records, tmp_path, "chunks", rows_per_file)
+                print(f"📦 Wrote {n_files} Parquet files "
+                      f"({sum(f.stat().st_size for f in tmp_path.iterdir()) / 1e6:.1f} MB)")
+                
+                hook.query_without_result(f"CREATE OR REPLACE TEMPORARY STAGE {stage} FILE_FORMAT = (TYPE = PARQUET)")
+                hook.query_without_result(
+                    f"PUT 'file://{tmp_path.as_posix()}/*.parquet' @{stage} AUTO_COMPRESS = FALSE PARALLEL = 8"
+                )
+            
+            # Documents first (parent table), then chunks
+            for table, pattern in ((self.document_full_table, 'documents'), (self.chunk_full_table, 'chunks')):
+                hook.query_without_result(f"""
+                COPY INTO {table}
+                FROM @{stage}
+                PATTERN = '.*{pattern}_[0-9]+[.]parquet'
+                MATCH_BY_COLUMN_NAME = CASE_INSENSITIVE
+                """)
+                hook.grant_access(table)
+            
+            hook.query_without_result(f"DROP STAGE IF EXISTS {stage}")
+            
+            elapsed = time.perf_counter() - start_time
+            total_rows = len(document_records) + len(chunk_records)
+            print(f"✅ Bulk loaded {len(document_records)} documents and {len(chunk_records)} chunks "
+                  f"in {elapsed:.1f}s ({total_rows / max(elapsed, 1e-9):.0f} rows/s)")
+            return True
+            
+        except Exception as e:
+            print(f"❌ Error bulk uploading documents and chunks: {e}")
+            import traceback
+            traceback.print_exc()
+            return False
+    
     def get_table_stats(self) -> Optional[Dict]:
         """Get statistics for both tables"""
         hook = self.get_snowflake_hook()
@@ -0,0 +1,255 @@
+"""
+Embedding caches
+
+``EmbeddingCache`` is content-addressed: embeddings are keyed by a hash of the exact
+text sent to the model plus the model name, and stored as one float32 ``.npy`` matrix
+with a key index. Unchanged chunks hit the cache on every index run, so only new or
+edited text is embedded.
+
+``QueryEmbeddingCache`` is a bounded LRU of search query -> embedding, optionally
+persisted to disk, so repeated agent queries skip the encoder.
+"""
+
+import atexit
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+try:
+    from .config import (
+        EMBEDDING_CACHE_DIR, BGE_MODEL_NAME, QUERY_EMBEDDING_CACHE_SIZE, QUERY_EMBEDDING_CACHE_PATH
+    )
+except ImportError:
+    from config import (
+        EMBEDDING_CACHE_DIR, BGE_MODEL_NAME, QUERY_EMBEDDING_CACHE_SIZE, QUERY_EMBEDDING_CACHE_PATH
+    )
+
+
+CACHE_EMBEDDINGS_FILE = "embedding_cache.npy"
+CACHE_KEYS_FILE = "embedding_cache_keys.json"
+
+
+class EmbeddingCache:
+    """Binary embedding cache keyed by sha256(model name + text)"""
+
+    def __init__(self, cache_dir: Optional[Path] = None, model_name: str = BGE_MODEL_NAME):
+        self.cache_dir = Path(cache_dir or EMBEDDING_CACHE_DIR)
+        self.model_name = model_name
+        self.embeddings: Optional[np.ndarray] = None
+        self.key_to_row: Dict[str, int] = {}
+        self._pending_keys: List[str] = []
+        self._pending_embeddings: List[np.ndarray] = []
+        self._loaded = False
+
+    def key_for(self, text: str) -> str:
+        """Cache key for the exact text embedded by this model"""
+        return hashlib.sha256(f"{self.model_name}\n{text}".encode('utf-8')).hexdigest()
+
+    def load(self) -> bool:
+        """
+        Memory-map the cached embeddings and load the key index
+
+        Returns:
+            True if a cache for this model was found, False otherwise
+        """
+        self._loaded = True
+        embeddings_path = self.cache_dir / CACHE_EMBEDDINGS_FILE
+        keys_path = self.cache_dir / CACHE_KEYS_FILE
+        if not embeddings_path.exists() or not keys_path.exists():
+            return False
+
+        try:
+            with open(keys_path, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+
+            if index.get('model_name') != self.model_name:
+                print(f"Embedding cache model mismatch: {index.get('model_name')} vs {self.model_name}")
+                return False
+
+            embeddings = np.load(embeddings_path, mmap_mode='r')
+            keys = index.get('keys', [])
+            if embeddings.shape[0] != len(keys):
+                print(f"Embedding cache is inconsistent: {embeddings.shape[0]} rows vs {len(keys)} keys")
+                return False
+
+            self.embeddings = embeddings
+            self.key_to_row = {key: row for row, key in enumerate(keys)}
+            return True
+
+        except Exception as e:
+            print(f"Error loading embedding cache: {e}")
+            return False
+
+    def lookup(self, texts: Sequence[str]) -> Dict[int, np.ndarray]:
+        """
+        Cached embeddings for the given texts
+
+        Args:
+            texts: Exact texts that would be sent to the model
+
+        Returns:
+            Dictionary mapping position in ``texts`` -> embedding (hits only)
+        """
+        if not self._loaded:
+            self.load()
+
+        hits = {}
+        if self.embeddings is None:
+            return hits
+
+        for i, text in enumerate(texts):
+            row = self.key_to_row.get(self.key_for(text))
+            if row is not None:
+                hits[i] = np.asarray(self.embeddings[row], dtype=np.float32)
+        return hits
+
+    def add(self, texts: Sequence[str], embeddings: np.ndarray):
+        """Queue newly computed embeddings; call ``save`` to persist them"""
+        for text, embedding in zip(texts, embeddings):
+            key = self.key_for(text)
+            if key not in self.key_to_row:
+                self._pending_keys.append(key)
+                self._pending_embeddings.append(np.asarray(embedding, dtype=np.float32))
+
+    def save(self) -> bool:
+        """
+        Append queued embeddings to the cache files
+
+        Returns:
+            True if the cache is up to date on disk, False otherwise
+        """
+        if not self._pending_keys:
+            return True
+
+        try:
+            # Deduplicate keys added more than once in this run
+            new_rows = dict(zip(self._pending_keys, self._pending_embeddings))
+            existing_keys = sorted(self.key_to_row, key=self.key_to_row.get)
+            new_matrix = np.vstack(list(new_rows.values()))
+
+            if self.embeddings is not None and len(existing_keys):
+                if self.embeddings.shape[1] != new_matrix.shape[1]:
+                    print(f"Embedding dimension changed ({self.embeddings.shape[1]} -> {new_matrix.shape[1]}), "
+                          f"resetting cache")
+                    existing_keys = []
+                    matrix = new_matrix
+                else:
+                    matrix = np.vstack([np.asarray(self.embeddings, dtype=np.float32), new_matrix])
+            else:
+                existing_keys = []
+                matrix = new_matrix
+
+            keys = existing_keys + list(new_rows)
+
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            tmp_embeddings = self.cache_dir / f"{CACHE_EMBEDDINGS_FILE}.tmp.npy"
+            tmp_keys = self.cache_dir / f"{CACHE_KEYS_FILE}.tmp"
+
+            np.save(tmp_embeddings, matrix)
+            with open(tmp_keys, 'w', encoding='utf-8') as f:
+                json.dump({'model_name': self.model_name, 'dim': int(matrix.shape[1]), 'keys': keys}, f)
+
+            os.replace(tmp_embeddings, self.cache_dir / CACHE_EMBEDDINGS_FILE)
+            os.replace(tmp_keys, self.cache_dir / CACHE_KEYS_FILE)
+
+            self._pending_keys = []
+            self._pending_embeddings = []
+            print(f"Embedding cache now holds {len(keys)} entries ({len(new_rows)} added)")
+            return self.load()
+
+        except Exception as e:
+            print(f"Error saving embedding cache: {e}")
+            return False
+
+
+class QueryEmbeddingCache:
+    """Thread-safe bounded LRU of query text -> embedding, optionally persisted as ``.npz``"""
+
+    def __init__(self, max_size: int = QUERY_EMBEDDING_CACHE_SIZE,
+                 persist_path: Optional[Path] = QUERY_EMBEDDING_CACHE_PATH,
+                 model_name: str = BGE_MODEL_NAME):
+        self.max_size = max_size
+        self.persist_path = Path(persist_path) if persist_path else None
+        self.model_name = model_name
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._dirty = False
+
+        if self.persist_path:
+            self.load()
+            atexit.register(self.save)
+
+    def key_for(self, query: str, query_prefix: Optional[str] = None) -> str:
+        """Cache key: model, prefix and whitespace-normalized query"""
+        return f"{self.model_name}\n{query_prefix or ''}\n{' '.join(query.split())}"
+
+    def get(self, query: str, query_prefix: Optional[str] = None) -> Optional[np.ndarray]:
+        """Cached embedding for the query (marks it most recently used), or None"""
+        key = self.key_for(query, query_prefix)
+        with self._lock:
+            embedding = self._entries.get(key)
+            if embedding is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return embedding
+
+    def put(self, query: str, embedding: np.ndarray, query_prefix: Optional[str] = None):
+        """Store an embedding, evicting the least recently used entries beyond max_size"""
+        if self.max_size <= 0:
+            return
+
+        key = self.key_for(query, query_prefix)
+        with self._lock:
+            self._entries[key] = np.asarray(embedding, dtype=np.float32)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+            self._dirty = True
+
+    def load(self) -> bool:
+        """Load persisted entries (oldest first) if the persist file exists"""
+        if not self.persist_path or not self.persist_path.exists():
+            return False
+
+        try:
+            with np.load(self.persist_path) as data:
+                keys = data['keys'].tolist()
+                embeddings = data['embeddings']
+                with self._lock:
+                    for key, embedding in zip(keys[-self.max_size:], embeddings[-self.max_size:]):
+                        if key.startswith(f"{self.model_name}\n"):
+                            self._entries[key] = embedding.astype(np.float32)
+            return True
+        except Exception as e:
+            print(f"Error loading query embedding cache: {e}")
+            return False
+
+    def save(self) -> bool:
+        """Persist entries in LRU order (no-op when not configured or unchanged)"""
+        if not self.persist_path or not self._dirty:
+            return True
+
+        try:
+            with self._lock:
+                keys = list(self._entries)
+                embeddings = np.vstack(list(self._entries.values())) if keys else np.zeros((0, 0), np.float32)
+                self._dirty = False
+
+            self.persist_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.persist_path.with_name(f"{self.persist_path.stem}.tmp.npz")
+            np.savez(tmp_path, keys=np.array(keys, dtype=str), embeddings=embeddings)
+            os.replace(tmp_path, self.persist_path)
+            return True
+        except Exception as e:
+            print(f"Error saving query embedding cache: {e}")
+            return False
@@ -2,11 +2,11 @@
 Embedding generation using BGE (Beijing Academy of Artificial Intelligence General Embedding) models
 """
 
-import json
 import os
 import pickle
+import threading
 from pathlib import Path
-from typing import List, Dict, Optional, Union
+from typing import List, Dict, Optional, Sequence
 import numpy as np
 
 try:
@@ -18,19 +18,38 @@ except ImportError:
     EMBEDDINGS_AVAILABLE = False
 
 try:
-    from .config import BGE_MODEL_NAME, BGE_MODEL_LOCAL_PATH
+    from .config import (
+        BGE_MODEL_NAME, BGE_MODEL_LOCAL_PATH, EMBEDDING_BACKEND, EMBEDDING_NUM_THREADS, EMBEDDING_BATCH_SIZE
+    )
+    from .embedding_cache import EmbeddingCache, QueryEmbeddingCache
+    from .onnx_backend import ONNXEmbeddingBackend
+    from .chunker import embedding_text
 except ImportError:
-    from config import BGE_MODEL_NAME, BGE_MODEL_LOCAL_PATH
+    from config import (
+        BGE_MODEL_NAME, BGE_MODEL_LOCAL_PATH, EMBEDDING_BACKEND, EMBEDDING_NUM_THREADS, EMBEDDING_BATCH_SIZE
+    )
+    from embedding_cache import EmbeddingCache, QueryEmbeddingCache
+    from onnx_backend import ONNXEmbeddingBackend
+    from chunker import embedding_text
 
 
 class BGEEmbeddingGenerator:
     """Generate embeddings using BGE models from Hugging Face"""
     
-    def __init__(self, model_name: str = BGE_MODEL_NAME, local_path: Optional[Path] = None):
+    def __init__(self, model_name: str = BGE_MODEL_NAME, local_path: Optional[Path] = None,
+                 cache_dir: Optional[Path] = None, use_cache: bool = True,
+                 backend: str = EMBEDDING_BACKEND, num_threads: int = EMBEDDING_NUM_THREADS):
         self.model_name = model_name
         self.local_path = local_path or BGE_MODEL_LOCAL_PATH
+        self.backend = backend
+        self.num_threads = num_threads
         self.model = None
-        self.device = "cuda" if torch.cuda.is_available() else "cpu" if EMBEDDINGS_AVAILABLE else None
+        # Quantized embeddings differ slightly, so each backend gets its own cache namespace
+        cache_model_name = model_name if backend == "torch" else f"{model_name}:{backend}"
+        self.embedding_cache = EmbeddingCache(cache_dir, cache_model_name) if use_cache else None
+        self.query_cache = QueryEmbeddingCache(model_name=cache_model_name) if use_cache else None
+        self._model_lock = threading.Lock()
+        self.device = ("cuda" if torch.cuda.is_available() else "cpu") if EMBEDDINGS_AVAILABLE else None
         
     def download_model(self) -> bool:
         """
@@ -64,39 +83,80 @@ class BGEEmbeddingGenerator:
         """
         Load the BGE model (download if necessary)
         
+        Safe to call from several threads: callers wait for an in-flight load
+        (e.g. the background preload) instead of loading the model twice.
+        
         Returns:
             True if model loaded successfully, False otherwise
         """
-        if not EMBEDDINGS_AVAILABLE:
+        if self.backend != "onnx" and not EMBEDDINGS_AVAILABLE:
             print("sentence-transformers not available. Cannot load model.")
             return False
         
-        try:
-            # Try to load from local path first
-            if self.local_path.exists():
-                print(f"Loading model from {self.local_path}")
-                self.model = SentenceTransformer(str(self.local_path), device=self.device)
-            else:
-                # Download model first
-                print(f"Model not found locally, downloading {self.model_name}")
-                if not self.download_model():
-                    return False
-                self.model = SentenceTransformer(str(self.local_path), device=self.device)
+        with self._model_lock:
+            if self.model is not None:
+                return True
             
-            print(f"Model loaded successfully on device: {self.device}")
-            return True
-            
-        except Exception as e:
-            print(f"Error loading model: {e}")
+            try:
+                if self.backend == "onnx":
+                    return self._load_onnx_model()
+                
+                if self.num_threads > 0:
+                    torch.set_num_threads(self.num_threads)
+                
+                # Try to load from local path first
+                if self.local_path.exists():
+                    print(f"Loading model from {self.local_path}")
+                    self.model = SentenceTransformer(str(self.local_path), device=self.device)
+                else:
+                    # Download model first
+                    print(f"Model not found locally, downloading {self.model_name}")
+                    if not self.download_model():
+                        return False
+                    self.model = SentenceTransformer(str(self.local_path), device=self.device)
+                
+                print(f"Model loaded successfully on device: {self.device}")
+                return True
+                
+            except Exception as e:
+                print(f"Error loading model: {e}")
+                return False
+    
+    def _load_onnx_model(self) -> bool:
+        """Load the int8 ONNX Runtime backend (exported from the local model on first use)"""
+        if not (self.local_path / "config.json").exists() and not self.download_model():
             return False
+        
+        backend = ONNXEmbeddingBackend(self.local_path, num_threads=self.num_threads)
+        if not backend.load():
+            return False
+        
+        self.model = backend
+        print(f"Model loaded successfully with ONNX Runtime ({backend.model_file.name})")
+        return True
     
-    def generate_embeddings(self, texts: List[str], query_prefix: Optional[str] = None) -> Optional[np.ndarray]:
+    def load_model_async(self) -> threading.Thread:
+        """
+        Load the model in a daemon thread (e.g. at server startup)
+        
+        Returns:
+            The started thread; searches issued meanwhile block in load_model until it finishes
+        """
+        thread = threading.Thread(target=self.load_model, name="bge-model-preload", daemon=True)
+        thread.start()
+        return thread
+    
+    def generate_embeddings(self, texts: List[str], query_prefix: Optional[str] = None,
+                            show_progress_bar: Optional[bool] = None,
+                            token_ids: Optional[Sequence[Sequence[int]]] = None) -> Optional[np.ndarray]:
         """
         Generate embeddings for a list of texts
         
         Args:
             texts: List of text strings to embed
             query_prefix: Optional prefix for query texts (BGE models benefit from this)
+            show_progress_bar: Show a progress bar (default: only for more than one batch)
+            token_ids: Model input ids of each text, when already tokenized (skips the tokenizer)
             
         Returns:
             numpy array of embeddings or None if failed
@@ -105,6 +165,14 @@ class BGEEmbeddingGenerator:
             if not self.load_model():
                 return None
         
+        if token_ids is not None and not query_prefix:
+            try:
+                if self.backend == "onnx":
+                    return self.model.encode_token_ids(token_ids, batch_size=EMBEDDING_BATCH_SIZE)
+                return self._encode_token_ids(token_ids)
+            except Exception as e:
+                print(f"Error embedding pre-tokenized chunks, re-tokenizing: {e}")
+        
         try:
             # Add query prefix if specified (BGE models perform better with this)
             if query_prefix:
@@ -113,8 +181,8 @@ class BGEEmbeddingGenerator:
             # Generate embeddings
             embeddings = self.model.encode(
                 texts,
-                batch_size=32,
-                show_progress_bar=True,
+                batch_size=EMBEDDING_BATCH_SIZE,
+                show_progress_bar=len(texts) > 32 if show_progress_bar is None else show_progress_bar,
                 convert_to_numpy=True,
                 normalize_embeddings=True  # Normalize for cosine similarity
             )
@@ -125,9 +193,35 @@ class BGEEmbeddingGenerator:
             print(f"Error generating embeddings: {e}")
             return None
     
+    def _encode_token_ids(self, token_ids: Sequence[Sequence[int]]) -> np.ndarray:
+        """Run the sentence-transformers modules on already tokenized texts (length-sorted batches)"""
+        lengths = [len(ids) for ids in token_ids]
+        order = np.argsort(lengths, kind='stable')
+        embeddings = np.zeros((len(lengths), self.model.get_sentence_embedding_dimension()), dtype=np.float32)
+        
+        with torch.no_grad():
+            for start in range(0, len(order), EMBEDDING_BATCH_SIZE):
+                rows = order[start:start + EMBEDDING_BATCH_SIZE]
+                width = max(lengths[i] for i in rows)
+                input_ids = torch.zeros((len(rows), width), dtype=torch.long)
+                attention_mask = torch.zeros((len(rows), width), dtype=torch.long)
+                for r, i in enumerate(rows):
+                    input_ids[r, :lengths[i]] = torch.as_tensor(np.asarray(token_ids[i], dtype=np.int64))
+                    attention_mask[r, :lengths[i]] = 1
+                features = {
+                    'input_ids': input_ids.to(self.device),
+                    'attention_mask': attention_mask.to(self.device),
+                    'token_type_ids': torch.zeros_like(input_ids).to(self.device),
+                }
+                embeddings[rows] = self.model(features)['sentence_embedding'].float().cpu().numpy()
+        
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return embeddings / norms
+    
     def generate_single_embedding(self, text: str, query_prefix: Optional[str] = None) -> Optional[np.ndarray]:
         """
-        Generate embedding for a single text
+        Generate embedding for a single text (served from the query LRU when possible)
         
         Args:
             text: Text string to embed
@@ -136,11 +230,55 @@ class BGEEmbeddingGenerator:
         Returns:
             numpy array embedding or None if failed
         """
-        embeddings = self.generate_embeddings([text], query_prefix)
+        if self.query_cache:
+            cached = self.query_cache.get(text, query_prefix)
+            if cached is not None:
+                return cached
+        
+        embeddings = self.generate_embeddings([text], query_prefix, show_progress_bar=False)
         if embeddings is not None:
+            if self.query_cache:
+                self.query_cache.put(text, embeddings[0], query_prefix)
             return embeddings[0]
         return None
     
+    def generate_query_embeddings(self, texts: List[str], query_prefix: Optional[str] = None) -> Optional[np.ndarray]:
+        """
+        Generate embeddings for several queries with one model call (query LRU hits are skipped)
+        
+        Args:
+            texts: Query strings to embed
+            query_prefix: Optional prefix for query text
+            
+        Returns:
+            numpy array of embeddings (one row per text, in order) or None if failed
+        """
+        cached = {}
+        if self.query_cache:
+            for i, text in enumerate(texts):
+                embedding = self.query_cache.get(text, query_prefix)
+                if embedding is not None:
+                    cached[i] = embedding
+        
+        # Embed each distinct uncached query once
+        missing = list(dict.fromkeys(text for i, text in enumerate(texts) if i not in cached))
+        computed = {}
+        if missing:
+            embeddings = self.generate_embeddings(missing, query_prefix, show_progress_bar=False)
+            if embeddings is None:
+                return None
+            for text, embedding in zip(missing, embeddings):
+                computed[text] = embedding
+                if self.query_cache:
+                    self.query_cache.put(text, embedding, query_prefix)
+        
+        return np.vstack([cached[i] if i in cached else computed[text] for i, text in enumerate(texts)])
+    
+    @staticmethod
+    def chunk_embedding_text(chunk: Dict) -> str:
+        """Text sent to the model for a document chunk (the chunker sizes chunks against it)"""
+        return embedding_text(chunk)
+    
     def process_document_chunks(self, chunks: List[Dict]) -> List[Dict]:
         """
         Add embeddings to document chunks
@@ -157,79 +295,38 @@ class BGEEmbeddingGenerator:
         print(f"Generating embeddings for {len(chunks)} document chunks...")
         
         # Extract text content for embedding
-        texts = []
-        for chunk in chunks:
-            # Combine relevant text fields for embedding
-            text_parts = [
-                chunk.get('file_name', ''),
-                chunk.get('relative_path', ''),
-                chunk.get('content', '')
-            ]
-            # Add category-specific text
-            if chunk.get('category') == 'table_context':
-                if 'database' in chunk and 'schema' in chunk and 'table_name' in chunk:
-                    text_parts.append(f"{chunk['database']}.{chunk['schema']}.{chunk['table_name']}")
-            
-            combined_text = ' '.join(filter(None, text_parts))
-            texts.append(combined_text)
+        texts = [self.chunk_embedding_text(chunk) for chunk in chunks]
         
-        # Generate embeddings
-        embeddings = self.generate_embeddings(texts)
+        # Only send cache misses to the model
+        cached = self.embedding_cache.lookup(texts) if self.embedding_cache else {}
+        misses = [i for i in range(len(texts)) if i not in cached]
+        print(f"Embedding cache: {len(cached)} hits, {len(misses)} misses")
         
-        if embeddings is None:
-            print("Failed to generate embeddings")
-            return chunks
+        embeddings_by_index = dict(cached)
+        if misses:
+            miss_texts = [texts[i] for i in misses]
+            # Chunks tokenized by the chunker are not tokenized again
+            miss_token_ids = [chunks[i].get('token_ids') for i in misses]
+            if any(ids is None for ids in miss_token_ids):
+                miss_token_ids = None
+            embeddings = self.generate_embeddings(miss_texts, token_ids=miss_token_ids)
+            
+            if embeddings is None:
+                print("Failed to generate embeddings")
+                return chunks
+            
+            embeddings_by_index.update(zip(misses, embeddings))
+            if self.embedding_cache:
+                self.embedding_cache.add(miss_texts, embeddings)
+                self.embedding_cache.save()
         
         # Add embeddings to chunks
         for i, chunk in enumerate(chunks):
-            chunk['embedding'] = embeddings[i].tolist()  # Convert to list for JSON serialization
-            chunk['embedding_dim'] = len(embeddings[i])
+            chunk['embedding'] = embeddings_by_index[i].tolist()  # Convert to list for JSON serialization
+            chunk['embedding_dim'] = len(embeddings_by_index[i])
         
         print(f"Successfully added embeddings to {len(chunks)} chunks")
         return chunks
-    
-    def save_embeddings_cache(self, chunks: List[Dict], cache_path: Path):
-        """Save embeddings to cache file"""
-        try:
-            # Extract just the embeddings and metadata for caching
-            cache_data = {
-                'model_name': self.model_name,
-                'chunks': [
-                    {
-                        'file_hash': chunk.get('file_hash'),
-                        'chunk_id': chunk.get('chunk_id'),
-                        'embedding': chunk.get('embedding')
-                    }
-                    for chunk in chunks if 'embedding' in chunk
-                ]
-            }
-            
-            with open(cache_path, 'w', encoding='utf-8') as f:
-                json.dump(cache_data, f)
-            
-            print(f"Saved embeddings cache to {cache_path}")
-            
-        except Exception as e:
-            print(f"Error saving embeddings cache: {e}")
-    
-    def load_embeddings_cache(self, cache_path: Path) -> Dict:
-        """Load embeddings from cache file"""
-        try:
-            if not cache_path.exists():
-                return {}
-            
-            with open(cache_path, 'r', encoding='utf-8') as f:
-                cache_data = json.load(f)
-            
-            if cache_data.get('model_name') != self.model_name:
-                print(f"Cache model mismatch: {cache_data.get('model_name')} vs {self.model_name}")
-                return {}
-            
-            return cache_data
-            
-        except Exception as e:
-            print(f"Error loading embeddings cache: {e}")
-            return {}
 
 
 def main():
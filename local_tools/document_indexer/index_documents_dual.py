@@ -15,13 +15,195 @@ try:
     from document_processor import DocumentProcessor
     from embedding_generator import BGEEmbeddingGenerator
     from dual_table_uploader import DualTableUploader
-    from config import CONTEXT_CATEGORIES, SUPPORTED_EXTENSIONS
+    from vector_index import LocalVectorIndex
+    from bm25_index import InvertedBM25Index
+    from local_mirror import LocalMirror
+    from near_duplicates import mark_near_duplicates, copy_canonical_embeddings
+    from search_cache import bump_index_generation
+    from config import CONTEXT_CATEGORIES, SUPPORTED_EXTENSIONS, LOCAL_INDEX_DIR
 except ImportError as e:
     print(f"Import error: {e}")
     print("Make sure you're running from the document_indexer directory")
     sys.exit(1)
 
 
+def group_chunks_by_document(chunks):
+    """Group chunks by relative_path (the document identifier)"""
+    documents_chunks = defaultdict(list)
+    for chunk in chunks:
+        relative_path = chunk.get('relative_path')
+        if relative_path:
+            documents_chunks[relative_path].append(chunk)
+    return documents_chunks
+
+
+def deduplicate_chunks(args, chunks):
+    """Mark near-duplicate chunks (unless disabled) and report the dedup ratio"""
+    if args.no_dedup or not chunks:
+        return
+    stats = mark_near_duplicates(chunks)
+    print(f"🧬 Near-duplicates: {stats['duplicates']} of {stats['chunks']} chunks "
+          f"({stats['dedup_ratio']:.1%}) collapsed onto their canonical chunks")
+
+
+def embed_chunks(embedding_generator, chunks):
+    """Embed canonical chunks only; near-duplicates reuse their canonical chunk's embedding"""
+    embedding_generator.process_document_chunks([chunk for chunk in chunks if not chunk.get('duplicate_of')])
+    copy_canonical_embeddings(chunks)
+    return chunks
+
+
+def update_local_indexes(uploader, documents_chunks, index_dir, remove_document_ids=None):
+    """
+    Build the local BM25, vector and ANN indexes and the offline table mirror, or update them in place
+    
+    Args:
+        uploader: DualTableUploader used to prepare the records
+        documents_chunks: Dict mapping relative_path -> list of (embedded) chunks
+        index_dir: Local index directory
+        remove_document_ids: When given, update the existing indexes instead of
+            rebuilding: rows of these documents are dropped before adding the new chunks
+    """
+    document_records, chunk_records = uploader.prepare_records(documents_chunks)
+    documents_by_id = {record['DOCUMENT_ID']: record for record in document_records}
+    categories = [documents_by_id[record['DOCUMENT_ID']]['CATEGORY'] for record in chunk_records]
+    subcategories = [documents_by_id[record['DOCUMENT_ID']]['SUBCATEGORY'] for record in chunk_records]
+    document_ids = [record['DOCUMENT_ID'] for record in chunk_records]
+    
+    # Near-duplicates stay in the mirror (documents, context windows) but not in the search indexes
+    searchable = [i for i, record in enumerate(chunk_records) if not record.get('DUPLICATE_OF')]
+    
+    bm25_index = InvertedBM25Index(index_dir)
+    bm25_args = ([chunk_records[i]['CHUNK_ID'] for i in searchable],
+                 [chunk_records[i]['BM25_TOKENS'] for i in searchable],
+                 [categories[i] for i in searchable],
+                 [subcategories[i] for i in searchable],
+                 [document_ids[i] for i in searchable])
+    if remove_document_ids is None:
+        bm25_ok = bm25_index.build(*bm25_args)
+    else:
+        bm25_ok = bm25_index.update(remove_document_ids, *bm25_args)
+    if bm25_ok:
+        print(f"✅ Local BM25 index ready: {len(bm25_index.term_to_id)} terms")
+    else:
+        print("⚠️  Failed to build local BM25 index (search will fall back to Snowflake keyword scoring)")
+    
+    # Full-precision embeddings from the chunks (records may only carry the quantized codes)
+    embeddings = [chunk.get('embedding') for doc_chunks in documents_chunks.values() for chunk in doc_chunks]
+    embedded = [i for i in searchable if embeddings[i]]
+    vector_index = LocalVectorIndex(index_dir)
+    vector_args = ([chunk_records[i]['CHUNK_ID'] for i in embedded],
+                   [embeddings[i] for i in embedded],
+                   [categories[i] for i in embedded],
+                   [subcategories[i] for i in embedded],
+                   [document_ids[i] for i in embedded])
+    if remove_document_ids is None:
+        vector_ok = vector_index.build(*vector_args)
+    else:
+        vector_ok = vector_index.update(remove_document_ids, *vector_args)
+    if vector_ok:
+        print(f"✅ Local vector + ANN index ready: {len(vector_index.chunk_ids)} chunks")
+    else:
+        print("⚠️  Failed to build local vector index (search will fall back to Snowflake embeddings)")
+    
+    mirror = LocalMirror(index_dir, uploader.document_table, uploader.chunk_table)
+    if remove_document_ids is None:
+        mirror_ok = mirror.build(document_records, chunk_records)
+    else:
+        mirror_ok = mirror.update(remove_document_ids, document_records, chunk_records)
+    if mirror_ok:
+        print(f"✅ Local mirror ready for offline search: {mirror.path}")
+    else:
+        print("⚠️  Failed to update local mirror (offline search mode unavailable until `local_mirror.py sync`)")
+
+
+def run_incremental(args, context_root):
+    """Re-index only documents whose content hash changed since the last run"""
+    print("📄 Step 1: Detecting changed documents...")
+    processor = DocumentProcessor(context_root)
+    local_hashes = processor.compute_document_hashes()
+    
+    uploader = DualTableUploader()
+    if not args.dry_run and not uploader.create_tables(replace=False):
+        print("❌ Failed to create/verify tables")
+        return False
+    
+    indexed_hashes = uploader.get_indexed_document_hashes()
+    if indexed_hashes is None:
+        print("❌ Could not read indexed documents (run without --incremental for a full index)")
+        return False
+    
+    added = sorted(path for path in local_hashes if path not in indexed_hashes)
+    changed = sorted(path for path, document_hash in local_hashes.items()
+                     if path in indexed_hashes and indexed_hashes[path] != document_hash)
+    removed = sorted(path for path in indexed_hashes if path not in local_hashes)
+    
+    # Documents whose near-duplicate chunks point into changed/removed documents are re-deduplicated
+    if not args.no_dedup:
+        path_by_id = {uploader.document_id_for_path(path): path for path in local_hashes}
+        dependents = uploader.get_duplicate_dependents(
+            [uploader.document_id_for_path(path) for path in changed + removed]
+        ) or []
+        refreshed = sorted(set(path_by_id[document_id] for document_id in dependents
+                               if document_id in path_by_id) - set(changed))
+        if refreshed:
+            print(f"🧬 Re-indexing {len(refreshed)} documents with near-duplicates of changed documents")
+            changed = sorted(changed + refreshed)
+    
+    print(f"📊 {len(local_hashes)} local documents: {len(added)} new, {len(changed)} changed, "
+          f"{len(removed)} removed, {len(local_hashes) - len(added) - len(changed)} unchanged")
+    
+    if args.dry_run:
+        for label, paths in (("+", added), ("~", changed), ("-", removed)):
+            for path in paths:
+                print(f"  {label} {path}")
+        print("\n🔍 Dry run completed - no upload to Snowflake")
+        return True
+    
+    if not added and not changed and not removed:
+        print("\n🎉 Index is up to date")
+        return True
+    
+    # Step 2: Process and embed only new/changed documents
+    # (near-duplicates are only detected within this batch; a full run deduplicates the whole tree)
+    chunks = processor.process_all_documents(relative_paths=set(added + changed), workers=args.workers)
+    deduplicate_chunks(args, chunks)
+    if chunks:
+        print("\n🧠 Step 2: Generating embeddings for changed documents...")
+        embedding_generator = BGEEmbeddingGenerator(use_cache=not args.no_embedding_cache)
+        chunks = embed_chunks(embedding_generator, chunks)
+        if any('embedding' not in chunk for chunk in chunks):
+            print("❌ Failed to generate embeddings")
+            return False
+    documents_chunks = group_chunks_by_document(chunks)
+    
+    # Step 3: Delete stale rows, then append the new versions
+    print("\n❄️  Step 3: Applying changes to Snowflake...")
+    stale_document_ids = [uploader.document_id_for_path(path) for path in changed + removed]
+    if not uploader.delete_documents(stale_document_ids):
+        print("❌ Failed to delete stale documents")
+        return False
+    
+    upload = uploader.bulk_upload_documents_and_chunks if args.bulk_upload else uploader.upload_documents_and_chunks
+    if documents_chunks and not upload(documents_chunks, replace_tables=False):
+        print("❌ Upload failed")
+        return False
+    
+    print(f"✅ Upserted {len(documents_chunks)} documents, deleted {len(removed)}")
+    
+    # Step 4: Patch the local indexes
+    if not args.skip_local_index:
+        print("\n🧮 Step 4: Updating local BM25, vector and ANN indexes and offline mirror...")
+        update_local_indexes(uploader, documents_chunks, Path(args.local_index_dir),
+                             remove_document_ids=stale_document_ids)
+    
+    # Invalidate cached search results in running servers
+    bump_index_generation(Path(args.local_index_dir))
+    
+    print("\n🎉 Incremental indexing completed successfully!")
+    return True
+
+
 def main():
     parser = argparse.ArgumentParser(description='Index documents with dual-table structure')
     parser.add_argument('--context-root', required=True, 
@@ -30,6 +212,20 @@ def main():
                        help='Clear existing tables before indexing')
     parser.add_argument('--dry-run', action='store_true',
                        help='Process documents but do not upload to Snowflake')
+    parser.add_argument('--local-index-dir', default=str(LOCAL_INDEX_DIR),
+                       help='Directory for the local memory-mapped search index')
+    parser.add_argument('--skip-local-index', action='store_true',
+                       help='Do not build the local search indexes')
+    parser.add_argument('--bulk-upload', action='store_true',
+                       help='Load all records through one staged Parquet COPY per table')
+    parser.add_argument('--workers', type=int, default=None,
+                       help='Processes used for chunking and tokenization (default: CPU count)')
+    parser.add_argument('--no-embedding-cache', action='store_true',
+                       help='Re-embed every chunk instead of reusing cached embeddings')
+    parser.add_argument('--incremental', action='store_true',
+                       help='Only re-index documents whose content changed since the last run')
+    parser.add_argument('--no-dedup', action='store_true',
+                       help='Keep near-duplicate chunks searchable and embed every chunk')
     
     args = parser.parse_args()
     context_root = Path(args.context_root)
@@ -42,29 +238,31 @@ def main():
     print(f"📁 Context root: {context_root}")
     print(f"🗑️  Clear tables: {args.clear_tables}")
     print(f"🔍 Dry run: {args.dry_run}")
+    print(f"♻️  Incremental: {args.incremental}")
     print("=" * 60)
     
+    if args.incremental:
+        if args.clear_tables:
+            print("❌ --incremental cannot be combined with --clear-tables")
+            return False
+        return run_incremental(args, context_root)
+    
     # Step 1: Process documents
     print("📄 Step 1: Processing documents...")
     processor = DocumentProcessor(context_root)
     
     # Process all documents at once using the standard API
-    chunks = processor.process_all_documents()
+    chunks = processor.process_all_documents(workers=args.workers)
     
     if not chunks:
         print("❌ No documents found to process")
         return False
     
     print(f"✅ Processed {len(chunks)} document chunks")
+    deduplicate_chunks(args, chunks)
     
     # Group chunks by document for dual-table structure
-    documents_chunks = defaultdict(list)
-    
-    for chunk in chunks:
-        # Use relative_path as the document identifier
-        relative_path = chunk.get('relative_path')
-        if relative_path:
-            documents_chunks[relative_path].append(chunk)
+    documents_chunks = group_chunks_by_document(chunks)
     
     print(f"📊 Grouped into {len(documents_chunks)} documents")
     
@@ -85,24 +283,19 @@ def main():
     
     # Step 2: Generate embeddings
     print("\n🧠 Step 2: Generating embeddings...")
-    embedding_generator = BGEEmbeddingGenerator()
+    # The model is only loaded if some chunk text is missing from the embedding cache
+    embedding_generator = BGEEmbeddingGenerator(use_cache=not args.no_embedding_cache)
     
-    if not embedding_generator.load_model():
-        print("❌ Failed to load embedding model")
+    # Generate embeddings for all canonical chunks at once
+    chunks = embed_chunks(embedding_generator, chunks)
+    if any('embedding' not in chunk for chunk in chunks):
+        print("❌ Failed to generate embeddings")
         return False
     
-    # Generate embeddings for all chunks at once
-    chunks = embedding_generator.process_document_chunks(chunks)
-    
     print("✅ Embeddings generated successfully")
     
     # Re-group chunks after embedding generation 
-    documents_chunks = defaultdict(list)
-    for chunk in chunks:
-        # Use relative_path as the document identifier
-        relative_path = chunk.get('relative_path')
-        if relative_path:
-            documents_chunks[relative_path].append(chunk)
+    documents_chunks = group_chunks_by_document(chunks)
     
     # Step 3: Upload to Snowflake
     print("\n❄️  Step 3: Uploading to Snowflake...")
@@ -116,13 +309,24 @@ def main():
         print("✅ Tables cleared")
     
     # Upload documents and chunks
-    success = uploader.upload_documents_and_chunks(documents_chunks)
+    if args.bulk_upload:
+        success = uploader.bulk_upload_documents_and_chunks(documents_chunks)
+    else:
+        success = uploader.upload_documents_and_chunks(documents_chunks)
     if not success:
         print("❌ Upload failed")
         return False
     
     print("✅ Upload completed successfully")
     
+    # Step 4: Build local index used by the searcher for semantic scoring
+    if not args.skip_local_index:
+        print("\n🧮 Step 4: Building local BM25, vector and ANN indexes and offline mirror...")
+        update_local_indexes(uploader, documents_chunks, Path(args.local_index_dir))
+    
+    # Invalidate cached search results in running servers
+    bump_index_generation(Path(args.local_index_dir))
+    
     # Final statistics
     print("\n📈 Final statistics:")
     stats = uploader.get_table_stats()
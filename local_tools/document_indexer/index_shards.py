@@ -0,0 +1,65 @@
+"""
+Category sharding for the local indexes
+
+Rows of the local vector and BM25 indexes are clustered by (category, subcategory,
+document_id), mirroring the clustering keys of the Snowflake tables. Every category,
+and every team within a category, is then a contiguous row range (a shard), so a
+filtered search only reads its own slice of the embedding matrix and postings lists
+instead of scoring the whole index and masking it afterwards.
+"""
+
+from typing import Dict, List, Optional, Sequence, Tuple
+
+
+def cluster_order(categories: Sequence[Optional[str]], subcategories: Sequence[Optional[str]],
+                  document_ids: Optional[Sequence[Optional[str]]] = None) -> List[int]:
+    """Row permutation that clusters rows by (category, subcategory, document_id), stable within a document"""
+    document_ids = document_ids if document_ids is not None else [None] * len(categories)
+    return sorted(range(len(categories)),
+                  key=lambda row: (categories[row] or '', subcategories[row] or '', document_ids[row] or ''))
+
+
+class ShardMap:
+    """Row ranges of each category and (category, subcategory) team in a clustered index"""
+
+    def __init__(self, runs: List[Dict]):
+        """
+        Args:
+            runs: Consecutive (category, subcategory) row runs, as produced by ``from_rows``
+        """
+        self.runs = runs
+        self.category_ranges: Dict[Optional[str], Tuple[int, int]] = {}
+        self.team_ranges: Dict[Tuple[Optional[str], Optional[str]], Tuple[int, int]] = {}
+
+        for run in runs:
+            category, subcategory = run['category'], run['subcategory']
+            start, end = run['start'], run['end']
+            self.team_ranges[(category, subcategory)] = (start, end)
+            category_start, _ = self.category_ranges.get(category, (start, end))
+            self.category_ranges[category] = (category_start, end)
+
+    @classmethod
+    def from_rows(cls, categories: Sequence[Optional[str]], subcategories: Sequence[Optional[str]]) -> "ShardMap":
+        """Shard map of rows that are already in ``cluster_order``"""
+        runs = []
+        for row, key in enumerate(zip(categories, subcategories)):
+            if runs and (runs[-1]['category'], runs[-1]['subcategory']) == key:
+                runs[-1]['end'] = row + 1
+            else:
+                runs.append({'category': key[0], 'subcategory': key[1], 'start': row, 'end': row + 1})
+        return cls(runs)
+
+    def row_range(self, category: Optional[str] = None,
+                  subcategory: Optional[str] = None) -> Optional[Tuple[int, int]]:
+        """
+        Contiguous rows matching a filter
+
+        Returns:
+            (start, end) row range ((0, 0) when nothing matches), or None when the
+            filter is not a single shard (no filter, or a team without a category)
+        """
+        if not category:
+            return None
+        if subcategory:
+            return self.team_ranges.get((category, subcategory), (0, 0))
+        return self.category_ranges.get(category, (0, 0))
@@ -0,0 +1,402 @@
+#!/usr/bin/env python3
+"""
+Offline mirror of the document and chunk index tables
+
+The document/chunk rows live in an embedded SQLite database next to the local
+vector and BM25 indexes (which hold the embedding matrix and postings). The
+mirror is built by ``index_documents_dual.py`` or synced from Snowflake, and
+``LocalMirrorHook`` answers the searcher's SQL against it, so searches need no
+Snowflake connection at all.
+
+Usage:
+    python local_mirror.py sync       # Pull tables + embeddings from Snowflake
+    python local_mirror.py stats      # Row counts of the local mirror
+"""
+
+import json
+import os
+import re
+import sqlite3
+import sys
+import argparse
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import pandas as pd
+
+try:
+    from .vector_index import LocalVectorIndex
+    from .bm25_index import InvertedBM25Index
+    from .search_cache import bump_index_generation
+    from .quantization import decode_embedding
+    from .config import LOCAL_INDEX_DIR, SNOWFLAKE_DATABASE, SNOWFLAKE_SCHEMA, DOCUMENT_TABLE, CHUNK_TABLE
+except ImportError:
+    from vector_index import LocalVectorIndex
+    from bm25_index import InvertedBM25Index
+    from search_cache import bump_index_generation
+    from quantization import decode_embedding
+    from config import LOCAL_INDEX_DIR, SNOWFLAKE_DATABASE, SNOWFLAKE_SCHEMA, DOCUMENT_TABLE, CHUNK_TABLE
+
+
+MIRROR_FILE = "document_mirror.sqlite"
+
+# Columns holding Snowflake ARRAYs; stored as JSON text in SQLite
+ARRAY_COLUMNS = ('REFERENCED_TABLES', 'BM25_TOKENS', 'EMBEDDING')
+
+
+def _regexp_count(subject: Optional[str], pattern: str) -> Optional[int]:
+    """Snowflake REGEXP_COUNT for SQLite"""
+    if subject is None:
+        return None
+    return len(re.findall(pattern, subject))
+
+
+def _contains(subject: Optional[str], search: Optional[str]) -> Optional[bool]:
+    """Snowflake CONTAINS for SQLite"""
+    if subject is None or search is None:
+        return None
+    return search in subject
+
+
+class LocalMirror:
+    """
+    SQLite copy of the document/chunk tables
+
+    Embeddings normally stay in LocalVectorIndex; ``keep_embeddings`` stores them in the
+    chunk table too, so the mirror can stand in for the full Snowflake SQL path.
+    """
+
+    def __init__(self, index_dir: Optional[Path] = None,
+                 document_table: str = DOCUMENT_TABLE, chunk_table: str = CHUNK_TABLE,
+                 keep_embeddings: bool = False):
+        self.index_dir = Path(index_dir or LOCAL_INDEX_DIR)
+        self.document_table = document_table
+        self.chunk_table = chunk_table
+        self.keep_embeddings = keep_embeddings
+
+    @property
+    def path(self) -> Path:
+        return self.index_dir / MIRROR_FILE
+
+    def exists(self) -> bool:
+        return self.path.exists()
+
+    def connect(self, path: Optional[Path] = None) -> sqlite3.Connection:
+        """Open a connection with the Snowflake functions used by the searcher registered"""
+        conn = sqlite3.connect(str(path or self.path), check_same_thread=False)
+        conn.create_function("REGEXP_COUNT", 2, _regexp_count, deterministic=True)
+        conn.create_function("CONTAINS", 2, _contains, deterministic=True)
+        return conn
+
+    def get_hook(self, table_map: Optional[Dict[str, str]] = None) -> "LocalMirrorHook":
+        """SnowflakeHook stand-in that runs queries against the mirror"""
+        return LocalMirrorHook(self, table_map or {})
+
+    @staticmethod
+    def _to_frame(records: List[Dict], drop_embeddings: bool = False) -> pd.DataFrame:
+        df = pd.DataFrame(records)
+        if drop_embeddings:
+            for column in ('EMBEDDING_Q', 'EMBEDDING_SCALE'):
+                if column in df.columns:
+                    df[column] = None
+        for column in ARRAY_COLUMNS:
+            if column in df.columns:
+                if drop_embeddings and column == 'EMBEDDING':
+                    # The embedding matrix lives in the local vector index
+                    df[column] = None
+                else:
+                    df[column] = df[column].map(lambda value: None if value is None else json.dumps(list(value)))
+        return df
+
+    def _write(self, conn: sqlite3.Connection, document_records: List[Dict], chunk_records: List[Dict],
+               if_exists: str):
+        if if_exists == 'append':
+            self._add_chunk_category_columns(conn)
+            self._add_missing_columns(conn, self.chunk_table, chunk_records)
+        if document_records:
+            self._to_frame(document_records).to_sql(self.document_table, conn, if_exists=if_exists, index=False)
+        if chunk_records:
+            self._to_frame(chunk_records, drop_embeddings=not self.keep_embeddings).to_sql(
+                self.chunk_table, conn, if_exists=if_exists, index=False
+            )
+        conn.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS {self.document_table}_pk "
+                     f"ON {self.document_table} (DOCUMENT_ID)")
+        conn.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS {self.chunk_table}_pk ON {self.chunk_table} (CHUNK_ID)")
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {self.chunk_table}_document "
+                     f"ON {self.chunk_table} (DOCUMENT_ID, CHUNK_START)")
+        if self._add_chunk_category_columns(conn):
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {self.chunk_table}_category "
+                         f"ON {self.chunk_table} (CATEGORY, SUBCATEGORY, DOCUMENT_ID)")
+
+    @staticmethod
+    def _add_missing_columns(conn: sqlite3.Connection, table: str, records: List[Dict]):
+        """Add columns of newer records (e.g. DUPLICATE_OF) to a mirror table written before they existed"""
+        columns = {row[1].upper() for row in conn.execute(f"PRAGMA table_info({table})")}
+        if not columns or not records:
+            return
+        for column in records[0]:
+            if column.upper() not in columns:
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN {column}")
+
+    def _add_chunk_category_columns(self, conn: sqlite3.Connection) -> bool:
+        """Backfill chunk CATEGORY/SUBCATEGORY in mirrors that predate them; False if there is no chunk table"""
+        columns = {row[1].upper() for row in conn.execute(f"PRAGMA table_info({self.chunk_table})")}
+        if not columns:
+            return False
+        if 'CATEGORY' not in columns:
+            conn.execute(f"ALTER TABLE {self.chunk_table} ADD COLUMN CATEGORY TEXT")
+            conn.execute(f"ALTER TABLE {self.chunk_table} ADD COLUMN SUBCATEGORY TEXT")
+            conn.execute(f"""
+                UPDATE {self.chunk_table} SET
+                    CATEGORY = (SELECT d.CATEGORY FROM {self.document_table} d
+                                WHERE d.DOCUMENT_ID = {self.chunk_table}.DOCUMENT_ID),
+                    SUBCATEGORY = (SELECT d.SUBCATEGORY FROM {self.document_table} d
+                                   WHERE d.DOCUMENT_ID = {self.chunk_table}.DOCUMENT_ID)
+            """)
+        return True
+
+    def build(self, document_records: List[Dict], chunk_records: List[Dict]) -> bool:
+        """
+        Replace the mirror with the given records (as produced by DualTableUploader.prepare_records)
+
+        Returns:
+            True if the mirror was written successfully, False otherwise
+        """
+        if not document_records or not chunk_records:
+            print("No records to mirror")
+            return False
+
+        try:
+            self.index_dir.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix('.tmp.sqlite')
+            if tmp_path.exists():
+                tmp_path.unlink()
+
+            conn = self.connect(tmp_path)
+            try:
+                self._write(conn, document_records, chunk_records, if_exists='replace')
+                conn.commit()
+            finally:
+                conn.close()
+
+            # Swap in atomically so a running server never reads a half-written mirror
+            os.replace(tmp_path, self.path)
+            print(f"Wrote local mirror ({len(document_records)} documents, {len(chunk_records)} chunks) "
+                  f"to {self.path}")
+            return True
+
+        except Exception as e:
+            print(f"Error building local mirror: {e}")
+            return False
+
+    def update(self, remove_document_ids: Sequence[str], document_records: List[Dict],
+               chunk_records: List[Dict]) -> bool:
+        """
+        Incrementally replace documents in an existing mirror
+
+        Returns:
+            True if the mirror was updated, False if it must be rebuilt or synced
+        """
+        if not self.exists():
+            print("No local mirror to update (run a full index or `local_mirror.py sync`)")
+            return False
+
+        try:
+            conn = self.connect()
+            try:
+                ids = list(remove_document_ids)
+                for i in range(0, len(ids), 500):
+                    placeholders = ', '.join('?' * len(ids[i:i + 500]))
+                    conn.execute(f"DELETE FROM {self.chunk_table} WHERE DOCUMENT_ID IN ({placeholders})",
+                                 ids[i:i + 500])
+                    conn.execute(f"DELETE FROM {self.document_table} WHERE DOCUMENT_ID IN ({placeholders})",
+                                 ids[i:i + 500])
+                self._write(conn, document_records, chunk_records, if_exists='append')
+                conn.commit()
+            finally:
+                conn.close()
+
+            print(f"Updated local mirror: removed {len(ids)} documents, added {len(document_records)}")
+            return True
+
+        except Exception as e:
+            print(f"Error updating local mirror: {e}")
+            return False
+
+    def sync_from_snowflake(self, hook, database: str = SNOWFLAKE_DATABASE, schema: str = SNOWFLAKE_SCHEMA,
+                            build_indexes: bool = True) -> bool:
+        """
+        Pull both tables from Snowflake into the mirror and rebuild the local indexes
+
+        Args:
+            hook: SnowflakeHook connected to the index tables
+            database: Database holding the index tables
+            schema: Schema holding the index tables
+            build_indexes: Also rebuild the local vector (embedding matrix) and BM25 indexes
+
+        Returns:
+            True if the mirror (and indexes) were written successfully, False otherwise
+        """
+        try:
+            print("Fetching document and chunk tables from Snowflake...")
+            documents = hook.query_snowflake(f"SELECT * FROM {database}.{schema}.{self.document_table}")
+            chunks = hook.query_snowflake(f"SELECT * FROM {database}.{schema}.{self.chunk_table}")
+        except Exception as e:
+            print(f"Error fetching index tables from Snowflake: {e}")
+            return False
+
+        def records(df: pd.DataFrame) -> List[Dict]:
+            df = df.rename(columns=str.upper)
+            for column in ARRAY_COLUMNS:
+                if column in df.columns:
+                    # Snowflake returns ARRAY columns as JSON strings
+                    df[column] = df[column].map(lambda value: json.loads(value) if isinstance(value, str) else value)
+            return df.to_dict('records')
+
+        document_records, chunk_records = records(documents), records(chunks)
+        if not self.build(document_records, chunk_records):
+            return False
+
+        if not build_indexes:
+            bump_index_generation(self.index_dir)
+            return True
+
+        documents_by_id = {record['DOCUMENT_ID']: record for record in document_records}
+        document_ids = [record['DOCUMENT_ID'] for record in chunk_records]
+        categories = [documents_by_id.get(document_id, {}).get('CATEGORY') for document_id in document_ids]
+        subcategories = [documents_by_id.get(document_id, {}).get('SUBCATEGORY') for document_id in document_ids]
+
+        # Near-duplicates stay in the mirror (documents, context windows) but not in the search indexes;
+        # DUPLICATE_OF is NULL (None or NaN from pandas) for canonical chunks
+        searchable = [i for i, record in enumerate(chunk_records)
+                      if not isinstance(record.get('DUPLICATE_OF'), str) or not record['DUPLICATE_OF']]
+
+        bm25_ok = InvertedBM25Index(self.index_dir).build(
+            [chunk_records[i]['CHUNK_ID'] for i in searchable],
+            [chunk_records[i].get('BM25_TOKENS') or [] for i in searchable],
+            [categories[i] for i in searchable],
+            [subcategories[i] for i in searchable],
+            [document_ids[i] for i in searchable],
+        )
+
+        # float16 uploads only store the codes; int8 uploads keep the float array next to them
+        int8_only = 0
+        for record in (chunk_records[i] for i in searchable):
+            if not isinstance(record.get('EMBEDDING'), list) or not record['EMBEDDING']:
+                codes, scale = record.get('EMBEDDING_Q'), record.get('EMBEDDING_SCALE')
+                record['EMBEDDING'] = (decode_embedding(codes, scale)
+                                       if isinstance(codes, (bytes, bytearray)) else None)
+                if record['EMBEDDING'] is not None and pd.notna(scale):
+                    int8_only += 1
+        if int8_only:
+            print(f"⚠️  {int8_only} chunks only have int8 codes in Snowflake; their local embeddings are "
+                  f"dequantized approximations (re-index them to restore full precision)")
+
+        embedded = [i for i in searchable if chunk_records[i]['EMBEDDING'] is not None]
+        vector_ok = LocalVectorIndex(self.index_dir).build(
+            [chunk_records[i]['CHUNK_ID'] for i in embedded],
+            [chunk_records[i]['EMBEDDING'] for i in embedded],
+            [categories[i] for i in embedded],
+            [subcategories[i] for i in embedded],
+            [document_ids[i] for i in embedded],
+        )
+
+        # Invalidate cached search results in running servers
+        bump_index_generation(self.index_dir)
+        return bm25_ok and vector_ok
+
+    def stats(self) -> Optional[Dict]:
+        """Row counts of the mirrored tables"""
+        if not self.exists():
+            return None
+
+        conn = self.connect()
+        try:
+            return {
+                'documents': conn.execute(f"SELECT COUNT(*) FROM {self.document_table}").fetchone()[0],
+                'chunks': conn.execute(f"SELECT COUNT(*) FROM {self.chunk_table}").fetchone()[0],
+            }
+        finally:
+            conn.close()
+
+
+class LocalMirrorHook:
+    """
+    Minimal SnowflakeHook stand-in backed by the local mirror
+
+    Fully qualified Snowflake table names in the SQL are mapped to the mirror's
+    tables; REGEXP_COUNT and CONTAINS are provided as SQLite functions.
+    """
+
+    def __init__(self, mirror: LocalMirror, table_map: Dict[str, str]):
+        self.mirror = mirror
+        self.table_map = table_map
+
+    def _translate(self, query: str) -> str:
+        for full_name, local_name in self.table_map.items():
+            query = re.sub(re.escape(full_name), local_name, query, flags=re.IGNORECASE)
+        return query
+
+    def query_snowflake(self, query: str, method: Optional[str] = 'pandas') -> pd.DataFrame:
+        """Run a query against the mirror, returning a pandas DataFrame with lowercase columns"""
+        conn = self.mirror.connect()
+        try:
+            df = pd.read_sql_query(self._translate(query), conn)
+        finally:
+            conn.close()
+        df.columns = map(str.lower, df.columns)
+        return df
+
+    def query_without_result(self, query: str):
+        conn = self.mirror.connect()
+        try:
+            conn.execute(self._translate(query))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Manage the offline mirror of the document index tables')
+    parser.add_argument('command', choices=['sync', 'stats'],
+                       help='sync: pull tables and embeddings from Snowflake; stats: show mirror row counts')
+    parser.add_argument('--local-index-dir', default=str(LOCAL_INDEX_DIR),
+                       help='Directory for the local mirror and search indexes')
+
+    args = parser.parse_args()
+    mirror = LocalMirror(Path(args.local_index_dir))
+
+    if args.command == 'stats':
+        stats = mirror.stats()
+        if stats is None:
+            print(f"❌ No local mirror at {mirror.path}")
+            return False
+        print(f"📄 Documents: {stats['documents']}")
+        print(f"📝 Chunks: {stats['chunks']}")
+        return True
+
+    try:
+        from utils.snowflake_connection import SnowflakeHook
+    except ImportError:
+        sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+        from utils.snowflake_connection import SnowflakeHook
+
+    with SnowflakeHook(database=SNOWFLAKE_DATABASE, schema=SNOWFLAKE_SCHEMA) as hook:
+        success = mirror.sync_from_snowflake(hook)
+
+    print("🎉 Local mirror synced" if success else "❌ Local mirror sync failed")
+    return success
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,144 @@
+"""
+Near-duplicate chunk detection
+
+Documents converted from overlapping Google Docs produce many near-identical chunks.
+Each chunk gets a MinHash signature over its word shingles; LSH banding finds likely
+pairs, and a chunk whose estimated Jaccard similarity to an earlier canonical chunk
+reaches the threshold is marked ``duplicate_of`` that chunk. Duplicates keep their
+rows (documents and context windows stay complete) but reuse the canonical
+embedding and are left out of the search indexes. Chunks are only compared within
+the same category and subcategory, so a filtered search always has the canonical
+copy inside its filter.
+"""
+
+import hashlib
+import re
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    from .config import NEAR_DUPLICATE_THRESHOLD, MINHASH_PERMUTATIONS, MINHASH_BANDS, SHINGLE_SIZE
+except ImportError:
+    from config import NEAR_DUPLICATE_THRESHOLD, MINHASH_PERMUTATIONS, MINHASH_BANDS, SHINGLE_SIZE
+
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+
+
+def chunk_key(chunk: Dict) -> Tuple[str, int]:
+    """Identity of a chunk within an indexing run: (relative_path, chunk_id)"""
+    return chunk.get('relative_path'), chunk.get('chunk_id', 0)
+
+
+def shingles(text: str, size: int = SHINGLE_SIZE) -> set:
+    """Word shingles of normalized text (the whole text for very short chunks)"""
+    words = re.findall(r'\w+', text.lower())
+    if len(words) < size:
+        return {' '.join(words)} if words else set()
+    return {' '.join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+class MinHasher:
+    """MinHash signatures with a fixed set of universal hash permutations"""
+
+    def __init__(self, num_perm: int = MINHASH_PERMUTATIONS, seed: int = 1):
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self.a = rng.integers(1, int(_MERSENNE_PRIME), size=num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, int(_MERSENNE_PRIME), size=num_perm, dtype=np.uint64)
+
+    def signature(self, shingle_set: set) -> Optional[np.ndarray]:
+        """Signature of a shingle set, or None for an empty set"""
+        if not shingle_set:
+            return None
+        hashes = np.fromiter(
+            (int.from_bytes(hashlib.blake2b(shingle.encode('utf-8'), digest_size=4).digest(), 'little')
+             for shingle in shingle_set),
+            dtype=np.uint64, count=len(shingle_set),
+        )
+        permuted = (hashes[:, None] * self.a + self.b) % _MERSENNE_PRIME & _MAX_HASH
+        return permuted.min(axis=0)
+
+
+def mark_near_duplicates(chunks: List[Dict], threshold: float = NEAR_DUPLICATE_THRESHOLD,
+                         num_perm: int = MINHASH_PERMUTATIONS, bands: int = MINHASH_BANDS) -> Dict:
+    """
+    Mark near-duplicate chunks in place
+
+    Chunks are visited in (relative_path, chunk_id) order, so the canonical chunk of a
+    group is stable across runs. Only chunks of the same (category, subcategory) are
+    compared. Duplicates get ``duplicate_of`` = canonical chunk_key; canonical chunks
+    get ``duplicate_count``.
+
+    Args:
+        chunks: Chunks from DocumentProcessor
+        threshold: Minimum estimated Jaccard similarity of word shingles
+        num_perm: MinHash permutations (must be divisible by bands)
+        bands: LSH bands
+
+    Returns:
+        Stats dict with chunk, duplicate and canonical counts and the dedup ratio
+    """
+    hasher = MinHasher(num_perm)
+    rows_per_band = num_perm // bands
+    buckets: Dict[Tuple[Tuple[Optional[str], Optional[str]], int, bytes], List[int]] = defaultdict(list)
+    signatures: Dict[int, np.ndarray] = {}
+
+    order = sorted(range(len(chunks)), key=lambda i: chunk_key(chunks[i]))
+    for i in order:
+        chunk = chunks[i]
+        chunk.pop('duplicate_of', None)
+        chunk.pop('duplicate_count', None)
+
+        signature = hasher.signature(shingles(chunk.get('content', '')))
+        if signature is None:
+            continue
+        # Buckets are per category/team: search filters must never drop a group's canonical chunk
+        scope = (chunk.get('category'), chunk.get('subcategory'))
+        band_keys = [(scope, band, signature[band * rows_per_band:(band + 1) * rows_per_band].tobytes())
+                     for band in range(bands)]
+
+        # Most similar earlier canonical chunk sharing at least one band
+        candidates = {j for key in band_keys for j in buckets.get(key, ())}
+        best, best_similarity = None, threshold
+        for j in candidates:
+            similarity = float(np.mean(signatures[j] == signature))
+            if similarity >= best_similarity:
+                best, best_similarity = j, similarity
+
+        if best is not None:
+            chunk['duplicate_of'] = chunk_key(chunks[best])
+            chunks[best]['duplicate_count'] = chunks[best].get('duplicate_count', 0) + 1
+        else:
+            signatures[i] = signature
+            for key in band_keys:
+                buckets[key].append(i)
+
+    n_duplicates = sum(1 for chunk in chunks if chunk.get('duplicate_of'))
+    return {
+        'chunks': len(chunks),
+        'duplicates': n_duplicates,
+        'canonical': len(chunks) - n_duplicates,
+        'dedup_ratio': n_duplicates / len(chunks) if chunks else 0.0,
+    }
+
+
+def copy_canonical_embeddings(chunks: List[Dict]) -> int:
+    """
+    Give each duplicate its canonical chunk's embedding (only canonical chunks are embedded)
+
+    Returns:
+        Number of duplicates that received an embedding
+    """
+    by_key = {chunk_key(chunk): chunk for chunk in chunks}
+    copied = 0
+    for chunk in chunks:
+        canonical = by_key.get(chunk.get('duplicate_of'))
+        if canonical is not None and 'embedding' in canonical:
+            chunk['embedding'] = canonical['embedding']
+            chunk['embedding_dim'] = canonical.get('embedding_dim', len(canonical['embedding']))
+            copied += 1
+    return copied
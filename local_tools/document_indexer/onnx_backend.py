@@ -0,0 +1,258 @@
+"""
+ONNX Runtime inference backend for BGE embeddings (CPU)
+
+Exports the sentence-transformers model to ONNX, applies dynamic int8 weight
+quantization, and encodes with length-sorted, token-budgeted batches so short
+chunks are not padded to the length of the longest text in a fixed-size batch.
+"""
+
+import json
+from pathlib import Path
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+try:
+    import onnxruntime as ort
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+    from transformers import AutoTokenizer
+    ONNX_AVAILABLE = True
+except ImportError:
+    ONNX_AVAILABLE = False
+
+try:
+    from .config import ONNX_MODEL_LOCAL_PATH, EMBEDDING_MAX_BATCH_TOKENS
+except ImportError:
+    from config import ONNX_MODEL_LOCAL_PATH, EMBEDDING_MAX_BATCH_TOKENS
+
+
+FP32_MODEL_FILE = "model.onnx"
+INT8_MODEL_FILE = "model_int8.onnx"
+EXPORT_META_FILE = "export_config.json"
+
+
+class ONNXEmbeddingBackend:
+    """Drop-in replacement for ``SentenceTransformer.encode`` backed by ONNX Runtime"""
+
+    def __init__(self, model_path: Path, onnx_path: Optional[Path] = None, quantized: bool = True,
+                 num_threads: int = 0, max_batch_tokens: int = EMBEDDING_MAX_BATCH_TOKENS):
+        """
+        Args:
+            model_path: Local sentence-transformers model directory (tokenizer + weights)
+            onnx_path: Directory for the exported ONNX models
+            quantized: Use the dynamic int8 quantized model
+            num_threads: Intra-op threads for ONNX Runtime (0 = runtime default)
+            max_batch_tokens: Padded tokens per batch (batch size x longest sequence)
+        """
+        self.model_path = Path(model_path)
+        self.onnx_path = Path(onnx_path or ONNX_MODEL_LOCAL_PATH)
+        self.quantized = quantized
+        self.num_threads = num_threads
+        self.max_batch_tokens = max_batch_tokens
+        self.tokenizer = None
+        self.session = None
+        self.input_names: List[str] = []
+        self.pooling = "cls"
+        self.max_seq_length = 512
+
+    @property
+    def model_file(self) -> Path:
+        return self.onnx_path / (INT8_MODEL_FILE if self.quantized else FP32_MODEL_FILE)
+
+    def _read_model_config(self):
+        """Pooling mode and max sequence length from the sentence-transformers config"""
+        pooling_config = self.model_path / "1_Pooling" / "config.json"
+        if pooling_config.exists():
+            with open(pooling_config, 'r', encoding='utf-8') as f:
+                self.pooling = "mean" if json.load(f).get('pooling_mode_mean_tokens') else "cls"
+
+        sbert_config = self.model_path / "sentence_bert_config.json"
+        if sbert_config.exists():
+            with open(sbert_config, 'r', encoding='utf-8') as f:
+                self.max_seq_length = json.load(f).get('max_seq_length', self.max_seq_length)
+
+    def export(self) -> bool:
+        """
+        Export the transformer to ONNX and write a dynamic int8 quantized copy
+
+        Returns:
+            True if both models were written, False otherwise
+        """
+        if not ONNX_AVAILABLE:
+            print("onnxruntime not available. Install with: pip install onnxruntime onnx")
+            return False
+
+        try:
+            import torch
+            from transformers import AutoModel
+
+            self.onnx_path.mkdir(parents=True, exist_ok=True)
+            self._read_model_config()
+
+            tokenizer = AutoTokenizer.from_pretrained(str(self.model_path))
+            model = AutoModel.from_pretrained(str(self.model_path))
+            model.eval()
+
+            sample = tokenizer(["export sample"], return_tensors="pt")
+            input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+            dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+            dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+
+            class _LastHiddenState(torch.nn.Module):
+                def __init__(self, transformer):
+                    super().__init__()
+                    self.transformer = transformer
+
+                def forward(self, *inputs):
+                    return self.transformer(**dict(zip(input_names, inputs)))[0]
+
+            print(f"Exporting {self.model_path} to ONNX...")
+            with torch.no_grad():
+                torch.onnx.export(
+                    _LastHiddenState(model),
+                    tuple(sample[name] for name in input_names),
+                    str(self.onnx_path / FP32_MODEL_FILE),
+                    input_names=input_names,
+                    output_names=["last_hidden_state"],
+                    dynamic_axes=dynamic_axes,
+                    opset_version=14,
+                )
+
+            print("Quantizing ONNX model weights to int8...")
+            quantize_dynamic(
+                str(self.onnx_path / FP32_MODEL_FILE),
+                str(self.onnx_path / INT8_MODEL_FILE),
+                weight_type=QuantType.QInt8,
+            )
+
+            with open(self.onnx_path / EXPORT_META_FILE, 'w', encoding='utf-8') as f:
+                json.dump({'source': str(self.model_path), 'pooling': self.pooling,
+                           'max_seq_length': self.max_seq_length}, f)
+
+            print(f"ONNX models saved to {self.onnx_path}")
+            return True
+
+        except Exception as e:
+            print(f"Error exporting ONNX model: {e}")
+            return False
+
+    def load(self) -> bool:
+        """
+        Load the tokenizer and ONNX Runtime session (exporting the model first if needed)
+
+        Returns:
+            True if the backend is ready, False otherwise
+        """
+        if not ONNX_AVAILABLE:
+            print("onnxruntime not available. Install with: pip install onnxruntime onnx")
+            return False
+
+        if not self.model_file.exists() and not self.export():
+            return False
+
+        try:
+            self._read_model_config()
+            self.tokenizer = AutoTokenizer.from_pretrained(str(self.model_path))
+
+            options = ort.SessionOptions()
+            options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+            if self.num_threads > 0:
+                options.intra_op_num_threads = self.num_threads
+                options.inter_op_num_threads = 1
+
+            self.session = ort.InferenceSession(str(self.model_file), sess_options=options,
+                                                providers=["CPUExecutionProvider"])
+            self.input_names = [model_input.name for model_input in self.session.get_inputs()]
+            print(f"Loaded ONNX model {self.model_file.name} ({self.pooling} pooling)")
+            return True
+
+        except Exception as e:
+            print(f"Error loading ONNX model: {e}")
+            return False
+
+    def _pool(self, hidden_states: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+        if self.pooling == "mean":
+            mask = attention_mask[..., None].astype(np.float32)
+            return (hidden_states * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+        return hidden_states[:, 0]
+
+    def encode(self, texts: List[str], batch_size: int = 32, show_progress_bar: bool = False,
+               convert_to_numpy: bool = True, normalize_embeddings: bool = True) -> np.ndarray:
+        """
+        Embed texts (same call signature as ``SentenceTransformer.encode``)
+
+        Texts are sorted by token length and grouped so that each batch holds at
+        most ``max_batch_tokens`` padded tokens (and at most ``batch_size`` texts);
+        results are returned in input order.
+        """
+        if self.session is None and not self.load():
+            raise RuntimeError("ONNX backend is not available")
+
+        encoded = self.tokenizer(list(texts), truncation=True, max_length=self.max_seq_length,
+                                 add_special_tokens=True)
+        return self._encode_batches(encoded, batch_size, show_progress_bar, normalize_embeddings)
+
+    def encode_token_ids(self, token_ids: Sequence[Sequence[int]], batch_size: int = 32,
+                         show_progress_bar: bool = False, normalize_embeddings: bool = True) -> np.ndarray:
+        """
+        Embed already tokenized texts (input ids with special tokens, e.g. from the chunker)
+
+        Same batching as ``encode`` without running the tokenizer again.
+        """
+        if self.session is None and not self.load():
+            raise RuntimeError("ONNX backend is not available")
+
+        input_ids = []
+        for ids in token_ids:
+            ids = [int(token_id) for token_id in ids]
+            if len(ids) > self.max_seq_length:
+                ids = ids[:self.max_seq_length - 1] + ids[-1:]  # keep [SEP]
+            input_ids.append(ids)
+        encoded = {
+            "input_ids": input_ids,
+            "attention_mask": [[1] * len(ids) for ids in input_ids],
+            "token_type_ids": [[0] * len(ids) for ids in input_ids],
+        }
+        return self._encode_batches(encoded, batch_size, show_progress_bar, normalize_embeddings)
+
+    def _encode_batches(self, encoded, batch_size: int, show_progress_bar: bool,
+                        normalize_embeddings: bool) -> np.ndarray:
+        """Run token-budgeted, length-sorted batches over tokenized inputs"""
+        lengths = [len(ids) for ids in encoded["input_ids"]]
+        order = np.argsort(lengths, kind='stable')
+
+        embeddings: List[Optional[np.ndarray]] = [None] * len(lengths)
+        batch: List[int] = []
+        n_batches = 0
+
+        def run(batch_rows: List[int]):
+            width = max(lengths[i] for i in batch_rows)
+            feed = {}
+            for name in self.input_names:
+                values = np.zeros((len(batch_rows), width), dtype=np.int64)
+                for r, i in enumerate(batch_rows):
+                    values[r, :lengths[i]] = encoded[name][i]
+                feed[name] = values
+            hidden_states = self.session.run(None, feed)[0]
+            pooled = self._pool(hidden_states, feed["attention_mask"])
+            for r, i in enumerate(batch_rows):
+                embeddings[i] = pooled[r]
+
+        for i in order:
+            # Sorted ascending, so the current text is the longest in the batch
+            if batch and (len(batch) >= batch_size or (len(batch) + 1) * lengths[i] > self.max_batch_tokens):
+                run(batch)
+                n_batches += 1
+                if show_progress_bar:
+                    print(f"Encoded batch {n_batches} ({len(batch)} texts)")
+                batch = []
+            batch.append(int(i))
+        if batch:
+            run(batch)
+
+        matrix = np.vstack(embeddings).astype(np.float32) if embeddings else np.zeros((0, 0), np.float32)
+        if normalize_embeddings and len(matrix):
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            matrix = matrix / norms
+        return matrix
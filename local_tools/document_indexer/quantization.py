@@ -0,0 +1,134 @@
+"""
+Scalar quantization of chunk embeddings
+
+Embeddings are stored either as float16 or as int8 codes with one float32 scale per
+vector (``code * scale`` approximates the original value). float16 keeps enough
+precision to be scored directly. int8 codes are only used to pick a shortlist, which
+is re-scored against a full-precision copy, so the ranking matches that copy for
+everything that makes the shortlist.
+"""
+
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+
+try:
+    from .config import EMBEDDING_QUANTIZATION
+except ImportError:
+    from config import EMBEDDING_QUANTIZATION
+
+
+QUANTIZATION_MODES = ("none", "float16", "int8")
+
+
+def quantize(matrix: np.ndarray, mode: str = EMBEDDING_QUANTIZATION) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """
+    Quantize an embedding matrix row by row
+
+    Args:
+        matrix: (n, dim) float embedding matrix
+        mode: "float16" or "int8"
+
+    Returns:
+        Tuple of (codes, per-row float32 scales or None for float16)
+    """
+    matrix = np.asarray(matrix, dtype=np.float32)
+    if mode == "float16":
+        return matrix.astype(np.float16), None
+    if mode != "int8":
+        raise ValueError(f"Unknown embedding quantization mode: {mode}")
+
+    scales = np.abs(matrix).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.clip(np.rint(matrix / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def dequantize(codes: np.ndarray, scales: Optional[np.ndarray] = None) -> np.ndarray:
+    """Float32 approximation of quantized rows"""
+    matrix = np.asarray(codes, dtype=np.float32)
+    if scales is not None:
+        matrix = matrix * np.asarray(scales, dtype=np.float32)[:, None]
+    return matrix
+
+
+def quantized_scores(codes: np.ndarray, scales: Optional[np.ndarray], query_vec: np.ndarray,
+                     block_rows: int = 16384) -> np.ndarray:
+    """
+    Dot products of a float32 query with quantized rows
+
+    Codes are widened one block at a time, so the scan reads the compact matrix and
+    never materializes a full float32 copy.
+    """
+    query_vec = np.asarray(query_vec, dtype=np.float32)
+    scores = np.empty(codes.shape[0], dtype=np.float32)
+    for start in range(0, codes.shape[0], block_rows):
+        scores[start:start + block_rows] = codes[start:start + block_rows].astype(np.float32, copy=False) @ query_vec
+    if scales is not None:
+        scores *= scales
+    return scores
+
+
+def encode_embedding(embedding: Sequence[float], mode: str = EMBEDDING_QUANTIZATION) -> Tuple[bytes, Optional[float]]:
+    """
+    Quantize one embedding for storage in a BINARY column
+
+    Returns:
+        Tuple of (code bytes, int8 scale or None for float16)
+    """
+    codes, scales = quantize(np.asarray(embedding, dtype=np.float32).reshape(1, -1), mode)
+    return codes.tobytes(), None if scales is None else float(scales[0])
+
+
+def decode_embedding(data: Optional[bytes], scale: Optional[float] = None) -> Optional[np.ndarray]:
+    """Float32 embedding from ``encode_embedding`` output (a NULL / NaN scale means float16)"""
+    if data is None or len(data) == 0:
+        return None
+    if scale is None or not np.isfinite(scale):
+        return np.frombuffer(bytes(data), dtype=np.float16).astype(np.float32)
+    return np.frombuffer(bytes(data), dtype=np.int8).astype(np.float32) * np.float32(scale)
+
+
+def measure_recall(matrix: np.ndarray, codes: np.ndarray, scales: Optional[np.ndarray], k: int = 10,
+                   n_queries: int = 100, rescore_multiplier: int = 1, seed: int = 0,
+                   rescore_matrix: Optional[np.ndarray] = None) -> float:
+    """
+    Recall@k of quantized scoring against exact float32 scoring
+
+    Queries are indexed rows plus a little noise, which is close to how real queries
+    land among their nearest chunks.
+
+    Args:
+        matrix: Normalized float32 embedding matrix
+        codes: Quantized rows of ``matrix``
+        scales: Per-row int8 scales (None for float16)
+        k: Neighbours compared per query
+        n_queries: Number of sampled queries
+        rescore_multiplier: Shortlist of ``k * rescore_multiplier`` quantized hits re-scored
+            (1 measures raw quantized recall)
+        seed: Random seed for query sampling
+        rescore_matrix: Rows the shortlist is re-scored against, as stored for search
+            (default: ``matrix`` itself)
+
+    Returns:
+        Mean fraction of the exact top-k recovered
+    """
+    n_rows = matrix.shape[0]
+    k = min(k, n_rows)
+    if k <= 0:
+        return 1.0
+
+    rng = np.random.default_rng(seed)
+    queries = matrix[rng.choice(n_rows, size=min(n_queries, n_rows), replace=False)]
+    queries = queries + rng.normal(scale=0.05, size=queries.shape).astype(np.float32)
+    shortlist = min(k * rescore_multiplier, n_rows)
+    rescore_matrix = matrix if rescore_matrix is None else rescore_matrix
+
+    recalls = []
+    for query_vec in queries.astype(np.float32):
+        exact = np.argpartition(-(matrix @ query_vec), k - 1)[:k]
+        rows = np.argpartition(-quantized_scores(codes, scales, query_vec), shortlist - 1)[:shortlist]
+        if shortlist > k:
+            rows = rows[np.argsort(-(rescore_matrix[rows].astype(np.float32) @ query_vec))[:k]]
+        recalls.append(len(np.intersect1d(exact, rows)) / k)
+    return float(np.mean(recalls))
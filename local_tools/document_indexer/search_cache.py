@@ -0,0 +1,123 @@
+"""
+Search result cache versioned by index generation
+
+``SearchResultCache`` is a TTL + LRU cache of ranked search results keyed by the
+normalized query and every parameter that affects ranking. Each index upload bumps
+an index-generation stamp (``index_generation.json`` in the local index directory);
+the searcher drops all cached results when it sees a new generation, so results are
+never served from before a reindex. Uploads made from another machine are picked up
+from the document table itself (row count and latest ``processed_at``), which the
+searcher checks at most every ``DOCUMENT_INDEX_GENERATION_CHECK_SECONDS``.
+"""
+
+import copy
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    from .config import LOCAL_INDEX_DIR, SEARCH_RESULT_CACHE_SIZE, SEARCH_RESULT_CACHE_TTL_SECONDS
+except ImportError:
+    from config import LOCAL_INDEX_DIR, SEARCH_RESULT_CACHE_SIZE, SEARCH_RESULT_CACHE_TTL_SECONDS
+
+
+GENERATION_FILE = "index_generation.json"
+
+
+def read_index_generation(index_dir: Optional[Path] = None) -> Optional[str]:
+    """Current index-generation stamp, or None if no index upload has recorded one"""
+    path = Path(index_dir or LOCAL_INDEX_DIR) / GENERATION_FILE
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f).get('generation')
+    except (OSError, ValueError):
+        return None
+
+
+def bump_index_generation(index_dir: Optional[Path] = None) -> Optional[str]:
+    """
+    Record a new index generation (call after every upload to the index tables)
+
+    Returns:
+        The new generation stamp, or None if it could not be written
+    """
+    index_dir = Path(index_dir or LOCAL_INDEX_DIR)
+    generation = uuid.uuid4().hex
+
+    try:
+        index_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = index_dir / f"{GENERATION_FILE}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'generation': generation,
+                       'updated_at': datetime.now(timezone.utc).isoformat()}, f)
+        os.replace(tmp_path, index_dir / GENERATION_FILE)
+        return generation
+    except Exception as e:
+        print(f"Error writing index generation: {e}")
+        return None
+
+
+def normalize_query(query: str) -> str:
+    """Case- and whitespace-insensitive form of a query used in cache keys"""
+    return ' '.join(query.lower().split())
+
+
+class SearchResultCache:
+    """Thread-safe LRU of search key -> results, with entries expiring after ttl_seconds"""
+
+    def __init__(self, max_size: int = SEARCH_RESULT_CACHE_SIZE,
+                 ttl_seconds: float = SEARCH_RESULT_CACHE_TTL_SECONDS):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Tuple, Tuple[float, List[Dict]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key_for(kind: str, query: str, *params: Any) -> Tuple:
+        """Cache key: search kind, normalized query and the ranking parameters"""
+        return (kind, normalize_query(query)) + params
+
+    def get(self, key: Tuple) -> Optional[List[Dict]]:
+        """Cached results (a copy, marked most recently used), or None if missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] > self.ttl_seconds:
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            results = entry[1]
+
+        return copy.deepcopy(results)
+
+    def put(self, key: Tuple, results: List[Dict]):
+        """Store results, evicting the least recently used entries beyond max_size"""
+        if self.max_size <= 0 or self.ttl_seconds <= 0:
+            return
+
+        results = copy.deepcopy(results)
+        with self._lock:
+            self._entries[key] = (time.monotonic(), results)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """Entry count and hit/miss counters"""
+        with self._lock:
+            return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses}
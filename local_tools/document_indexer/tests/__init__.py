@@ -0,0 +1 @@
+# Document Indexer Tests
@@ -0,0 +1,104 @@
+"""
+Tests for the persisted inverted BM25 index
+
+Run from the repository root:
+    python -m pytest local_tools/document_indexer/tests
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+# The indexer modules import each other as top-level modules
+sys.path.insert(0, str(Path(__file__).parents[1]))
+
+from bm25_index import InvertedBM25Index
+
+# (chunk_id, tokens, category, subcategory, document_id), deliberately not in cluster order
+CHUNKS = [
+    ('m1', ['orders', 'revenue', 'daily'], 'metrics', 'growth', 'doc-m'),
+    ('e1', ['experiment', 'orders', 'variant'], 'experiments', 'growth', 'doc-e'),
+    ('m2', ['orders', 'orders', 'dashboard'], 'metrics', 'ads', 'doc-n'),
+    ('e2', ['experiment', 'exposure', 'revenue'], 'experiments', 'ads', 'doc-f'),
+    ('e3', ['orders', 'exposure', 'variant', 'revenue'], 'experiments', 'growth', 'doc-e'),
+    ('x1', ['unrelated', 'alerts'], None, None, 'doc-x'),
+]
+
+
+def build(index_dir, chunks=CHUNKS):
+    index = InvertedBM25Index(index_dir)
+    chunk_ids, tokens, categories, subcategories, document_ids = (list(column) for column in zip(*chunks))
+    assert index.build(chunk_ids, tokens, categories, subcategories, document_ids)
+    return index
+
+
+def test_build_and_search_ranks_by_bm25(tmp_path):
+    index = build(tmp_path)
+
+    results = index.search(['orders'], k=10)
+
+    # Every chunk containing the term scores, the repeated term in the short m2 scores highest
+    assert set(results) == {'m1', 'e1', 'm2', 'e3'}
+    assert next(iter(results)) == 'm2'
+    assert list(results.values()) == sorted(results.values(), reverse=True)
+    assert index.search(['missing'], k=10) == {}
+    assert len(index.search(['orders'], k=2)) == 2
+
+
+def test_loaded_index_matches_the_built_one(tmp_path):
+    built = build(tmp_path)
+    loaded = InvertedBM25Index(tmp_path)
+
+    assert loaded.load()
+    assert loaded.search(['orders', 'revenue'], k=10) == built.search(['orders', 'revenue'], k=10)
+
+
+@pytest.mark.parametrize('category,subcategory', [
+    ('experiments', None),
+    ('experiments', 'growth'),
+    ('metrics', 'ads'),
+    ('metrics', 'missing'),
+    ('missing', None),
+    (None, 'growth'),  # a team without a category is not a single shard
+])
+def test_shard_search_matches_mask_filtered_search(tmp_path, category, subcategory):
+    index = build(tmp_path)
+    query = ['orders', 'revenue', 'experiment', 'variant']
+
+    sharded = index.search(query, k=10, category=category, subcategory=subcategory)
+    index.shard_map = None  # Indexes written before sharding filter with a row mask
+    masked = index.search(query, k=10, category=category, subcategory=subcategory)
+
+    assert sharded.keys() == masked.keys()
+    assert list(sharded.values()) == pytest.approx(list(masked.values()))
+
+
+def test_update_replaces_documents_and_matches_a_rebuild(tmp_path):
+    index = build(tmp_path / 'updated')
+    added = [
+        ('e4', ['experiment', 'holdout', 'orders'], 'experiments', 'growth', 'doc-e'),
+        ('a1', ['alerts', 'revenue'], 'metrics', 'ads', 'doc-a'),
+    ]
+
+    chunk_ids, tokens, categories, subcategories, document_ids = (list(column) for column in zip(*added))
+    assert index.update(['doc-e', 'doc-x'], chunk_ids, tokens, categories, subcategories, document_ids)
+
+    assert sorted(index.chunk_ids) == ['a1', 'e2', 'e4', 'm1', 'm2']
+    assert 'variant' not in index.search(['variant'], k=10)
+    assert 'e4' in index.search(['holdout'], k=10)
+
+    kept = [chunk for chunk in CHUNKS if chunk[4] not in ('doc-e', 'doc-x')]
+    rebuilt = build(tmp_path / 'rebuilt', kept + added)
+    for query in (['orders'], ['revenue', 'alerts'], ['experiment', 'holdout']):
+        updated_results = index.search(query, k=10, category='experiments')
+        rebuilt_results = rebuilt.search(query, k=10, category='experiments')
+        assert updated_results.keys() == rebuilt_results.keys()
+        assert list(updated_results.values()) == pytest.approx(list(rebuilt_results.values()))
+
+
+def test_update_requires_document_ids(tmp_path):
+    index = InvertedBM25Index(tmp_path)
+    assert index.build(['c1', 'c2'], [['orders'], ['revenue']])
+
+    assert not index.update(['doc'], ['c3'], [['alerts']], [None], [None], ['doc'])
@@ -0,0 +1,122 @@
+"""
+Tests for token-aware document chunking
+
+Run from the repository root:
+    python -m pytest local_tools/document_indexer/tests
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+# The indexer modules import each other as top-level modules
+sys.path.insert(0, str(Path(__file__).parents[1]))
+
+from chunker import ChunkTokenizer, _token_windows, chunk_document
+
+
+class EstimateTokenizer(ChunkTokenizer):
+    """The chunker's token estimate, with made-up input ids so ``token_ids`` are exercised"""
+
+    def __init__(self):
+        self.tokenizer = None
+
+    def encode(self, text):
+        return [101] + [1000] * self.count(text) + [102]
+
+
+@pytest.fixture
+def tokenizer():
+    return EstimateTokenizer()
+
+
+def markdown_document(paragraphs=20, words=60):
+    sections = []
+    for i in range(paragraphs):
+        if i % 5 == 0:
+            sections.append(f"## Section {i // 5}")
+        sections.append(f"Paragraph {i} " + "word " * words)
+    return "\n\n".join(sections)
+
+
+def metadata(relative_path="docs/guide.md", content_type="markdown"):
+    return {'file_name': Path(relative_path).name, 'relative_path': relative_path, 'content_type': content_type}
+
+
+def test_small_document_is_one_chunk(tokenizer):
+    content = "# Title\n\nA short note."
+    chunks = chunk_document(content, metadata(), tokenizer)
+
+    assert len(chunks) == 1
+    assert chunks[0]['content'] == content
+    assert chunks[0]['chunk_count'] == 1
+    assert chunks[0]['token_count'] == len(chunks[0]['token_ids'])
+
+
+def test_chunks_fit_max_tokens_and_cover_the_document(tokenizer):
+    content = markdown_document()
+    chunks = chunk_document(content, metadata(), tokenizer, max_tokens=128, min_tokens=32, overlap=8)
+
+    assert len(chunks) > 1
+    assert all(chunk['token_count'] <= 128 for chunk in chunks)
+    assert all(len(chunk['token_ids']) == chunk['token_count'] for chunk in chunks)
+    assert [chunk['chunk_id'] for chunk in chunks] == list(range(len(chunks)))
+    assert all(chunk['chunk_count'] == len(chunks) for chunk in chunks)
+    # Chunks follow the document in order, without gaps in the paragraphs
+    starts = [chunk['chunk_start'] for chunk in chunks]
+    assert starts == sorted(starts)
+    for i in range(20):
+        assert any(f"Paragraph {i} " in chunk['content'] for chunk in chunks)
+
+
+def test_oversized_paragraph_is_cut_into_windows(tokenizer):
+    content = "intro\n\n" + " ".join(f"token{i}" for i in range(400))
+    chunks = chunk_document(content, metadata(), tokenizer, max_tokens=64, overlap=8)
+
+    assert len(chunks) > 1
+    assert all(chunk['token_count'] <= 64 for chunk in chunks)
+
+
+def test_sql_is_split_at_statement_ends(tokenizer):
+    statements = [f"SELECT col_{i}, " + ", ".join(f"c{j}" for j in range(20)) + f" FROM t{i};" for i in range(6)]
+    content = "\n".join(statements)
+    chunks = chunk_document(content, metadata("queries/report.sql", "sql"), tokenizer, max_tokens=96)
+
+    assert len(chunks) > 1
+    for chunk in chunks:
+        assert chunk['content'].startswith("SELECT")
+        assert chunk['content'].endswith(";")
+
+
+def test_prefix_filling_the_sequence_does_not_fail(tokenizer):
+    deep_path = "/".join(f"seg{i}" for i in range(300)) + "/guide.md"
+    content = markdown_document()
+    chunks = chunk_document(content, metadata(deep_path), tokenizer, max_tokens=512)
+
+    # Sized by content alone instead of 16-token slivers, with the embedding input truncated
+    total = tokenizer.count(content)
+    assert len(chunks) <= total // 256 + 1
+    assert all(len(chunk['token_ids']) <= 512 for chunk in chunks)
+    assert all(chunk['token_ids'][-1] == 102 for chunk in chunks)
+
+
+def test_prefix_leaving_little_room_does_not_fail(tokenizer):
+    # Prefix leaves just over the minimum content budget, so groups are re-split
+    path = "/".join(f"seg{i}" for i in range(60)) + "/guide.md"
+    prefix_tokens = tokenizer.count(f"guide.md {path}")
+    max_tokens = prefix_tokens + 2 + 20
+    chunks = chunk_document(markdown_document(paragraphs=4), metadata(path), tokenizer, max_tokens=max_tokens)
+
+    assert chunks
+    assert all(len(chunk['token_ids']) <= max_tokens for chunk in chunks)
+
+
+@pytest.mark.parametrize("budget", [0, -5, 1])
+def test_token_windows_with_degenerate_budget(tokenizer, budget):
+    text = "alpha beta gamma delta"
+    windows = _token_windows(text, 0, len(text), budget, 0, tokenizer)
+
+    assert windows
+    assert all(tokens >= 1 for _, _, tokens in windows)
+    assert windows[-1][1] == len(text)
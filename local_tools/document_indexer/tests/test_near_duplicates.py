@@ -0,0 +1,54 @@
+"""
+Tests for near-duplicate chunk detection
+
+Run from the repository root:
+    python -m pytest local_tools/document_indexer/tests
+"""
+
+import sys
+from pathlib import Path
+
+# The indexer modules import each other as top-level modules
+sys.path.insert(0, str(Path(__file__).parents[1]))
+
+from near_duplicates import copy_canonical_embeddings, mark_near_duplicates
+
+TEXT = ("Orders are attributed to the experiment variant assigned at the first exposure event "
+        "and revenue is measured over the following fourteen days for every consumer in the test")
+
+
+def chunk(path, content=TEXT, category='experiments', subcategory='growth', chunk_id=0):
+    return {'relative_path': path, 'chunk_id': chunk_id, 'content': content,
+            'category': category, 'subcategory': subcategory}
+
+
+def test_identical_chunks_in_one_team_are_deduplicated():
+    chunks = [chunk('b.md'), chunk('a.md'), chunk('c.md', content="An unrelated note about dashboards and alerts")]
+    stats = mark_near_duplicates(chunks)
+
+    assert stats['duplicates'] == 1
+    # The canonical chunk is the first in (relative_path, chunk_id) order
+    assert chunks[0]['duplicate_of'] == ('a.md', 0)
+    assert chunks[1]['duplicate_count'] == 1
+    assert 'duplicate_of' not in chunks[2]
+
+
+def test_duplicates_across_categories_or_teams_stay_canonical():
+    chunks = [chunk('a.md'), chunk('b.md', category='metrics'), chunk('c.md', subcategory='ads')]
+    stats = mark_near_duplicates(chunks)
+
+    assert stats['duplicates'] == 0
+    assert not any('duplicate_of' in c for c in chunks)
+
+
+def test_rerun_clears_stale_marks_and_copies_embeddings():
+    chunks = [chunk('a.md'), chunk('b.md')]
+    mark_near_duplicates(chunks)
+    chunks[0]['embedding'] = [0.5, 0.5]
+
+    assert copy_canonical_embeddings(chunks) == 1
+    assert chunks[1]['embedding'] == [0.5, 0.5]
+
+    chunks[1]['category'] = 'metrics'
+    assert mark_near_duplicates(chunks)['duplicates'] == 0
+    assert 'duplicate_of' not in chunks[1]
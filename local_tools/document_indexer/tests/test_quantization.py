@@ -0,0 +1,115 @@
+"""
+Tests for embedding quantization
+
+Run from the repository root:
+    python -m pytest local_tools/document_indexer/tests
+"""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+# The indexer modules import each other as top-level modules
+sys.path.insert(0, str(Path(__file__).parents[1]))
+
+from quantization import (decode_embedding, dequantize, encode_embedding, measure_recall, quantize,
+                          quantized_scores)
+
+
+def normalized(rows, dim=64, seed=0):
+    matrix = np.random.default_rng(seed).normal(size=(rows, dim)).astype(np.float32)
+    return matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+
+
+def test_int8_round_trip_error_is_bounded_by_half_a_step():
+    matrix = normalized(200)
+    codes, scales = quantize(matrix, "int8")
+
+    assert codes.dtype == np.int8 and scales.dtype == np.float32
+    assert np.abs(codes).max() == 127
+    error = np.abs(dequantize(codes, scales) - matrix)
+    assert np.all(error <= scales[:, None] / 2 + 1e-7)
+
+
+def test_int8_zero_row_keeps_unit_scale():
+    codes, scales = quantize(np.zeros((1, 8), dtype=np.float32), "int8")
+
+    assert scales[0] == 1.0
+    assert not codes.any()
+
+
+def test_float16_round_trip():
+    matrix = normalized(50)
+    codes, scales = quantize(matrix, "float16")
+
+    assert codes.dtype == np.float16 and scales is None
+    np.testing.assert_allclose(dequantize(codes), matrix, atol=1e-3)
+
+
+def test_unknown_mode_is_rejected():
+    with pytest.raises(ValueError):
+        quantize(normalized(2), "int4")
+
+
+@pytest.mark.parametrize("mode", ["int8", "float16"])
+def test_quantized_scores_match_dequantized_dot_products(mode):
+    matrix = normalized(1000)
+    query = normalized(1, seed=1)[0]
+    codes, scales = quantize(matrix, mode)
+
+    scores = quantized_scores(codes, scales, query, block_rows=128)
+    np.testing.assert_allclose(scores, dequantize(codes, scales) @ query, rtol=1e-5, atol=1e-5)
+    np.testing.assert_allclose(scores, matrix @ query, atol=0.02)
+
+
+@pytest.mark.parametrize("mode", ["int8", "float16"])
+def test_encode_decode_embedding(mode):
+    embedding = normalized(1)[0]
+    data, scale = encode_embedding(embedding, mode)
+
+    assert (scale is None) == (mode == "float16")
+    assert len(data) == embedding.size * (1 if mode == "int8" else 2)
+    np.testing.assert_allclose(decode_embedding(data, scale), embedding, atol=0.01)
+    # Snowflake returns NULL scales as NaN
+    if mode == "float16":
+        np.testing.assert_allclose(decode_embedding(data, float("nan")), embedding, atol=1e-3)
+    assert decode_embedding(None) is None and decode_embedding(b"") is None
+
+
+def test_measure_recall_is_perfect_for_exact_codes():
+    matrix = normalized(300)
+
+    assert measure_recall(matrix, matrix, None, k=10, n_queries=20) == 1.0
+
+
+def test_measure_recall_detects_lossy_codes_and_rescoring_recovers_them():
+    matrix = normalized(2000, dim=32)
+    # Coarse codes: only the sign of each value
+    codes = np.sign(matrix).astype(np.int8)
+    scales = np.ones(len(matrix), dtype=np.float32)
+
+    raw = measure_recall(matrix, codes, scales, k=10, n_queries=30)
+    rescored = measure_recall(matrix, codes, scales, k=10, n_queries=30, rescore_multiplier=8)
+    assert raw < 0.9
+    assert rescored > raw
+
+
+def test_measure_recall_rescores_against_the_stored_matrix():
+    matrix = normalized(2000, dim=32)
+    codes, scales = quantize(matrix, "int8")
+    # Re-scoring against unrelated vectors cannot recover the exact neighbours
+    noise = normalized(2000, dim=32, seed=5)
+
+    exact = measure_recall(matrix, codes, scales, k=10, n_queries=30, rescore_multiplier=4)
+    wrong = measure_recall(matrix, codes, scales, k=10, n_queries=30, rescore_multiplier=4,
+                           rescore_matrix=noise)
+    assert exact > 0.95
+    assert wrong < exact
+
+
+def test_measure_recall_handles_empty_matrix():
+    empty = np.zeros((0, 8), dtype=np.float32)
+
+    assert measure_recall(empty, empty, None) == 1.0
@@ -0,0 +1,144 @@
+"""
+Tests for the search result cache and index-generation stamps
+
+Run from the repository root:
+    python -m pytest local_tools/document_indexer/tests
+"""
+
+import sys
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+# The indexer modules import each other as top-level modules
+sys.path.insert(0, str(Path(__file__).parents[1]))
+
+import dual_table_search
+import search_cache
+from bm25_index import InvertedBM25Index
+from dual_table_search import DualTableHybridSearcher
+from search_cache import SearchResultCache, bump_index_generation, read_index_generation
+
+RESULTS = [{'chunk_id': 'c1', 'score': 0.9}, {'chunk_id': 'c2', 'score': 0.4}]
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(search_cache.time, 'monotonic', lambda: now[0])
+    return now
+
+
+def test_keys_ignore_case_and_whitespace_but_not_parameters():
+    key = SearchResultCache.key_for('hybrid', '  Daily   Orders ', 10, 'metrics')
+
+    assert key == SearchResultCache.key_for('hybrid', 'daily orders', 10, 'metrics')
+    assert key != SearchResultCache.key_for('hybrid', 'daily orders', 10, None)
+    assert key != SearchResultCache.key_for('semantic', 'daily orders', 10, 'metrics')
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = SearchResultCache(max_size=10, ttl_seconds=60)
+    key = SearchResultCache.key_for('hybrid', 'orders', 10)
+    cache.put(key, RESULTS)
+
+    clock[0] += 59
+    assert cache.get(key) == RESULTS
+    clock[0] += 2
+    assert cache.get(key) is None
+    assert cache.stats() == {'entries': 0, 'hits': 1, 'misses': 1}
+
+
+def test_cached_results_are_copies(clock):
+    cache = SearchResultCache(max_size=10, ttl_seconds=60)
+    key = SearchResultCache.key_for('hybrid', 'orders', 10)
+    results = [dict(result) for result in RESULTS]
+    cache.put(key, results)
+
+    results[0]['score'] = 0.0
+    cache.get(key)[1]['score'] = 0.0
+
+    assert cache.get(key) == RESULTS
+
+
+def test_least_recently_used_entry_is_evicted(clock):
+    cache = SearchResultCache(max_size=2, ttl_seconds=60)
+    keys = [SearchResultCache.key_for('hybrid', query, 10) for query in ('a', 'b', 'c')]
+    cache.put(keys[0], RESULTS)
+    cache.put(keys[1], RESULTS)
+    cache.get(keys[0])
+    cache.put(keys[2], RESULTS)
+
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[0]) == RESULTS
+    assert cache.get(keys[2]) == RESULTS
+
+
+@pytest.mark.parametrize('max_size,ttl_seconds', [(0, 60), (10, 0)])
+def test_disabled_cache_stores_nothing(clock, max_size, ttl_seconds):
+    cache = SearchResultCache(max_size=max_size, ttl_seconds=ttl_seconds)
+    key = SearchResultCache.key_for('hybrid', 'orders', 10)
+    cache.put(key, RESULTS)
+
+    assert cache.get(key) is None
+
+
+def test_generation_stamp_changes_on_every_bump(tmp_path):
+    assert read_index_generation(tmp_path) is None
+
+    first = bump_index_generation(tmp_path)
+    assert read_index_generation(tmp_path) == first
+
+    second = bump_index_generation(tmp_path)
+    assert second != first
+    assert read_index_generation(tmp_path) == second
+
+
+class DocumentTableHook:
+    """Stand-in hook answering the searcher's document table generation query"""
+
+    def __init__(self):
+        self.documents = 10
+        self.queries = 0
+
+    def query_snowflake(self, query, method='pandas'):
+        self.queries += 1
+        return pd.DataFrame({'DOCUMENTS': [self.documents], 'PROCESSED_AT': ['2026-10-01 00:00:00']})
+
+
+@pytest.fixture
+def searcher(tmp_path, monkeypatch):
+    monkeypatch.setattr(dual_table_search, 'INDEX_GENERATION_CHECK_SECONDS', 0)
+    # Without snowflake-connector installed the searcher would not use any hook
+    monkeypatch.setattr(dual_table_search, 'SnowflakeHook', DocumentTableHook)
+    searcher = DualTableHybridSearcher(local_index_dir=tmp_path,
+                                       result_cache=SearchResultCache(max_size=10, ttl_seconds=600))
+    searcher.hook = DocumentTableHook()
+    return searcher
+
+
+def test_local_upload_drops_cached_results_and_reloads_indexes(tmp_path, searcher):
+    key = SearchResultCache.key_for('hybrid', 'orders', 10)
+    searcher._cache_results(key, RESULTS)
+    assert searcher._cached_results(key) == RESULTS
+    assert searcher.bm25_index is None
+
+    assert InvertedBM25Index(tmp_path).build(['c1'], [['orders']], ['metrics'], ['growth'], ['doc'])
+    bump_index_generation(tmp_path)
+
+    assert searcher._cached_results(key) is None
+    assert searcher.bm25_index is not None and searcher.bm25_index.chunk_ids == ['c1']
+
+
+def test_remote_upload_drops_cached_results(searcher):
+    key = SearchResultCache.key_for('hybrid', 'orders', 10)
+    searcher._cache_results(key, RESULTS)
+
+    # The first look at the document table is not a change
+    assert searcher._cached_results(key) == RESULTS
+    assert searcher._cached_results(key) == RESULTS
+
+    searcher.hook.documents += 1
+    assert searcher._cached_results(key) is None
+    assert searcher.hook.queries == 3
@@ -0,0 +1,130 @@
+"""
+Tests for the Snowflake query result cache (utils/snowflake_result_cache.py)
+
+Run from the repository root:
+    python -m pytest local_tools/document_indexer/tests
+"""
+
+import sys
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+# utils lives at the repository root
+sys.path.insert(0, str(Path(__file__).parents[3]))
+
+from utils import snowflake_result_cache
+from utils.snowflake_result_cache import DEFAULT_TABLE_TTLS, SnowflakeResultCache, has_unresolved_tables, normalize_sql
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return SnowflakeResultCache(cache_dir=tmp_path, table_ttls=DEFAULT_TABLE_TTLS)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(snowflake_result_cache.time, 'time', lambda: now[0])
+    return now
+
+
+PARAMS = {'account': 'acct', 'user': 'analyst', 'role': 'reader', 'database': 'proddb', 'schema': 'public'}
+QUERY = "SELECT table_name, column_name FROM tyleranderson.sf_columns WHERE table_name = 'ORDERS'"
+RESULT = pd.DataFrame({'TABLE_NAME': ['ORDERS', 'ORDERS'], 'COLUMN_NAME': ['ID', 'TOTAL']})
+
+
+def test_ttl_is_shortest_table_ttl(cache):
+    query = """
+        SELECT c.column_name, u.query_count
+        FROM tyleranderson.sf_columns c
+        JOIN tyleranderson.sf_column_usage u ON c.column_name = u.column_name
+    """
+    assert cache.ttl_for(query) == DEFAULT_TABLE_TTLS["tyleranderson.sf_column_usage"]
+
+
+@pytest.mark.parametrize("query", [
+    "SELECT * FROM tyleranderson.sf_columns c, proddb.public.orders o",
+    "SELECT * FROM tyleranderson.sf_columns c JOIN tyleranderson.sf_tables_full t ON c.t = t.t, proddb.public.orders",
+    "SELECT * FROM (SELECT * FROM tyleranderson.sf_columns) c, proddb.public.orders o",
+    "SELECT * FROM tyleranderson.sf_columns c, LATERAL FLATTEN(input => c.tags)",
+    "SELECT * FROM IDENTIFIER('proddb.public.orders')",
+    "SELECT * FROM tyleranderson.sf_columns; DROP TABLE tyleranderson.sf_columns",
+])
+def test_unresolvable_queries_are_not_cached(cache, query):
+    assert cache.ttl_for(query) == 0
+
+
+def test_commas_outside_the_from_clause_are_not_joins(cache):
+    query = """
+        WITH cols AS (SELECT table_name, column_name FROM tyleranderson.sf_columns WHERE x IN (1, 2))
+        SELECT table_name, COUNT(*) FROM cols GROUP BY table_name, column_name ORDER BY 1, 2
+    """
+    assert not has_unresolved_tables(normalize_sql(query))
+    assert cache.ttl_for(query) == DEFAULT_TABLE_TTLS["tyleranderson.sf_columns"]
+
+
+def test_explicit_ttl_still_applies_to_read_only_queries(cache):
+    assert cache.ttl_for("SELECT * FROM a, b", ttl=60) == 60
+    assert cache.ttl_for("DELETE FROM tyleranderson.sf_columns", ttl=60) == 0
+
+
+def test_results_round_trip_until_they_expire(cache, clock):
+    assert cache.put(QUERY, PARAMS, RESULT, ttl=60)
+
+    # Formatting and keyword case do not change the key
+    reformatted = "select table_name,  column_name\nFROM tyleranderson.sf_columns -- lookup\nWHERE table_name = 'ORDERS';"
+    pd.testing.assert_frame_equal(cache.get(reformatted, PARAMS), RESULT)
+
+    clock[0] += 61
+    assert cache.get(QUERY, PARAMS) is None
+    stats = cache.stats()
+    assert (stats['hits'], stats['expired'], stats['entries']) == (1, 1, 0)
+
+
+def test_entries_are_scoped_to_the_connection_context(cache, clock):
+    cache.put(QUERY, PARAMS, RESULT, ttl=60)
+
+    assert cache.get(QUERY, dict(PARAMS, role='admin')) is None
+    # The warehouse does not affect results
+    assert cache.get(QUERY, dict(PARAMS, warehouse='large_wh')) is not None
+    # Quoted literals keep their case
+    assert cache.get(QUERY.replace("'ORDERS'", "'orders'"), PARAMS) is None
+
+
+def test_invalidate_and_clear(cache, clock):
+    other = "SELECT * FROM tyleranderson.sf_tables_full"
+    cache.put(QUERY, PARAMS, RESULT, ttl=60)
+    cache.put(other, PARAMS, RESULT, ttl=60)
+
+    cache.invalidate(QUERY, PARAMS)
+    assert cache.get(QUERY, PARAMS) is None
+    assert cache.get(other, PARAMS) is not None
+
+    cache.clear()
+    assert cache.stats()['entries'] == 0
+
+
+def test_zero_ttl_is_not_stored(cache, clock):
+    assert not cache.put(QUERY, PARAMS, RESULT, ttl=0)
+    assert cache.get(QUERY, PARAMS) is None
+
+
+def test_least_recently_used_results_are_pruned(tmp_path, clock):
+    cache = SnowflakeResultCache(cache_dir=tmp_path, max_bytes=10 ** 9)
+    queries = [f"SELECT * FROM tyleranderson.sf_columns WHERE id = {i}" for i in range(3)]
+    for i, query in enumerate(queries[:2]):
+        cache.put(query, PARAMS, RESULT, ttl=60)
+        # File times order the entries; keep them apart on coarse-grained filesystems
+        path = cache._path(cache.key_for(query, PARAMS))
+        snowflake_result_cache.os.utime(path, (i, i))
+    cache.get(queries[0], PARAMS)
+
+    # Room for two of the three results
+    cache.max_bytes = cache.stats()['bytes'] * 5 // 4
+    cache.put(queries[2], PARAMS, RESULT, ttl=60)
+
+    assert cache.get(queries[1], PARAMS) is None
+    assert cache.get(queries[0], PARAMS) is not None
+    assert cache.get(queries[2], PARAMS) is not None
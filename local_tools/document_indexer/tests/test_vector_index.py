@@ -0,0 +1,137 @@
+"""
+Tests for the local vector index and its IVF ANN indexes
+
+Run from the repository root:
+    python -m pytest local_tools/document_indexer/tests
+"""
+
+import json
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+# The indexer modules import each other as top-level modules
+sys.path.insert(0, str(Path(__file__).parents[1]))
+
+import vector_index
+from ann_index import IVFIndex
+from vector_index import BUILDS_DIR, LocalVectorIndex
+
+
+def corpus(n_rows=400, dim=16, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(8, dim))
+    embeddings = centers[rng.integers(0, 8, n_rows)] + 0.3 * rng.normal(size=(n_rows, dim))
+    chunk_ids = [f"c{i}" for i in range(n_rows)]
+    categories = [f"cat{i % 3}" for i in range(n_rows)]
+    subcategories = [f"team{i % 2}" for i in range(n_rows)]
+    document_ids = [f"d{i // 4}" for i in range(n_rows)]
+    return chunk_ids, embeddings.astype(np.float32), categories, subcategories, document_ids
+
+
+@pytest.fixture
+def small_shards(monkeypatch):
+    # Every category gets its own IVF shard
+    monkeypatch.setattr(vector_index, 'ANN_SHARD_MIN_ROWS', 10)
+
+
+@pytest.mark.parametrize("quantization", ["none", "float16", "int8"])
+def test_build_and_search_finds_the_query_row(tmp_path, small_shards, quantization):
+    chunk_ids, embeddings, categories, subcategories, document_ids = corpus()
+    index = LocalVectorIndex(tmp_path)
+    assert index.build(chunk_ids, embeddings, categories, subcategories, document_ids, quantization=quantization)
+
+    assert index.ann_index is not None and len(index.ann_shards) == 3
+    assert (index.codes is not None) == (quantization == "int8")
+    for row in (0, 17, 123):
+        hits = index.search(embeddings[row], 5)
+        assert next(iter(hits)) == chunk_ids[row]
+        assert index.score(embeddings[row], [chunk_ids[row]])[chunk_ids[row]] == pytest.approx(1.0, abs=1e-2)
+
+
+def test_shard_search_matches_mask_filtered_search(tmp_path, small_shards):
+    chunk_ids, embeddings, categories, subcategories, document_ids = corpus()
+    index = LocalVectorIndex(tmp_path)
+    index.build(chunk_ids, embeddings, categories, subcategories, document_ids, build_ann=False)
+    query = embeddings[5]
+
+    for category, subcategory in (("cat1", None), ("cat2", "team1")):
+        sharded = index.search(query, 10, category=category, subcategory=subcategory)
+        # Same filter through a row mask over the unclustered view
+        shard_map, index.shard_map = index.shard_map, None
+        masked = index.search(query, 10, category=category, subcategory=subcategory)
+        index.shard_map = shard_map
+
+        assert list(sharded) == list(masked)
+        row = {chunk_id: i for i, chunk_id in enumerate(chunk_ids)}
+        assert all(categories[row[chunk_id]] == category for chunk_id in sharded)
+
+
+def test_update_replaces_documents_and_shrinks(tmp_path, small_shards):
+    chunk_ids, embeddings, categories, subcategories, document_ids = corpus()
+    index = LocalVectorIndex(tmp_path)
+    index.build(chunk_ids, embeddings, categories, subcategories, document_ids)
+    first_build = index.build_id
+
+    removed = {f"d{i}" for i in range(50)}
+    assert index.update(sorted(removed), ["new"], [embeddings[0]], ["cat0"], ["team0"], ["d-new"])
+
+    assert index.build_id != first_build
+    assert len(index.chunk_ids) == 400 - 200 + 1
+    assert not removed.intersection(index.document_ids)
+    assert next(iter(index.search(embeddings[0], 1, category="cat0"))) == "new"
+    # Earlier builds are removed once the id map points at the new one
+    assert [path.name for path in (tmp_path / BUILDS_DIR).iterdir()] == [index.build_id]
+
+
+def test_index_loaded_before_a_rebuild_keeps_working(tmp_path):
+    chunk_ids, embeddings, categories, subcategories, document_ids = corpus()
+    LocalVectorIndex(tmp_path).build(chunk_ids, embeddings, categories, subcategories, document_ids)
+    running = LocalVectorIndex(tmp_path)
+    assert running.load()
+
+    LocalVectorIndex(tmp_path).build(chunk_ids[:100], embeddings[:100], categories[:100],
+                                     subcategories[:100], document_ids[:100])
+
+    assert len(running.search(embeddings[300], 5)) == 5
+    reloaded = LocalVectorIndex(tmp_path)
+    assert reloaded.load() and len(reloaded.chunk_ids) == 100
+
+
+def test_failed_ivf_build_leaves_a_consistent_exact_index(tmp_path, monkeypatch):
+    chunk_ids, embeddings, categories, subcategories, document_ids = corpus()
+    LocalVectorIndex(tmp_path).build(chunk_ids, embeddings, categories, subcategories, document_ids)
+
+    monkeypatch.setattr(IVFIndex, 'build', lambda self, *args, **kwargs: False)
+    index = LocalVectorIndex(tmp_path)
+    assert index.build(chunk_ids[:50], embeddings[:50], categories[:50], subcategories[:50], document_ids[:50])
+
+    assert index.ann_index is None
+    assert set(index.search(embeddings[3], 5)) <= set(chunk_ids[:50])
+
+
+def test_ivf_from_another_build_is_rejected(tmp_path):
+    chunk_ids, embeddings, categories, subcategories, document_ids = corpus()
+    index = LocalVectorIndex(tmp_path)
+    index.build(chunk_ids, embeddings, categories, subcategories, document_ids)
+
+    ivf = IVFIndex(index.data_dir)
+    assert ivf.load(build_id=index.build_id, n_rows=400)
+    assert not IVFIndex(index.data_dir).load(build_id="other")
+    assert not IVFIndex(index.data_dir).load(n_rows=399)
+
+
+def test_legacy_layout_rejects_ivf_with_another_row_count(tmp_path):
+    chunk_ids, embeddings, *_ = corpus(n_rows=100)
+    matrix = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+    np.save(tmp_path / "chunk_embeddings.npy", matrix)
+    with open(tmp_path / "chunk_ids.json", 'w', encoding='utf-8') as f:
+        json.dump({'dim': 16, 'chunk_ids': chunk_ids}, f)
+    IVFIndex(tmp_path).build(matrix[:60])
+
+    index = LocalVectorIndex(tmp_path)
+    assert index.load()
+    assert index.build_id is None and index.ann_index is None
+    assert next(iter(index.search(embeddings[80], 1))) == "c80"
@@ -0,0 +1,496 @@
+"""
+Local memory-mapped vector index for chunk embeddings
+
+Stores all chunk embeddings as a single matrix on disk (``.npy``; float16 unless
+quantization is disabled) plus a chunk_id -> row map, so semantic scoring is one
+matrix-vector product instead of parsing JSON embeddings returned from Snowflake on
+every query.
+
+Each build writes its matrix, scan copy and ANN indexes to ``builds/<build_id>/`` and
+only then swaps in the id map naming that build, so a loader never pairs files from
+different builds.
+
+Rows are clustered by category and team (see ``index_shards``); large categories
+get their own IVF shard, so a filtered search only touches its category's rows.
+
+With int8 quantization (opt-in, see ``quantization``) a copy of int8 codes with
+per-row scales is scanned to pick a shortlist, and only the shortlist rows of the
+float16 matrix are paged in for re-scoring.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import uuid
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+try:
+    from .ann_index import IVFIndex, INDEX_FILES as IVF_FILES
+    from .index_shards import ShardMap, cluster_order
+    from .quantization import quantize, quantized_scores, measure_recall
+    from .config import (LOCAL_INDEX_DIR, ANN_NPROBE, ANN_SHARD_MIN_ROWS,
+                         EMBEDDING_QUANTIZATION, QUANTIZED_RESCORE_MULTIPLIER)
+except ImportError:
+    from ann_index import IVFIndex, INDEX_FILES as IVF_FILES
+    from index_shards import ShardMap, cluster_order
+    from quantization import quantize, quantized_scores, measure_recall
+    from config import (LOCAL_INDEX_DIR, ANN_NPROBE, ANN_SHARD_MIN_ROWS,
+                        EMBEDDING_QUANTIZATION, QUANTIZED_RESCORE_MULTIPLIER)
+
+
+EMBEDDINGS_FILE = "chunk_embeddings.npy"
+ID_MAP_FILE = "chunk_ids.json"
+ANN_SHARDS_DIR = "ann_shards"
+QUANTIZED_FILE = "chunk_embeddings_q.npy"
+SCALES_FILE = "chunk_embedding_scales.npy"
+BUILDS_DIR = "builds"
+
+
+class LocalVectorIndex:
+    """Memory-mapped embedding matrix keyed by chunk_id"""
+
+    def __init__(self, index_dir: Optional[Path] = None):
+        self.index_dir = Path(index_dir or LOCAL_INDEX_DIR)
+        self.embeddings: Optional[np.ndarray] = None
+        self.chunk_ids: List[str] = []
+        self.id_to_row: Dict[str, int] = {}
+        self.categories: List[Optional[str]] = []
+        self.subcategories: List[Optional[str]] = []
+        self.document_ids: List[Optional[str]] = []
+        self.ann_index: Optional[IVFIndex] = None
+        self.shard_map: Optional[ShardMap] = None
+        self.ann_shards: Dict[str, IVFIndex] = {}
+        self.codes: Optional[np.ndarray] = None
+        self.scales: Optional[np.ndarray] = None
+        self.build_id: Optional[str] = None
+
+    @property
+    def is_loaded(self) -> bool:
+        return self.embeddings is not None
+
+    @property
+    def data_dir(self) -> Path:
+        """Directory of the loaded build (the index directory itself for indexes written before builds)"""
+        return self.index_dir / BUILDS_DIR / self.build_id if self.build_id else self.index_dir
+
+    @property
+    def embeddings_path(self) -> Path:
+        return self.data_dir / EMBEDDINGS_FILE
+
+    @property
+    def id_map_path(self) -> Path:
+        return self.index_dir / ID_MAP_FILE
+
+    def build(self, chunk_ids: Sequence[str], embeddings: Sequence[Sequence[float]],
+              categories: Optional[Sequence[Optional[str]]] = None,
+              subcategories: Optional[Sequence[Optional[str]]] = None,
+              document_ids: Optional[Sequence[Optional[str]]] = None,
+              build_ann: bool = True, quantization: str = EMBEDDING_QUANTIZATION) -> bool:
+        """
+        Write the embedding matrix and id map to disk
+
+        Args:
+            chunk_ids: Chunk IDs (same IDs as the CHUNK_ID column in Snowflake)
+            embeddings: One embedding per chunk ID, in the same order
+            categories: Optional document category per chunk (for filtered ANN search)
+            subcategories: Optional document subcategory per chunk
+            document_ids: Optional document ID per chunk (required for incremental updates)
+            build_ann: Whether to also train the IVF ANN index (and per-category shards)
+            quantization: "float16" (half-precision matrix), "int8" (float16 matrix plus an
+                int8 scan copy) or "none" (float32 matrix)
+
+        Returns:
+            True if the index was written successfully, False otherwise
+        """
+        if not chunk_ids:
+            print("No embeddings to index")
+            return False
+
+        if len(chunk_ids) != len(embeddings):
+            print(f"Chunk id / embedding count mismatch: {len(chunk_ids)} vs {len(embeddings)}")
+            return False
+
+        build_dir = None
+        try:
+            self.index_dir.mkdir(parents=True, exist_ok=True)
+
+            n_rows = len(chunk_ids)
+            categories = list(categories) if categories is not None else [None] * n_rows
+            subcategories = list(subcategories) if subcategories is not None else [None] * n_rows
+            document_ids = list(document_ids) if document_ids is not None else [None] * n_rows
+
+            # Cluster rows by category/team so each shard is a contiguous slice of the matrix
+            order = cluster_order(categories, subcategories, document_ids)
+            chunk_ids = [chunk_ids[row] for row in order]
+            categories = [categories[row] for row in order]
+            subcategories = [subcategories[row] for row in order]
+            document_ids = [document_ids[row] for row in order]
+            shard_map = ShardMap.from_rows(categories, subcategories)
+
+            matrix = np.asarray(embeddings, dtype=np.float32).reshape(n_rows, -1)[order]
+
+            # Normalize rows so scoring is a plain dot product
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            matrix = matrix / norms
+
+            # Everything but the id map goes into a fresh build directory; swapping the id map
+            # switches loaders to the complete build at once
+            build_id = uuid.uuid4().hex
+            build_dir = self.index_dir / BUILDS_DIR / build_id
+            build_dir.mkdir(parents=True)
+
+            stored = matrix.astype(np.float16) if quantization in ("float16", "int8") else matrix
+            np.save(build_dir / EMBEDDINGS_FILE, stored)
+            quantization_stats = self._write_quantized(build_dir, matrix, stored, quantization)
+            ann_shards = self._build_ann_shards(build_dir, matrix, shard_map, build_id) if build_ann else {}
+            ann = bool(build_ann and IVFIndex(build_dir).build(matrix, build_id=build_id))
+
+            tmp_id_map = self.id_map_path.with_suffix('.tmp.json')
+            with open(tmp_id_map, 'w', encoding='utf-8') as f:
+                json.dump({
+                    'build_id': build_id,
+                    'n_rows': n_rows,
+                    'dim': int(matrix.shape[1]),
+                    'chunk_ids': chunk_ids,
+                    'categories': categories,
+                    'subcategories': subcategories,
+                    'document_ids': document_ids,
+                    'shards': shard_map.runs,
+                    'ann': ann,
+                    'ann_shards': ann_shards,
+                    'quantization': quantization_stats,
+                }, f)
+            os.replace(tmp_id_map, self.id_map_path)
+            self._remove_stale_builds(build_id)
+
+            print(f"Wrote local vector index ({matrix.shape[0]} x {matrix.shape[1]}) to {build_dir}")
+            return self.load()
+
+        except Exception as e:
+            print(f"Error building local vector index: {e}")
+            if build_dir is not None and build_dir.name != self._current_build_id():
+                shutil.rmtree(build_dir, ignore_errors=True)
+            return False
+
+    def _write_quantized(self, build_dir: Path, matrix: np.ndarray, stored: np.ndarray,
+                         quantization: str) -> Optional[Dict]:
+        """
+        Write the int8 scan copy (int8 mode only) and report storage and recall against float32
+
+        Args:
+            build_dir: Directory of the build being written
+            matrix: Normalized float32 matrix (the reference for recall)
+            stored: Matrix as written for search (float16 unless quantization is "none")
+            quantization: "float16", "int8" or "none"
+
+        Returns:
+            Quantization stats for the id map, or None when quantization is disabled
+        """
+        if quantization == "none":
+            return None
+
+        if quantization == "int8":
+            codes, scales = quantize(matrix, quantization)
+            np.save(build_dir / QUANTIZED_FILE, codes)
+            np.save(build_dir / SCALES_FILE, scales)
+            scan_bytes = codes.nbytes + scales.nbytes
+            raw_recall = measure_recall(matrix, codes, scales)
+            recall = measure_recall(matrix, codes, scales, rescore_multiplier=QUANTIZED_RESCORE_MULTIPLIER,
+                                    rescore_matrix=stored)
+        else:
+            scan_bytes = stored.nbytes
+            raw_recall = recall = measure_recall(matrix, stored, None)
+
+        stored_bytes = stored.nbytes + (scan_bytes if quantization == "int8" else 0)
+        stats = {
+            'mode': quantization,
+            'stored_bytes': int(stored_bytes),
+            'scan_bytes': int(scan_bytes),
+            'float32_bytes': int(matrix.nbytes),
+            'compression': round(matrix.nbytes / stored_bytes, 2),
+            'scan_compression': round(matrix.nbytes / scan_bytes, 2),
+            'raw_recall_at_10': round(raw_recall, 4),
+            'recall_at_10': round(recall, 4),
+        }
+        print(f"Embedding storage ({quantization}): {stored_bytes / 1e6:.1f} MB on disk, {scan_bytes / 1e6:.1f} MB "
+              f"scanned per query vs {matrix.nbytes / 1e6:.1f} MB float32 ({stats['compression']}x / "
+              f"{stats['scan_compression']}x), recall@10 vs float32 {stats['recall_at_10']:.3f}"
+              + (f" ({stats['raw_recall_at_10']:.3f} before re-scoring)" if quantization == "int8" else ""))
+        return stats
+
+    def _build_ann_shards(self, build_dir: Path, matrix: np.ndarray, shard_map: ShardMap,
+                          build_id: str) -> Dict[str, str]:
+        """
+        Train one IVF index per large category shard (small shards are scanned exactly)
+
+        Returns:
+            Dictionary mapping category -> shard directory name
+        """
+        ann_shards = {}
+        for category, (start, end) in shard_map.category_ranges.items():
+            if not category or end - start < ANN_SHARD_MIN_ROWS:
+                continue
+            name = hashlib.sha256(category.encode('utf-8')).hexdigest()[:16]
+            if IVFIndex(build_dir / ANN_SHARDS_DIR / name).build(matrix[start:end], row_offset=start,
+                                                                 build_id=build_id):
+                ann_shards[category] = name
+        return ann_shards
+
+    def _current_build_id(self) -> Optional[str]:
+        """Build named by the id map on disk"""
+        try:
+            with open(self.id_map_path, 'r', encoding='utf-8') as f:
+                return json.load(f).get('build_id')
+        except (OSError, ValueError):
+            return None
+
+    def _remove_stale_builds(self, build_id: str):
+        """Delete earlier builds and files of the pre-build layout (open memory maps stay valid)"""
+        builds_dir = self.index_dir / BUILDS_DIR
+        for path in builds_dir.iterdir():
+            if path.name != build_id:
+                shutil.rmtree(path, ignore_errors=True)
+        for name in (EMBEDDINGS_FILE, QUANTIZED_FILE, SCALES_FILE) + IVF_FILES:
+            (self.index_dir / name).unlink(missing_ok=True)
+        shutil.rmtree(self.index_dir / ANN_SHARDS_DIR, ignore_errors=True)
+
+    def update(self, remove_document_ids: Sequence[str], chunk_ids: Sequence[str],
+               embeddings: Sequence[Sequence[float]], categories: Sequence[Optional[str]],
+               subcategories: Sequence[Optional[str]], document_ids: Sequence[str]) -> bool:
+        """
+        Incrementally replace documents in an existing index
+
+        Rows belonging to ``remove_document_ids`` are dropped, the new chunks are
+        appended, and the matrix (and ANN index) is rewritten.
+
+        Args:
+            remove_document_ids: Documents that were changed or deleted
+            chunk_ids: New chunk IDs to add
+            embeddings: One embedding per new chunk ID
+            categories: Document category per new chunk
+            subcategories: Document subcategory per new chunk
+            document_ids: Document ID per new chunk
+
+        Returns:
+            True if the index was updated, False if it must be rebuilt from scratch
+        """
+        if not self.is_loaded and not self.load():
+            print("No existing local vector index to update")
+            return False
+
+        if any(document_id is None for document_id in self.document_ids):
+            print("Existing local vector index has no document ids, a full rebuild is required")
+            return False
+
+        removed = set(remove_document_ids)
+        keep = [row for row, document_id in enumerate(self.document_ids) if document_id not in removed]
+        kept_embeddings = np.asarray(self.embeddings[keep], dtype=np.float32)
+        new_embeddings = np.asarray(embeddings, dtype=np.float32).reshape(len(chunk_ids), kept_embeddings.shape[1])
+
+        return self.build(
+            [self.chunk_ids[row] for row in keep] + list(chunk_ids),
+            np.vstack([kept_embeddings, new_embeddings]),
+            categories=[self.categories[row] for row in keep] + list(categories),
+            subcategories=[self.subcategories[row] for row in keep] + list(subcategories),
+            document_ids=[self.document_ids[row] for row in keep] + list(document_ids),
+        )
+
+    def load(self) -> bool:
+        """
+        Memory-map the embedding matrix and load the id map
+
+        Returns:
+            True if the index is available, False otherwise
+        """
+        if not self.id_map_path.exists():
+            return False
+
+        try:
+            with open(self.id_map_path, 'r', encoding='utf-8') as f:
+                id_map = json.load(f)
+
+            # Indexes written before builds keep their files in the index directory
+            build_id = id_map.get('build_id')
+            data_dir = self.index_dir / BUILDS_DIR / build_id if build_id else self.index_dir
+            embeddings = np.load(data_dir / EMBEDDINGS_FILE, mmap_mode='r')
+            chunk_ids = id_map.get('chunk_ids', [])
+
+            if embeddings.shape[0] != len(chunk_ids) or id_map.get('n_rows', len(chunk_ids)) != len(chunk_ids):
+                print(f"Local vector index is inconsistent: {embeddings.shape[0]} rows vs {len(chunk_ids)} ids")
+                return False
+
+            # Indexes written before sharding are not clustered and fall back to row masks
+            shard_map = ShardMap(id_map['shards']) if 'shards' in id_map else None
+            ann_shards = {}
+            for category, name in (id_map.get('ann_shards') or {}).items():
+                shard_index = IVFIndex(data_dir / ANN_SHARDS_DIR / name)
+                row_range = shard_map.category_ranges.get(category) if shard_map else None
+                shard_rows = row_range[1] - row_range[0] if row_range else None
+                if shard_index.load(build_id=build_id, n_rows=shard_rows):
+                    ann_shards[category] = shard_index
+
+            # Only int8 indexes have a separate scan copy; the others scan the matrix itself
+            codes, scales = None, None
+            quantized_path, scales_path = data_dir / QUANTIZED_FILE, data_dir / SCALES_FILE
+            if (id_map.get('quantization') or {}).get('mode') == 'int8' and quantized_path.exists():
+                codes = np.load(quantized_path, mmap_mode='r')
+                scales = np.load(scales_path) if scales_path.exists() else None
+                if codes.shape != embeddings.shape or (scales is not None and len(scales) != len(chunk_ids)):
+                    print("Ignoring quantized scan copy: it does not match the embedding matrix")
+                    codes, scales = None, None
+
+            ann_index = IVFIndex(data_dir)
+            if not id_map.get('ann', True) or not ann_index.load(build_id=build_id, n_rows=len(chunk_ids)):
+                ann_index = None
+
+            self.build_id = build_id
+            self.embeddings = embeddings
+            self.chunk_ids = chunk_ids
+            self.id_to_row = {chunk_id: row for row, chunk_id in enumerate(chunk_ids)}
+            self.categories = id_map.get('categories') or [None] * len(chunk_ids)
+            self.subcategories = id_map.get('subcategories') or [None] * len(chunk_ids)
+            self.document_ids = id_map.get('document_ids') or [None] * len(chunk_ids)
+            self.shard_map = shard_map
+            self.ann_shards = ann_shards
+            self.codes, self.scales = codes, scales
+            self.ann_index = ann_index
+            return True
+
+        except Exception as e:
+            print(f"Error loading local vector index: {e}")
+            return False
+
+    def score(self, query_embedding: np.ndarray, chunk_ids: Optional[Sequence[str]] = None) -> Dict[str, float]:
+        """
+        Cosine similarity between the query and indexed chunks
+
+        Args:
+            query_embedding: Query embedding vector
+            chunk_ids: Optional subset of chunk IDs to score (default: all chunks).
+                IDs missing from the index are omitted from the result.
+
+        Returns:
+            Dictionary mapping chunk_id -> cosine similarity
+        """
+        if not self.is_loaded:
+            return {}
+
+        query_vec = np.asarray(query_embedding, dtype=np.float32)
+        query_norm = np.linalg.norm(query_vec)
+        if query_norm == 0:
+            return {}
+        query_vec = query_vec / query_norm
+
+        if chunk_ids is None:
+            ids = self.chunk_ids
+            similarities = quantized_scores(self.embeddings, None, query_vec)
+        else:
+            ids = [chunk_id for chunk_id in chunk_ids if chunk_id in self.id_to_row]
+            if not ids:
+                return {}
+            rows = np.fromiter((self.id_to_row[chunk_id] for chunk_id in ids), dtype=np.int64, count=len(ids))
+            similarities = np.asarray(self.embeddings[rows], dtype=np.float32) @ query_vec
+
+        return dict(zip(ids, similarities.tolist()))
+
+    def row_mask(self, category: Optional[str] = None, subcategory: Optional[str] = None) -> Optional[np.ndarray]:
+        """Boolean mask of rows matching the category/subcategory filter (None if unfiltered)"""
+        if not category and not subcategory:
+            return None
+
+        mask = np.ones(len(self.chunk_ids), dtype=bool)
+        if category:
+            mask &= np.array([value == category for value in self.categories], dtype=bool)
+        if subcategory:
+            mask &= np.array([value == subcategory for value in self.subcategories], dtype=bool)
+        return mask
+
+    def search(self, query_embedding: np.ndarray, k: int, category: Optional[str] = None,
+               subcategory: Optional[str] = None, nprobe: int = ANN_NPROBE) -> Dict[str, float]:
+        """
+        Nearest chunks to the query, independent of keyword matching
+
+        Uses the IVF ANN index when available, otherwise an exact scan of the matrix.
+
+        Args:
+            query_embedding: Query embedding vector
+            k: Number of candidates to return
+            category: Optional category filter
+            subcategory: Optional subcategory filter (team)
+            nprobe: Inverted lists to scan when using the ANN index
+
+        Returns:
+            Dictionary mapping chunk_id -> cosine similarity, best first
+        """
+        if not self.is_loaded or k <= 0:
+            return {}
+
+        row_range = self.shard_map.row_range(category, subcategory) if self.shard_map else None
+        if row_range is not None:
+            return self._search_shard(query_embedding, k, category, row_range, nprobe)
+
+        query_vec = np.asarray(query_embedding, dtype=np.float32)
+        query_norm = np.linalg.norm(query_vec)
+        if query_norm == 0:
+            return {}
+        query_vec = query_vec / query_norm
+
+        mask = self.row_mask(category, subcategory)
+
+        if self.ann_index is not None:
+            rows = self.ann_index.candidate_rows(query_vec, k, nprobe=nprobe, row_mask=mask)
+        else:
+            rows = np.flatnonzero(mask) if mask is not None else None
+        return self._top_rows(query_vec, k, rows)
+
+    def _search_shard(self, query_embedding: np.ndarray, k: int, category: str,
+                      row_range: Tuple[int, int], nprobe: int) -> Dict[str, float]:
+        """Nearest chunks within one category shard (or a team's range inside it)"""
+        start, end = row_range
+        query_vec = np.asarray(query_embedding, dtype=np.float32)
+        query_norm = np.linalg.norm(query_vec)
+        if start >= end or query_norm == 0:
+            return {}
+        query_vec = query_vec / query_norm
+
+        shard_index = self.ann_shards.get(category)
+        if shard_index is not None:
+            rows = shard_index.candidate_rows(query_vec, k, nprobe=nprobe, row_range=row_range)
+        else:
+            rows = np.arange(start, end)
+        return self._top_rows(query_vec, k, rows)
+
+    def _top_rows(self, query_vec: np.ndarray, k: int, rows: Optional[np.ndarray] = None) -> Dict[str, float]:
+        """
+        Top-k of the given rows (default: all rows) by cosine similarity to a normalized query
+
+        With an int8 copy, the rows are scored on the codes and only the best
+        ``k * QUANTIZED_RESCORE_MULTIPLIER`` are re-scored against the matrix.
+        """
+        if rows is not None and not len(rows):
+            return {}
+
+        if self.codes is not None:
+            if rows is None:
+                approx = quantized_scores(self.codes, self.scales, query_vec)
+                rows = np.arange(len(approx))
+            else:
+                approx = quantized_scores(self.codes[rows], None if self.scales is None else self.scales[rows],
+                                          query_vec)
+            shortlist = min(k * QUANTIZED_RESCORE_MULTIPLIER, len(rows))
+            if shortlist < len(rows):
+                rows = np.sort(rows[np.argpartition(-approx, shortlist - 1)[:shortlist]])
+
+        if rows is None:
+            similarities = quantized_scores(self.embeddings, None, query_vec)
+        else:
+            similarities = np.asarray(self.embeddings[rows], dtype=np.float32) @ query_vec
+        top = np.argsort(-similarities)[:k]
+        if rows is None:
+            return {self.chunk_ids[row]: float(similarities[row]) for row in top}
+        return {self.chunk_ids[rows[i]]: float(similarities[i]) for i in top}
@@ -13,8 +13,9 @@ import pandas as pd
 import logging
 import os
 from datetime import datetime
+from itertools import chain
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple, Union, Any
+from typing import Dict, Iterator, List, Optional, Tuple, Union, Any
 
 # Import curie_export configuration for Google Sheets setup
 from local_tools.curie_export.config import (
@@ -26,6 +27,9 @@ from local_tools.curie_export.config import (
 from utils.snowflake_connection import SnowflakeHook
 from utils.logger import get_logger
 
+# Rows sent per Google Sheets update while streaming a result
+SHEETS_WRITE_ROWS = 5000
+
 
 class SQLToSheetsExporter:
     """
@@ -58,6 +62,21 @@ class SQLToSheetsExporter:
             self.snowhook = SnowflakeHook()
         return self.snowhook
     
+    @staticmethod
+    def _too_many_rows(row_count: int, max_rows: int, exact: bool = True) -> Dict[str, Any]:
+        """Error result for a query exceeding the row limit (row_count is a lower bound unless exact)."""
+        returned = f"{row_count:,}" if exact else f"more than {max_rows:,}"
+        return {
+            "status": "error",
+            "error": "too_many_rows",
+            "message": (
+                f"Query returned {returned} rows, which exceeds the limit of {max_rows:,} rows. "
+                "Please add LIMIT clause to your query."
+            ),
+            "row_count": row_count,
+            "max_rows": max_rows,
+        }
+    
     def _get_oauth2_credentials(self):
         """Get OAuth2 credentials for Google Sheets API."""
         import json
@@ -139,6 +158,38 @@ class SQLToSheetsExporter:
         
         return df, execution_time
     
+    def stream_sql(self, query: str, method: str = 'pandas') -> Tuple[Iterator[pd.DataFrame], Optional[int], float]:
+        """
+        Execute SQL query and return its result as a stream of DataFrame batches.
+        
+        With the pandas method the result is fetched as Arrow batches, so only one batch
+        is held in memory at a time; other methods load the whole result as one batch.
+        
+        Args:
+            query: SQL query string to execute
+            method: Execution method ('pandas', 'spark', 'polars')
+            
+        Returns:
+            Tuple of (DataFrame batch iterator, total row count if known, execution_time_seconds)
+        """
+        if method != 'pandas':
+            df, execution_time = self.execute_sql(query, method)
+            return iter([df]), len(df), execution_time
+        
+        self.logger.info("Executing SQL query (streaming)...")
+        start_time = datetime.now()
+        
+        sf = self._get_snowflake_connection()
+        stream = sf.query_snowflake(query, method='batches')
+        
+        execution_time = (datetime.now() - start_time).total_seconds()
+        
+        self.logger.info(f"Query completed in {execution_time:.2f} seconds")
+        if stream.row_count is not None:
+            self.logger.info(f"Streaming {stream.row_count} rows and {len(stream.columns)} columns")
+        
+        return stream.iter_pandas(), stream.row_count, execution_time
+    
     def prepare_sheet_data(self, df: pd.DataFrame) -> List[List[Any]]:
         """
         Prepare DataFrame for Google Sheets export.
@@ -150,7 +201,19 @@ class SQLToSheetsExporter:
             List of lists suitable for Google Sheets
         """
         # Header row
-        sheet_data = [list(df.columns)]
+        return [list(df.columns)] + self.format_sheet_rows(df)
+    
+    def format_sheet_rows(self, df: pd.DataFrame) -> List[List[Any]]:
+        """
+        Format DataFrame rows (without the header) as Google Sheets values.
+        
+        Args:
+            df: DataFrame to format
+            
+        Returns:
+            List of row value lists
+        """
+        sheet_data = []
         
         # Data rows - handle different data types appropriately
         for _, row in df.iterrows():
@@ -174,13 +237,14 @@ class SQLToSheetsExporter:
         
         return sheet_data
     
-    def calculate_sheet_range(self, num_rows: int, num_cols: int) -> str:
+    def calculate_sheet_range(self, num_rows: int, num_cols: int, start_row: int = 1) -> str:
         """
         Calculate the A1 notation range for Google Sheets.
         
         Args:
             num_rows: Number of rows
             num_cols: Number of columns
+            start_row: First row of the range (1-based)
             
         Returns:
             Range string in A1 notation (e.g., "A1:Z100")
@@ -194,20 +258,18 @@ class SQLToSheetsExporter:
                 n //= 26
             return result
         
-        return f"A1:{col_num_to_letter(num_cols)}{num_rows}"
+        return f"A{start_row}:{col_num_to_letter(num_cols)}{start_row + num_rows - 1}"
     
-    def save_backup_csv(self, df: pd.DataFrame, sheet_name: str, 
-                       output_dir: Optional[str] = None) -> str:
+    def backup_csv_path(self, sheet_name: str, output_dir: Optional[str] = None) -> Path:
         """
-        Save DataFrame as CSV backup.
+        Timestamped path for a CSV backup, creating the output directory.
         
         Args:
-            df: DataFrame to save
             sheet_name: Name for the file
             output_dir: Directory to save to (defaults to OUTPUT_DIR)
             
         Returns:
-            Path to the saved file
+            Path of the backup file
         """
         if output_dir is None:
             output_dir = OUTPUT_DIR
@@ -218,7 +280,37 @@ class SQLToSheetsExporter:
         # Generate filename with timestamp
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
         filename = f"sql_export_{sheet_name}_{timestamp}.csv"
-        filepath = Path(output_dir) / filename
+        return Path(output_dir) / filename
+    
+    def write_sheet_rows(self, worksheet, rows: List[List[Any]], start_row: int, num_cols: int):
+        """
+        Write rows to a worksheet starting at start_row, growing the grid when needed.
+        
+        Args:
+            worksheet: gspread worksheet
+            rows: Row value lists
+            start_row: Sheet row of the first row (1-based)
+            num_cols: Number of columns
+        """
+        end_row = start_row + len(rows) - 1
+        if end_row > worksheet.row_count:
+            worksheet.add_rows(end_row - worksheet.row_count)
+        worksheet.update(self.calculate_sheet_range(len(rows), num_cols, start_row), rows)
+    
+    def save_backup_csv(self, df: pd.DataFrame, sheet_name: str, 
+                       output_dir: Optional[str] = None) -> str:
+        """
+        Save DataFrame as CSV backup.
+        
+        Args:
+            df: DataFrame to save
+            sheet_name: Name for the file
+            output_dir: Directory to save to (defaults to OUTPUT_DIR)
+            
+        Returns:
+            Path to the saved file
+        """
+        filepath = self.backup_csv_path(sheet_name, output_dir)
         
         # Save CSV
         df.to_csv(filepath, index=False)
@@ -237,7 +329,8 @@ class SQLToSheetsExporter:
         method: str = 'pandas',
         save_backup: bool = True,
         share_email: Optional[str] = None,
-        output_dir: Optional[str] = None
+        output_dir: Optional[str] = None,
+        max_rows: Optional[int] = None
     ) -> Dict[str, Any]:
         """
         Complete SQL to Google Sheets export workflow.
@@ -253,9 +346,12 @@ class SQLToSheetsExporter:
             save_backup: Whether to save a local CSV backup
             share_email: Email to share the spreadsheet with
             output_dir: Directory for backup files
+            max_rows: Maximum number of rows allowed (no limit if None)
             
         Returns:
-            Dictionary with export results and metadata
+            Dictionary with export results and metadata. The result is streamed into the
+            sheet, so google_sheets_data carries a 'preview' (header plus first 5 rows)
+            instead of the full 'data' payload.
         """
         # Validate inputs
         self.logger.info(f"🔧 CLASS: Received spreadsheet_id={spreadsheet_id}, create_spreadsheet={create_spreadsheet}")
@@ -284,10 +380,24 @@ class SQLToSheetsExporter:
             query_preview = final_query.replace('\n', ' ').strip()[:200]
             self.logger.info(f"SQL Query Preview: {query_preview}...")
             
-            # Execute SQL query
-            df, execution_time = self.execute_sql(final_query, method)
+            # Execute SQL query; the result is streamed batch by batch
+            frames, total_rows, execution_time = self.stream_sql(final_query, method)
+            if max_rows is not None and total_rows is not None and total_rows > max_rows:
+                return self._too_many_rows(total_rows, max_rows)
+            if max_rows is not None and total_rows is None:
+                # Without a row count, hold up to max_rows + 1 rows so the limit is
+                # enforced before the sheet is cleared or the backup is started
+                buffered = []
+                buffered_rows = 0
+                for frame in frames:
+                    buffered.append(frame)
+                    buffered_rows += len(frame)
+                    if buffered_rows > max_rows:
+                        return self._too_many_rows(buffered_rows, max_rows, exact=False)
+                frames = iter(buffered)
             
-            if len(df) == 0:
+            first_frame = next((frame for frame in frames if len(frame) > 0), None)
+            if first_frame is None:
                 self.logger.warning("Query returned no results")
                 return {
                     'status': 'warning',
@@ -296,16 +406,14 @@ class SQLToSheetsExporter:
                     'row_count': 0,
                     'col_count': 0
                 }
-            
-            # Prepare data for Google Sheets
-            self.logger.info("Preparing data for Google Sheets export...")
-            sheet_data = self.prepare_sheet_data(df)
-            range_str = self.calculate_sheet_range(len(sheet_data), len(sheet_data[0]))
-            
-            # Save backup if requested
-            backup_file = None
-            if save_backup:
-                backup_file = self.save_backup_csv(df, sheet_name, output_dir)
+            columns = list(first_frame.columns)
+            col_count = len(columns)
+            dataframe_info = {
+                'columns': columns,
+                'dtypes': first_frame.dtypes.to_dict(),
+                'preview': first_frame.head(5).to_dict('records')
+            }
+            sheet_preview = [columns] + self.format_sheet_rows(first_frame.head(5))
             
             # Get default share email if not provided
             if share_email is None:
@@ -317,8 +425,8 @@ class SQLToSheetsExporter:
                     # Fallback to existing helper if env not set
                     share_email = get_default_share_email()
             
-                        # Actually export to Google Sheets using gspread
-            sheets_result = None
+            # Open the destination sheet before streaming rows into it
+            worksheet = None
             sheets_error = None
             try:
                 self.logger.info(f"Exporting to Google Sheets...")
@@ -358,8 +466,9 @@ class SQLToSheetsExporter:
 
                 if spreadsheet_id:
                     # Create new sheet/tab if needed
+                    expected_rows = (total_rows if total_rows is not None else len(first_frame)) + 1
                     try:
-                        worksheet = spreadsheet.add_worksheet(title=sheet_name, rows=len(sheet_data)+10, cols=len(df.columns)+2)
+                        worksheet = spreadsheet.add_worksheet(title=sheet_name, rows=expected_rows+10, cols=col_count+2)
                         self.logger.info(f"Created new sheet: {sheet_name}")
                     except Exception as e:
                         # Sheet might already exist, try to get it
@@ -372,45 +481,89 @@ class SQLToSheetsExporter:
                             worksheet.update_title(sheet_name)
                             self.logger.info(f"Updated first sheet title to: {sheet_name}")
                     
-                    # Write data to sheet
                     worksheet.clear()  # Clear existing data
-                    worksheet.update(range_str, sheet_data)
-                    
-                    sheets_result = {
-                        'spreadsheet_id': spreadsheet_id,
-                        'sheet_name': sheet_name,
-                        'range': range_str,
-                        'updated_cells': len(sheet_data) * len(df.columns),
-                        'updated_rows': len(sheet_data),
-                        'updated_columns': len(df.columns)
-                    }
-                    
-                    self.logger.info(f"Successfully wrote {len(sheet_data)} rows to Google Sheets")
                 
             except Exception as e:
                 self.logger.error(f"Error writing to Google Sheets: {str(e)}")
                 sheets_error = str(e)
-                sheets_result = {'error': str(e)}
+                worksheet = None
+            
+            # Stream batches into the backup CSV and the sheet
+            self.logger.info("Streaming data to Google Sheets export...")
+            backup_file = None
+            backup = None
+            if save_backup:
+                backup_path = self.backup_csv_path(sheet_name, output_dir)
+                backup = open(backup_path, 'w', newline='')
+                backup_file = str(backup_path)
+            row_count = 0
+            pending_rows = [columns]
+            next_sheet_row = 1
+            try:
+                for frame in chain([first_frame], frames):
+                    if backup is not None:
+                        frame.to_csv(backup, index=False, header=row_count == 0)
+                    row_count += len(frame)
+                    
+                    if worksheet is None:
+                        continue
+                    pending_rows.extend(self.format_sheet_rows(frame))
+                    if len(pending_rows) >= SHEETS_WRITE_ROWS:
+                        try:
+                            self.write_sheet_rows(worksheet, pending_rows, next_sheet_row, col_count)
+                            next_sheet_row += len(pending_rows)
+                            pending_rows = []
+                        except Exception as e:
+                            self.logger.error(f"Error writing to Google Sheets: {str(e)}")
+                            sheets_error = str(e)
+                            worksheet = None
+                
+                if worksheet is not None and pending_rows:
+                    try:
+                        self.write_sheet_rows(worksheet, pending_rows, next_sheet_row, col_count)
+                    except Exception as e:
+                        self.logger.error(f"Error writing to Google Sheets: {str(e)}")
+                        sheets_error = str(e)
+                        worksheet = None
+            finally:
+                if backup is not None:
+                    backup.close()
+                    self.logger.info(f"Backup CSV saved to: {backup_file}")
+            
+            range_str = self.calculate_sheet_range(row_count + 1, col_count)
+            dataframe_info['shape'] = (row_count, col_count)
             
             # Check if Google Sheets operation succeeded
-            if sheets_error or (sheets_result and 'error' in sheets_result):
+            if sheets_error:
                 return {
                     'status': 'error',
                     'error': 'google_sheets_failed',
-                    'message': f'SQL executed successfully but Google Sheets export failed: {sheets_error or sheets_result.get("error", "Unknown error")}',
+                    'message': f'SQL executed successfully but Google Sheets export failed: {sheets_error}',
                     'execution_time': execution_time,
-                    'row_count': len(df),
-                    'col_count': len(df.columns),
+                    'row_count': row_count,
+                    'col_count': col_count,
                     'backup_file': backup_file
                 }
             
+            sheets_result = None
+            if worksheet is not None:
+                sheets_result = {
+                    'spreadsheet_id': spreadsheet_id,
+                    'sheet_name': sheet_name,
+                    'range': range_str,
+                    'updated_cells': (row_count + 1) * col_count,
+                    'updated_rows': row_count + 1,
+                    'updated_columns': col_count
+                }
+                self.logger.info(f"Successfully wrote {row_count + 1} rows to Google Sheets")
+            
             # Prepare return data
             self.logger.info(f"🔧 CLASS: Preparing result with spreadsheet_id={spreadsheet_id}")
             export_result = {
                 'status': 'success',
                 'execution_time': execution_time,
-                'row_count': len(df),
-                'col_count': len(df.columns),
+                'row_count': row_count,
+                'col_count': col_count,
                 'query_preview': query_preview,
                 'backup_file': backup_file,
                 'spreadsheet_id': spreadsheet_id,
@@ -421,22 +574,17 @@ class SQLToSheetsExporter:
                     'spreadsheet_id': spreadsheet_id,
                     'sheet_name': sheet_name,
                     'range': range_str,
-                    'data': sheet_data,
+                    'preview': sheet_preview,
                     'create_spreadsheet': create_spreadsheet,
                     'spreadsheet_title': spreadsheet_title,
                     'share_email': share_email
                 },
-                'dataframe_info': {
-                    'columns': list(df.columns),
-                    'dtypes': df.dtypes.to_dict(),
-                    'shape': df.shape,
-                    'preview': df.head(5).to_dict('records') if len(df) > 0 else []
-                }
+                'dataframe_info': dataframe_info
             }
             
             self.logger.info(f"Export completed successfully")
-            self.logger.info(f"  Rows: {len(df):,}")
-            self.logger.info(f"  Columns: {len(df.columns)}")
+            self.logger.info(f"  Rows: {row_count:,}")
+            self.logger.info(f"  Columns: {col_count}")
             self.logger.info(f"  Range: {range_str}")
             if backup_file:
                 self.logger.info(f"  Backup: {backup_file}")
@@ -482,26 +630,8 @@ def export_sql_to_sheets(
     print(f"🔧 WRAPPER: Called with spreadsheet_id={spreadsheet_id}")
     exporter = SQLToSheetsExporter()
     
-    # First execute the query to check row count
+    # The row limit is checked from the query's row count before anything is written
     try:
-        from utils.snowflake_connection import SnowflakeHook
-        snowhook = SnowflakeHook()
-        df = snowhook.query_snowflake(query, method="pandas")
-        row_count = len(df)
-        
-        # Check if row count exceeds limit
-        if row_count > max_rows:
-            return {
-                "status": "error",
-                "error": "too_many_rows",
-                "message": (
-                    f"Query returned {row_count:,} rows, which exceeds the limit of {max_rows:,} rows. "
-                    "Please add LIMIT clause to your query."
-                ),
-                "row_count": row_count,
-                "max_rows": max_rows,
-            }
-        
         # Determine if we need to create a new spreadsheet
         create_spreadsheet = spreadsheet_id is None
         print(f"🔧 WRAPPER: Before class call - spreadsheet_id={spreadsheet_id}, create_spreadsheet={create_spreadsheet}")
@@ -517,6 +647,7 @@ def export_sql_to_sheets(
             create_spreadsheet=create_spreadsheet,
             spreadsheet_title=spreadsheet_title,
             share_email=share_email,
+            max_rows=max_rows,
         )
         
         print(f"🔧 WRAPPER: After class call - result spreadsheet_id={result.get('spreadsheet_id')}")
@@ -13,14 +13,15 @@ from dotenv import load_dotenv
 from utils.snowflake_connection import SnowflakeHook
 from local_tools.table_context_agent.tyler_sources import (
     resolve_table_name,
-    fetch_table_overview,
-    fetch_columns_metadata,
-    fetch_columns_metadata_with_usage,
     fetch_top_sample_queries,
-    fetch_most_common_joins,
-    fetch_sample_queries_from_most_used_user,
     find_tables_by_name,
     find_best_fqn_via_usage,
+    table_overview_sql,
+    table_overview_from_df,
+    columns_metadata_sql,
+    columns_metadata_with_usage_sql,
+    most_common_joins_sql,
+    sample_queries_from_most_used_user_sql,
 )
 from local_tools.table_context_agent.snowflake_explorer import infer_granularity, enhanced_granularity_analysis
 from local_tools.table_context_agent.confluence_client import ConfluenceSearcher
@@ -383,7 +384,10 @@ def main(
     sample_row_limit: int = 10,
     print_only: bool = False,
     verbose: bool = False,
+    bypass_cache: bool = False,
 ) -> str | Path:
+    # Metadata lookups on Tyler's tables are served from the Snowflake result cache;
+    # bypass_cache re-runs them and refreshes the cached results
     # Load project .env for Snowflake/Confluence defaults as well
     try:
         project_root = Path(__file__).resolve().parents[2]
@@ -397,7 +401,7 @@ def main(
     if verbose:
         print(f"🔍 STEP 1: Resolving table name for '{table}'...")
     
-    with SnowflakeHook() as sf:
+    with SnowflakeHook(result_cache=True, bypass_cache=bypass_cache) as sf:
         full_table_name = resolve_table_name(sf, table, verbose=verbose)
         
         if verbose:
@@ -443,29 +447,38 @@ def main(
     if verbose:
         print(f"📊 STEP 3: Fetching metadata from Tyler's tables...")
     
-    with SnowflakeHook() as sf:
-        # Table metadata with formatted row counts
+    with SnowflakeHook(result_cache=True, bypass_cache=bypass_cache) as sf:
+        # The metadata queries are independent, so they run concurrently on the warehouse
         if verbose:
-            print(f"   📋 Fetching table metadata...")
-        overview = fetch_table_overview(sf, table_id.database, table_id.schema, table_id.table, verbose=verbose)
-        
-        # Enhanced column metadata with usage ranking
-        if verbose:
-            print(f"   📊 Fetching column metadata with usage ranking...")
-        columns_meta_with_usage = fetch_columns_metadata_with_usage(sf, full_table_name, verbose=verbose)
-        
-        # Most commonly joined tables
+            print(f"   📋 Fetching table metadata, column metadata with usage ranking, most common joins and sample queries...")
+        metadata_queries = {
+            # Table metadata with formatted row counts
+            "overview": table_overview_sql(table_id.database, table_id.schema, table_id.table),
+            # Enhanced column metadata with usage ranking
+            "columns_with_usage": columns_metadata_with_usage_sql(full_table_name),
+            # Most commonly joined tables
+            "joins": most_common_joins_sql(full_table_name, limit=10),
+            # Sample queries from most used user
+            "sample_queries": sample_queries_from_most_used_user_sql(full_table_name, limit=2),
+            # Legacy column metadata for granularity analysis compatibility
+            "columns": columns_metadata_sql(table_id.database, table_id.schema, table_id.table),
+        }
         if verbose:
-            print(f"   🔗 Fetching most common joins...")
-        common_joins = fetch_most_common_joins(sf, full_table_name, limit=10, verbose=verbose)
-        
-        # Sample queries from most used user
-        if verbose:
-            print(f"   📝 Fetching sample queries...")
-        sample_queries = fetch_sample_queries_from_most_used_user(sf, full_table_name, limit=2, verbose=verbose)
-        
-        # Legacy column metadata for granularity analysis compatibility
-        columns_meta = fetch_columns_metadata(sf, table_id.database, table_id.schema, table_id.table)
+            for name, query in metadata_queries.items():
+                print(f"      🔍 SQL ({name}): {query}")
+        results = sf.gather_queries(metadata_queries, return_exceptions=True)
+
+        # Table and column metadata are required; joins and sample queries are best effort
+        for name in ("overview", "columns_with_usage", "columns"):
+            if isinstance(results[name], Exception):
+                raise results[name]
+        overview = table_overview_from_df(results["overview"])
+        columns_meta_with_usage = results["columns_with_usage"].to_dict("records")
+        columns_meta = results["columns"].to_dict("records")
+        common_joins, sample_queries = [
+            [] if isinstance(results[name], Exception) or results[name].empty else results[name].to_dict("records")
+            for name in ("joins", "sample_queries")
+        ]
 
         # Initialize LLM for granularity analysis
         try:
@@ -575,6 +588,7 @@ if __name__ == "__main__":
     parser.add_argument("--sample-row-limit", type=int, default=10)
     parser.add_argument("--print-only", action="store_true", help="Print markdown instead of writing a file")
     parser.add_argument("--verbose", action="store_true", help="Show verbose output including SQL queries and LLM requests")
+    parser.add_argument("--bypass-cache", action="store_true", help="Re-run cached metadata queries against Snowflake")
     args = parser.parse_args()
 
     result = main(
@@ -585,6 +599,7 @@ if __name__ == "__main__":
         sample_row_limit=args.sample_row_limit,
         print_only=args.print_only,
         verbose=args.verbose,
+        bypass_cache=args.bypass_cache,
     )
     if args.print_only and isinstance(result, str):
         print(result)
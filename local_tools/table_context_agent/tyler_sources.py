@@ -89,9 +89,9 @@ def resolve_table_name(sf, table_input: str, verbose: bool = False) -> str:
     return table_input
 
 
-def fetch_table_overview(sf, database: str, schema: str, table: str, verbose: bool = False) -> Dict[str, Any]:
-    """Return core table-level metadata from Tyler tables with formatted row counts."""
-    query = f"""
+def table_overview_sql(database: str, schema: str, table: str) -> str:
+    """SQL for core table-level metadata from Tyler tables."""
+    return f"""
     SELECT 
         TABLE_CATALOG, TABLE_SCHEMA, TABLE_NAME, TABLE_OWNER, TABLE_TYPE, IS_TRANSIENT,
         ROW_COUNT, BYTES, RETENTION_TIME, CREATED, LAST_ALTERED, COMMENT
@@ -101,9 +101,10 @@ def fetch_table_overview(sf, database: str, schema: str, table: str, verbose: bo
       AND lower(TABLE_NAME)=lower('{table}')
     LIMIT 1
     """
-    if verbose:
-        print(f"      🔍 SQL: {query}")
-    df = sf.query_snowflake(query, method="pandas")
+
+
+def table_overview_from_df(df) -> Dict[str, Any]:
+    """Table overview dict from the table_overview_sql result, with formatted row counts."""
     if df.empty:
         return {}
     
@@ -115,12 +116,17 @@ def fetch_table_overview(sf, database: str, schema: str, table: str, verbose: bo
     return result
 
 
-def fetch_columns_metadata_with_usage(sf, full_table_name: str, verbose: bool = False) -> List[Dict[str, Any]]:
-    """
-    Return column-level metadata with usage ranking and all required fields.
-    This implements the enhanced column query from requirements.
-    """
-    query = f"""
+def fetch_table_overview(sf, database: str, schema: str, table: str, verbose: bool = False) -> Dict[str, Any]:
+    """Return core table-level metadata from Tyler tables with formatted row counts."""
+    query = table_overview_sql(database, schema, table)
+    if verbose:
+        print(f"      🔍 SQL: {query}")
+    return table_overview_from_df(sf.query_snowflake(query, method="pandas"))
+
+
+def columns_metadata_with_usage_sql(full_table_name: str) -> str:
+    """SQL for column-level metadata with usage ranking (the enhanced column query from requirements)."""
+    return f"""
     WITH usage AS (
         -- Aggregate usage data from sf_column_usage
         SELECT
@@ -169,15 +175,23 @@ def fetch_columns_metadata_with_usage(sf, full_table_name: str, verbose: bool =
         queries DESC,
         ordinal_position ASC
     """
+
+
+def fetch_columns_metadata_with_usage(sf, full_table_name: str, verbose: bool = False) -> List[Dict[str, Any]]:
+    """
+    Return column-level metadata with usage ranking and all required fields.
+    This implements the enhanced column query from requirements.
+    """
+    query = columns_metadata_with_usage_sql(full_table_name)
     if verbose:
         print(f"      🔍 SQL: {query}")
     df = sf.query_snowflake(query, method="pandas")
     return df.to_dict("records")
 
 
-def fetch_columns_metadata(sf, database: str, schema: str, table: str) -> List[Dict[str, Any]]:
-    """Return column-level metadata with data types and comments (legacy version)."""
-    query = f"""
+def columns_metadata_sql(database: str, schema: str, table: str) -> str:
+    """SQL for column-level metadata with data types and comments (legacy version)."""
+    return f"""
     SELECT 
         TABLE_CATALOG, TABLE_SCHEMA, TABLE_NAME, COLUMN_NAME, DATA_TYPE, ORDINAL_POSITION,
         CHARACTER_MAXIMUM_LENGTH, COMMENT
@@ -187,15 +201,17 @@ def fetch_columns_metadata(sf, database: str, schema: str, table: str) -> List[D
       AND lower(TABLE_NAME)=lower('{table}')
     ORDER BY ORDINAL_POSITION
     """
-    df = sf.query_snowflake(query, method="pandas")
+
+
+def fetch_columns_metadata(sf, database: str, schema: str, table: str) -> List[Dict[str, Any]]:
+    """Return column-level metadata with data types and comments (legacy version)."""
+    df = sf.query_snowflake(columns_metadata_sql(database, schema, table), method="pandas")
     return df.to_dict("records")
 
 
-def fetch_most_common_joins(sf, full_table_name: str, limit: int = 10, verbose: bool = False) -> List[Dict[str, Any]]:
-    """
-    Find most commonly joined tables using the enhanced join query from requirements.
-    """
-    query = f"""
+def most_common_joins_sql(full_table_name: str, limit: int = 10) -> str:
+    """SQL for the most commonly joined tables (the enhanced join query from requirements)."""
+    return f"""
     SELECT
         a.fully_qualified_table_name AS base_table,
         b.fully_qualified_table_name AS joined_table,
@@ -211,6 +227,13 @@ def fetch_most_common_joins(sf, full_table_name: str, limit: int = 10, verbose:
     ORDER BY query_count DESC
     LIMIT {limit}
     """
+
+
+def fetch_most_common_joins(sf, full_table_name: str, limit: int = 10, verbose: bool = False) -> List[Dict[str, Any]]:
+    """
+    Find most commonly joined tables using the enhanced join query from requirements.
+    """
+    query = most_common_joins_sql(full_table_name, limit)
     
     if verbose:
         print(f"      🔍 SQL: {query}")
@@ -222,12 +245,9 @@ def fetch_most_common_joins(sf, full_table_name: str, limit: int = 10, verbose:
         return []
 
 
-def fetch_sample_queries_from_most_used_user(sf, full_table_name: str, limit: int = 2, verbose: bool = False) -> List[Dict[str, Any]]:
-    """
-    Get sample queries from the most used user for the table.
-    Implements the sample query requirements.
-    """
-    query = f"""
+def sample_queries_from_most_used_user_sql(full_table_name: str, limit: int = 2) -> str:
+    """SQL for recent distinct queries of the table's most frequent user."""
+    return f"""
     WITH most_used_user AS (
         -- Find the user with the most queries for the given table
         SELECT dd_user
@@ -255,6 +275,14 @@ def fetch_sample_queries_from_most_used_user(sf, full_table_name: str, limit: in
     FROM recent_distinct_queries
     ORDER BY latest_execution_time DESC
     """
+
+
+def fetch_sample_queries_from_most_used_user(sf, full_table_name: str, limit: int = 2, verbose: bool = False) -> List[Dict[str, Any]]:
+    """
+    Get sample queries from the most used user for the table.
+    Implements the sample query requirements.
+    """
+    query = sample_queries_from_most_used_user_sql(full_table_name, limit)
     
     if verbose:
         print(f"      🔍 SQL: {query}")
@@ -17,6 +17,7 @@ setup(
         "mcp>=1.0.0",
         "pandas>=2.2.0",
         "numpy>=1.24.0", 
+        "pyarrow>=14.0.0",
         "snowflake-connector-python[pandas]>=3.6.0",
         "snowflake-snowpark-python>=1.9.0",
         "snowflake-sqlalchemy>=1.4.0",
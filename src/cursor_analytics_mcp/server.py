@@ -32,6 +32,7 @@ os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'  # Suppress TensorFlow warnings
 os.environ['PYARROW_IGNORE_TIMEZONE'] = '1'  # Suppress PyArrow warnings
 
 import json
+import threading
 from datetime import datetime
 from pathlib import Path
 from typing import Any, Dict, List, Optional
@@ -76,6 +77,11 @@ except ImportError as e:
 # Try to import dual-table hybrid search functionality
 try:
     from local_tools.document_indexer.dual_table_search import DualTableHybridSearcher
+    from local_tools.document_indexer.vector_index import LocalVectorIndex
+    from local_tools.document_indexer.bm25_index import InvertedBM25Index
+    from local_tools.document_indexer.embedding_generator import BGEEmbeddingGenerator
+    from local_tools.document_indexer.local_mirror import LocalMirror
+    from local_tools.document_indexer.config import SEARCH_MODE
     HYBRID_SEARCH_AVAILABLE = True
 except ImportError:
     logger.warning("Dual-table hybrid search not available. Document indexing may not be set up.")
@@ -195,23 +201,146 @@ def _build_fallback_sql(filter_condition: str, limit: int) -> str:
     ORDER BY latest_execution_time DESC
     """
 
+# Local memory-mapped vector index, loaded once per server process
+_local_vector_index = None
+_local_vector_index_checked = False
+
+
+def get_local_vector_index():
+    """
+    Load the local chunk embedding index built by index_documents_dual.py (once per process)
+    
+    Returns:
+        LocalVectorIndex instance or None if no local index has been built
+    """
+    global _local_vector_index, _local_vector_index_checked
+    
+    if not _local_vector_index_checked:
+        _local_vector_index_checked = True
+        vector_index = LocalVectorIndex()
+        if vector_index.load():
+            logger.info(f"Loaded local vector index with {len(vector_index.chunk_ids)} chunks")
+            _local_vector_index = vector_index
+        else:
+            logger.info("No local vector index found, semantic scoring will use Snowflake embeddings")
+    
+    return _local_vector_index
+
+
+# Local inverted BM25 index, loaded once per server process
+_local_bm25_index = None
+_local_bm25_index_checked = False
+
+
+def get_local_bm25_index():
+    """
+    Load the local BM25 index built by index_documents_dual.py (once per process)
+    
+    Returns:
+        InvertedBM25Index instance or None if no local index has been built
+    """
+    global _local_bm25_index, _local_bm25_index_checked
+    
+    if not _local_bm25_index_checked:
+        _local_bm25_index_checked = True
+        bm25_index = InvertedBM25Index()
+        if bm25_index.load():
+            logger.info(f"Loaded local BM25 index with {len(bm25_index.term_to_id)} terms")
+            _local_bm25_index = bm25_index
+        else:
+            logger.info("No local BM25 index found, keyword scoring will run in Snowflake")
+    
+    return _local_bm25_index
+
+
+def get_local_mirror():
+    """
+    Offline mirror of the document/chunk tables, according to DOCUMENT_SEARCH_MODE
+    
+    - "snowflake": always search Snowflake (returns None)
+    - "local": always search the local mirror
+    - "auto": use the local mirror when one has been built or synced
+    
+    Returns:
+        LocalMirror instance or None to search Snowflake
+    """
+    mode = SEARCH_MODE.lower()
+    if mode == "snowflake":
+        return None
+    
+    mirror = LocalMirror()
+    if mirror.exists():
+        return mirror
+    
+    if mode == "local":
+        logger.warning(f"DOCUMENT_SEARCH_MODE=local but no mirror at {mirror.path}; run local_mirror.py sync")
+    return None
+
+
+# Shared query embedding model (with its query embedding LRU), loaded once per server process
+_embedding_generator = None
+
+
+def get_embedding_generator():
+    """
+    Shared BGE embedding generator for all searches in this process
+    
+    Returns:
+        BGEEmbeddingGenerator instance (model loaded lazily or by preload_embedding_model)
+    """
+    global _embedding_generator
+    
+    if _embedding_generator is None:
+        _embedding_generator = BGEEmbeddingGenerator()
+    
+    return _embedding_generator
+
+
+def preload_embedding_model():
+    """Start loading the embedding model in a background thread so the first search doesn't wait for it"""
+    if not HYBRID_SEARCH_AVAILABLE:
+        return
+    
+    if os.getenv("PRELOAD_EMBEDDING_MODEL", "true").lower() in ("0", "false", "no"):
+        return
+    
+    logger.info("Preloading embedding model in background")
+    get_embedding_generator().load_model_async()
+
+
+# Process-wide searcher: one Snowflake session, model and set of index handles shared by all tools
+_hybrid_searcher = None
+_hybrid_searcher_lock = threading.Lock()
+
+
 def get_configured_hybrid_searcher():
     """
-    Get a properly configured DualTableHybridSearcher with error handling
+    Get the shared, properly configured DualTableHybridSearcher with error handling
+    
+    The searcher is built once per process; later calls only run a throttled
+    health check of its Snowflake session (reconnecting if it has expired).
     
     Returns:
         DualTableHybridSearcher instance or None if initialization fails
     """
+    global _hybrid_searcher
+    
     if not HYBRID_SEARCH_AVAILABLE:
         return None
     
     try:
-        # Explicit configuration for dual-table structure
-        searcher = DualTableHybridSearcher(database="proddb", schema="fionafan")
+        with _hybrid_searcher_lock:
+            if _hybrid_searcher is None:
+                # Explicit configuration for dual-table structure
+                _hybrid_searcher = DualTableHybridSearcher(
+                    database="proddb", schema="fionafan",
+                    vector_index=get_local_vector_index(), bm25_index=get_local_bm25_index(),
+                    embedding_generator=get_embedding_generator(), local_mirror=get_local_mirror()
+                )
+            searcher = _hybrid_searcher
         
         # Validate Snowflake connection
-        hook = searcher.get_snowflake_hook()
-        if not hook:
+        if not searcher.ensure_connection():
             logger.error("Failed to establish Snowflake connection")
             return None
             
@@ -221,28 +350,86 @@ def get_configured_hybrid_searcher():
         return None
 
 
-
 # ============================================================================
 # SNOWFLAKE OPERATIONS
 # ============================================================================
 
+# Byte budget for the JSON rows of one query response; larger results are paged
+DEFAULT_RESPONSE_MAX_BYTES = int(os.getenv("SNOWFLAKE_QUERY_RESPONSE_MAX_BYTES", 256 * 1024))
+# Rows converted to JSON at a time while filling a page
+_PAGE_SLICE_ROWS = 500
+
+
+def _json_records_page(tables, max_bytes: int):
+    """
+    JSON records of the leading rows of a stream of Arrow tables, within max_bytes.
+
+    At least one row is returned even if it alone exceeds the budget, so paging always
+    makes progress.
+
+    Returns:
+        Tuple of (list of JSON record strings, whether rows remain after the page)
+    """
+    records = []
+    size = 2  # Enclosing brackets
+    for table in tables:
+        for start in range(0, table.num_rows, _PAGE_SLICE_ROWS):
+            chunk = table.slice(start, _PAGE_SLICE_ROWS).to_pandas()
+            for line in chunk.to_json(orient="records", lines=True, date_format="iso").splitlines():
+                line_bytes = len(line.encode("utf-8")) + 1
+                if records and size + line_bytes > max_bytes:
+                    return records, True
+                records.append(line)
+                size += line_bytes
+    return records, False
+
+
+def _format_result_page(stream, offset: int, max_bytes: int) -> str:
+    """Format one page of an ArrowBatchStream, with a result handle when more rows remain."""
+    records, has_more = _json_records_page(stream, max_bytes)
+    data_json = "[" + ",".join(records) + "]"
+    total_rows = stream.row_count if stream.row_count is not None else offset + len(records)
+
+    if offset == 0 and not has_more:
+        return f"Query executed successfully. Returned {total_rows} rows.\n\nData (JSON):\n{data_json}"
+
+    first_row, last_row = offset + 1, offset + len(records)
+    response = (
+        f"Query executed successfully. Returned {total_rows} rows; "
+        f"showing rows {first_row}-{last_row} (response limit {max_bytes:,} bytes).\n"
+        f"Result handle: {stream.query_id}\n"
+    )
+    if has_more:
+        response += (
+            f"Next page: fetch_snowflake_result_page(result_handle=\"{stream.query_id}\", offset={last_row})\n"
+        )
+    response += f"\nSchema (JSON):\n{json.dumps(stream.schema)}\n\nData (JSON):\n{data_json}"
+    return response
+
+
 @mcp.tool
 def execute_snowflake_query(
     query: str,
     method: str = "pandas",
     database: Optional[str] = None,
     schema: Optional[str] = None,
-    warehouse: Optional[str] = None
+    warehouse: Optional[str] = None,
+    max_response_bytes: Optional[int] = None
 ) -> str:
     """
     Execute SQL queries on Snowflake. Operations can be for fethching data or executing non-select statements.
     
+    Results larger than the response budget are paged: the response holds the first
+    rows, the total row count, the schema and a result handle for
+    fetch_snowflake_result_page.
+    
     Args:
         query: SQL query to execute
         method: Data processing method (pandas, spark, polars)
         database: Database name (optional)
         schema: Schema name (optional)
         warehouse: Warehouse name (optional)
+        max_response_bytes: Byte budget for the returned rows (default: SNOWFLAKE_QUERY_RESPONSE_MAX_BYTES, 256 KB)
     
     Returns:
         Query results as formatted string
@@ -274,11 +461,9 @@ def execute_snowflake_query(
 
             try:
                 if method == "pandas" and is_select:
-                    result = sf.query_snowflake(query, method="pandas")
-                    result_json = result.to_json(orient="records", date_format="iso")
-                    return (
-                        f"Query executed successfully. Returned {len(result)} rows.\n\nData (JSON):\n{result_json}"
-                    )
+                    # Stream the result and stop reading once the page is full
+                    stream = sf.query_snowflake(query, method="batches")
+                    return _format_result_page(stream, 0, max_response_bytes or DEFAULT_RESPONSE_MAX_BYTES)
                 else:
                     sf.query_without_result(query)
                     return "Statement executed successfully. No result set returned."
@@ -303,6 +488,40 @@ def execute_snowflake_query(
 
 
 
+@mcp.tool
+def fetch_snowflake_result_page(
+    result_handle: str,
+    offset: int = 0,
+    max_response_bytes: Optional[int] = None
+) -> str:
+    """
+    Fetch a page of a paged execute_snowflake_query result.
+    
+    Only the result chunks holding the requested rows are downloaded. Snowflake keeps
+    query results for 24 hours.
+    
+    Args:
+        result_handle: Result handle (Snowflake query id) from execute_snowflake_query
+        offset: Number of rows to skip (the "offset" of the previous response's next page)
+        max_response_bytes: Byte budget for the returned rows (default: SNOWFLAKE_QUERY_RESPONSE_MAX_BYTES, 256 KB)
+    
+    Returns:
+        Rows from offset on, with the total row count, schema and next page offset
+    """
+    try:
+        if offset < 0:
+            return "Error fetching result page: offset must be >= 0"
+        
+        with SnowflakeHook() as sf:
+            stream = sf.fetch_query_results(result_handle, method="batches", offset=offset)
+            if stream.row_count is not None and offset >= stream.row_count and offset > 0:
+                return f"Offset {offset} is past the end of the result ({stream.row_count} rows)."
+            return _format_result_page(stream, offset, max_response_bytes or DEFAULT_RESPONSE_MAX_BYTES)
+    except Exception as e:
+        logger.error(f"Snowflake result page error: {str(e)}")
+        return f"Error fetching result page for '{result_handle}': {str(e)}"
+
+
 # ============================================================================
 # QUERY SEARCH
 # ============================================================================
@@ -310,7 +529,8 @@ def execute_snowflake_query(
 @mcp.tool
 def search_queries_by_table_name(
     table_name: str,
-    limit: int = 5
+    limit: int = 5,
+    bypass_cache: bool = False
 ) -> str:
     """
     Find the top most used queries for a specific table in the last 30 days.
@@ -318,6 +538,7 @@ def search_queries_by_table_name(
     Args:
         table_name: Full or partial table name (e.g., 'dimension_deliveries' or 'edw.finance.dimension_deliveries')
         limit: Maximum number of queries to return (default: 5)
+        bypass_cache: Re-run the usage queries instead of serving cached results (default: False)
     
     Returns:
         Formatted list of top queries for the table
@@ -326,7 +547,8 @@ def search_queries_by_table_name(
         # Import the table resolution function from tyler_sources
         from local_tools.table_context_agent.tyler_sources import resolve_table_name
         
-        with SnowflakeHook() as sf:
+        # Usage lookups are served from the local result cache when repeated
+        with SnowflakeHook(result_cache=True, bypass_cache=bypass_cache) as sf:
             # Step 1: Resolve the table name to fully qualified name
             try:
                 full_table_name = resolve_table_name(sf, table_name, verbose=False)
@@ -334,22 +556,22 @@ def search_queries_by_table_name(
                 # Fallback: use the input as-is if resolution fails
                 full_table_name = table_name
             
-            # Step 2: Try to find the top most used queries in the last 30 days
+            # Step 2: Find the top most used queries in the last 30 days, and the most
+            # active user's recent queries as a fallback; both run concurrently
             most_used_queries_sql = _build_most_used_queries_sql(
                 filter_condition=f"fully_qualified_table_name = '{full_table_name}'",
                 limit=limit
             )
+            fallback_sql = _build_fallback_sql(
+                filter_condition=f"fully_qualified_table_name = '{full_table_name}'",
+                limit=limit
+            )
             
-            result_df = sf.query_snowflake(most_used_queries_sql, method="pandas")
+            result_df, fallback_df = sf.gather_queries([most_used_queries_sql, fallback_sql])
             
-            # Step 3: If no frequently used queries found, find most active user and their recent queries
+            # Step 3: If no frequently used queries found, use the most active user's recent queries
             if result_df.empty:
-                fallback_sql = _build_fallback_sql(
-                    filter_condition=f"fully_qualified_table_name = '{full_table_name}'",
-                    limit=limit
-                )
-                
-                result_df = sf.query_snowflake(fallback_sql, method="pandas")
+                result_df = fallback_df
             
             # Step 4: Format the results
             if result_df.empty:
@@ -389,7 +611,8 @@ def search_queries_by_table_name(
 @mcp.tool
 def search_queries_by_keyword(
     keywords: List[str],
-    limit: int = 5
+    limit: int = 5,
+    bypass_cache: bool = False
 ) -> str:
     """
     Find the most frequently executed queries that contain **all** provided
@@ -399,6 +622,7 @@ def search_queries_by_keyword(
         keywords: List of keywords. Every keyword in this list must appear in
             the query text for a query to be counted.
         limit: Maximum number of queries to return (default 5).
+        bypass_cache: Re-run the usage queries instead of serving cached results.
 
     Returns:
         A formatted string that lists the top queries, their execution counts,
@@ -415,14 +639,14 @@ def search_queries_by_keyword(
         ]
         filter_condition = " AND ".join(keyword_conditions)
 
-        with SnowflakeHook() as sf:
+        with SnowflakeHook(result_cache=True, bypass_cache=bypass_cache) as sf:
             most_used_queries_sql = _build_most_used_queries_sql(filter_condition, limit)
-            result_df = sf.query_snowflake(most_used_queries_sql, method="pandas")
+            fallback_sql = _build_fallback_sql(filter_condition, limit)
+            result_df, fallback_df = sf.gather_queries([most_used_queries_sql, fallback_sql])
 
             # Fallback: pick queries from the most active user if no frequent queries found
             if result_df.empty:
-                fallback_sql = _build_fallback_sql(filter_condition, limit)
-                result_df = sf.query_snowflake(fallback_sql, method="pandas")
+                result_df = fallback_df
 
             if result_df.empty:
                 return (
@@ -1686,6 +1910,83 @@ def fetch_deep_dives(query: str, top_k: int = 5, team: Optional[str] = None, wri
         return f"Error fetching deep dives: {str(e)}. Please ensure the document index table exists and is populated."
 
 
+# Context types accepted by fetch_context_batch -> whether results carry context windows
+# (mirrors the single-type fetch_* tools)
+CONTEXT_TYPES_WITH_WINDOWS = {
+    "table_context": True,
+    "experiment_readouts": True,
+    "pod_queries": False,
+    "user_context": False,
+    "deep_dives": False,
+}
+
+
+@mcp.tool
+def fetch_context_batch(queries: List[str], context_types: List[str], top_k: int = 5,
+                        team: Optional[str] = None) -> str:
+    """
+    Run several context searches in one call using hybrid search (BM25 + embeddings).
+    Use this instead of calling the fetch_* searches back to back, e.g. table context,
+    pod queries and experiment readouts for the same question.
+    
+    Args:
+        queries: Natural language search queries
+        context_types: Context type per query, one of 'table_context', 'pod_queries',
+            'user_context', 'experiment_readouts', 'deep_dives'
+        top_k: Number of top results to return per query (default: 5)
+        team: Optional team/subcategory filter applied to every query (e.g., 'growth/nux')
+    
+    Returns:
+        Search results with relevance scores for each query, in order
+    """
+    try:
+        if not HYBRID_SEARCH_AVAILABLE:
+            return "Hybrid search not available. Please run document indexing first."
+        
+        if len(queries) != len(context_types):
+            return f"Error: got {len(queries)} queries but {len(context_types)} context types; pass one context type per query."
+        
+        unknown = sorted(set(context_types) - set(CONTEXT_TYPES_WITH_WINDOWS))
+        if unknown:
+            return f"Error: unknown context type(s) {', '.join(unknown)}. Use one of: {', '.join(CONTEXT_TYPES_WITH_WINDOWS)}"
+        
+        # Get configured searcher with validation
+        searcher = get_configured_hybrid_searcher()
+        if not searcher:
+            return "Error: Unable to initialize search system. Please check Snowflake connectivity and ensure the document index table exists."
+        
+        # One batched search per result shape (context windows vs single chunks)
+        results_by_position = {}
+        for with_context in (True, False):
+            positions = [i for i, context_type in enumerate(context_types)
+                         if CONTEXT_TYPES_WITH_WINDOWS[context_type] == with_context]
+            if not positions:
+                continue
+            batch_results = searcher.search_many(
+                [queries[i] for i in positions],
+                [context_types[i] for i in positions],
+                subcategories=team,
+                top_k=top_k,
+                with_context=with_context
+            )
+            results_by_position.update(zip(positions, batch_results))
+        
+        sections = []
+        for i, (query, context_type) in enumerate(zip(queries, context_types)):
+            results = results_by_position.get(i, [])
+            if results:
+                body = searcher.format_search_results(results, query)
+            else:
+                body = f"No {context_type} found for query: '{query}'."
+            sections.append(f"## {i + 1}. {context_type}: {query}\n\n{body}")
+        
+        return "\n\n".join(sections)
+            
+    except Exception as e:
+        logger.error(f"Fetch context batch error: {str(e)}")
+        return f"Error fetching context batch: {str(e)}. Please ensure the document index table exists and is populated."
+
+
 # @mcp.tool  # Hidden from MCP - use as local tool only
 def fetch_cursor_rules(rule_name: str) -> str:
     """
@@ -1730,7 +2031,8 @@ def describe_table(
     table_name: str,
     output_format: str = "markdown",
     sample_row_limit: int = 10,
-    verbose: bool = False
+    verbose: bool = False,
+    bypass_cache: bool = False
 ) -> str:
     """
     Generate comprehensive context documentation for a Snowflake table.
@@ -1744,6 +2046,7 @@ def describe_table(
         output_format: Output format - "markdown" or "json" 
         sample_row_limit: Number of sample rows for granularity analysis (1-20)
         verbose: Enable verbose logging for debugging
+        bypass_cache: Re-run metadata queries instead of serving cached results
         
     Returns:
         Generated table context as markdown text or JSON string
@@ -1766,7 +2069,8 @@ def describe_table(
             table=table_name,
             print_only=True,
             sample_row_limit=sample_row_limit,
-            verbose=verbose
+            verbose=verbose,
+            bypass_cache=bypass_cache
         )
         
         if output_format.lower() == "json":
@@ -2334,6 +2638,8 @@ def run_sql_text_on_databricks(
 
 def main():
     """Main entry point for the MCP server."""
+    preload_embedding_model()
+    
     # Disable banner to prevent it from breaking JSON-RPC protocol on stdout
     mcp.run(show_banner=False)
 
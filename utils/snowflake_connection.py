@@ -1,6 +1,9 @@
 import os
+import asyncio
 import datetime
-from typing import Optional, Union
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
 from pathlib import Path
 from dotenv import load_dotenv
 import pandas as pd
@@ -12,7 +15,13 @@ logging.getLogger('snowflake.connector.network').setLevel(logging.WARNING)
 
 import snowflake.connector
 from snowflake.connector.pandas_tools import write_pandas
+try:
+    from snowflake.connector.constants import FIELD_ID_TO_NAME
+except ImportError:
+    FIELD_ID_TO_NAME = {}
 from utils.logger import get_logger
+from utils.snowflake_pool import get_connection_pool, is_session_neutral, pooling_enabled
+from utils.snowflake_result_cache import get_result_cache
 logger = get_logger(__name__)
 try:
     from snowflake.sqlalchemy import URL
@@ -47,6 +56,144 @@ except ImportError:
     logger.warning("polars not available. Polars functionality will be disabled.")
     POLARS_AVAILABLE = False
 
+# pyarrow ships with snowflake-connector-python[pandas]
+try:
+    import pyarrow as pa
+    PYARROW_AVAILABLE = True
+except ImportError:
+    logger.warning("pyarrow not available. Arrow result streaming will be disabled.")
+    PYARROW_AVAILABLE = False
+
+_env_loaded = False
+_env_lock = threading.Lock()
+_async_executor: Optional[ThreadPoolExecutor] = None
+_async_executor_lock = threading.Lock()
+
+
+def load_snowflake_env():
+    """Load config/.env once per process (values from it override the shell environment)."""
+    global _env_loaded
+    with _env_lock:
+        if not _env_loaded:
+            env_file_path = Path(__file__).parent.parent / "config" / ".env"
+            load_dotenv(dotenv_path=env_file_path, override=True)
+            _env_loaded = True
+
+
+def get_async_executor() -> ThreadPoolExecutor:
+    """
+    Threads that wait for asynchronously submitted queries and fetch their results
+    (SNOWFLAKE_ASYNC_MAX_WORKERS, default 8). The queries themselves run on the warehouse.
+    """
+    global _async_executor
+    with _async_executor_lock:
+        if _async_executor is None:
+            try:
+                max_workers = int(os.getenv("SNOWFLAKE_ASYNC_MAX_WORKERS", 8))
+            except ValueError:
+                max_workers = 8
+            _async_executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="snowflake-results")
+        return _async_executor
+
+
+class ArrowBatchStream:
+    """
+    Query result streamed as pyarrow Tables from ``cursor.fetch_arrow_batches()``.
+
+    Snowflake returns large results in chunks; iterating the stream downloads and holds
+    one chunk at a time, so callers that write rows out as they go (CSV, Sheets, files)
+    never materialize the whole result. Column names are lowercased like the other
+    query_snowflake methods. Conversions are available per batch (``iter_pandas``,
+    ``iter_polars``) or for the whole result (``to_arrow``, ``to_pandas``, ``to_polars``);
+    Polars wraps the Arrow buffers without copying.
+
+    A stream can be consumed once, and only while the hook that produced it still holds
+    its connection (i.e. inside the ``with SnowflakeHook()`` block). With ``offset`` the
+    stream starts at that row and only the result chunks from there on are downloaded.
+    """
+
+    def __init__(self, cursor, offset: int = 0):
+        self.cursor = cursor
+        self.offset = offset
+        self.columns = [column[0].lower() for column in (cursor.description or [])]
+        # Snowflake reports the total row count as soon as the query finishes
+        rowcount = getattr(cursor, "rowcount", None)
+        self.row_count = rowcount if isinstance(rowcount, int) and rowcount >= 0 else None
+        self.rows_read = 0
+        self._consumed = False
+
+    @property
+    def query_id(self) -> Optional[str]:
+        """Snowflake query id of the result (fetch it again with fetch_query_results)."""
+        return getattr(self.cursor, "sfqid", None)
+
+    @property
+    def schema(self) -> List[Dict[str, Any]]:
+        """Column names with Snowflake types, from the result metadata."""
+        return [
+            {
+                "name": column[0].lower(),
+                "type": FIELD_ID_TO_NAME.get(column[1], str(column[1])),
+                "nullable": bool(column[6]) if len(column) > 6 else None,
+            }
+            for column in (self.cursor.description or [])
+        ]
+
+    def __iter__(self) -> Iterator["pa.Table"]:
+        if self._consumed:
+            raise RuntimeError("ArrowBatchStream can only be iterated once")
+        self._consumed = True
+        for table in self._tables():
+            table = table.rename_columns([name.lower() for name in table.column_names])
+            self.rows_read += table.num_rows
+            yield table
+
+    def _tables(self) -> Iterator["pa.Table"]:
+        if not self.offset:
+            yield from self.cursor.fetch_arrow_batches()
+            return
+        # Result batches know their row counts, so chunks before the offset are skipped unread
+        skip = self.offset
+        for batch in self.cursor.get_result_batches() or []:
+            if skip >= batch.rowcount:
+                skip -= batch.rowcount
+                continue
+            table = batch.to_arrow(self.cursor.connection)
+            yield table.slice(skip) if skip else table
+            skip = 0
+
+    def iter_pandas(self) -> Iterator[pd.DataFrame]:
+        """Yield each batch as a pandas DataFrame."""
+        for table in self:
+            # The batch is not used afterwards, so Arrow buffers are freed as columns convert
+            yield table.to_pandas(split_blocks=True, self_destruct=True)
+
+    def iter_polars(self):
+        """Yield each batch as a polars DataFrame (zero-copy)."""
+        if not POLARS_AVAILABLE:
+            raise RuntimeError("polars is not available. Please install it with 'pip install polars'")
+        for table in self:
+            yield pl.from_arrow(table)
+
+    def to_arrow(self) -> "pa.Table":
+        """Concatenate every batch into one Table (without copying the batches)."""
+        tables = list(self)
+        if not tables:
+            return pa.table({name: pa.array([], type=pa.null()) for name in self.columns})
+        # Integer columns can come back narrower in some chunks than in others
+        return pa.concat_tables(tables, promote_options="permissive")
+
+    def to_pandas(self) -> pd.DataFrame:
+        """The whole result as one pandas DataFrame, converted from Arrow in a single pass."""
+        return self.to_arrow().to_pandas(split_blocks=True, self_destruct=True)
+
+    def to_polars(self):
+        """The whole result as one polars DataFrame (zero-copy from Arrow)."""
+        if not POLARS_AVAILABLE:
+            raise RuntimeError("polars is not available. Please install it with 'pip install polars'")
+        return pl.from_arrow(self.to_arrow())
+
+
 class SnowflakeHook:
     # Class-level variable to store persistent Spark session
     _persistent_spark_session = None
@@ -102,6 +249,9 @@ class SnowflakeHook:
         spark_config: Optional[dict] = None,
         use_persistent_spark: bool = False,
         insecure_mode: bool = True,
+        use_pool: Optional[bool] = None,
+        result_cache: bool = False,
+        bypass_cache: bool = False,
     ):
         """
         Instantiate snowflake hook with connection parameters.
@@ -119,11 +269,16 @@ class SnowflakeHook:
             spark_config: Additional Spark configuration parameters (optional)
             use_persistent_spark: Whether to use a persistent Spark session (default: False)
             insecure_mode: Whether to use insecure mode for certificate validation (default: True)
+            use_pool: Borrow connections from the process-wide pool instead of opening and
+                closing a session per hook (default: SNOWFLAKE_POOL_ENABLED, on unless "false").
+                Use False for hooks that change session state they should not share.
+            result_cache: Serve repeated pandas queries from the disk-backed result cache
+                (opt-in; only queries on tables with a cache TTL are cached, see
+                utils.snowflake_result_cache)
+            bypass_cache: Default for query_snowflake's bypass_cache (always run queries,
+                refreshing their cached results)
         """
-        # First check for environment variables from shell profile for username and token
-        # These take highest priority
-        env_file_path = Path(__file__).parent.parent / "config" / ".env"
-        load_dotenv(dotenv_path=env_file_path, override=True)
+        load_snowflake_env()
         self.user = username or os.getenv("SNOWFLAKE_USER")
         self.database = database or os.getenv("SNOWFLAKE_DATABASE", "proddb")
         self.schema = schema or os.getenv("SNOWFLAKE_SCHEMA", "public")
@@ -132,6 +287,9 @@ class SnowflakeHook:
         self.account = os.getenv("SNOWFLAKE_ACCOUNT", "doordash")
         self.use_persistent_spark = use_persistent_spark
         self.token = token or os.getenv("SNOWFLAKE_PAT")
+        self.use_pool = pooling_enabled() if use_pool is None else use_pool
+        self.result_cache = get_result_cache() if result_cache else None
+        self.bypass_cache = bypass_cache
 
         # Validate required parameters
         self._validate_params()
@@ -150,6 +308,10 @@ class SnowflakeHook:
         # Initialize connection attributes
         self.conn = None
         self.cursor = None
+        self._connect_lock = threading.RLock()
+        # Set once the session may hold state (session parameters, variables, temp
+        # tables, a transaction) that must not reach the pool's next borrower
+        self._session_dirty = False
 
         # Setup Spark parameters if Spark is available
         if PYSPARK_AVAILABLE:
@@ -211,9 +373,12 @@ class SnowflakeHook:
         if missing_params:
             raise ValueError(f"Missing required Snowflake connection parameters: {', '.join(missing_params)}")
 
-    def connect(self):
+    def connect(self, validate: bool = False):
         """
-        Establish a connection to Snowflake.
+        Establish a connection to Snowflake (borrowed from the connection pool when pooling).
+
+        Args:
+            validate: Ping a pooled session before using it (see SnowflakeConnectionPool.acquire)
 
         Returns:
             The Snowflake connection.
@@ -221,24 +386,128 @@ class SnowflakeHook:
         Raises:
             Exception: If connection fails.
         """
+        if self.conn is not None:
+            self.close()
+
         try:
-            self.conn = snowflake.connector.connect(**self.params)
-            logger.info("Successfully connected to Snowflake")
+            if self.use_pool:
+                self.conn = get_connection_pool().acquire(self.params, validate=validate)
+                self._session_dirty = False
+                logger.debug("Borrowed pooled Snowflake connection")
+            else:
+                self.conn = snowflake.connector.connect(**self.params)
+                logger.info("Successfully connected to Snowflake")
             return self.conn
         except Exception as e:
             logger.error(f"Error connecting to Snowflake: {str(e)}")
             raise
 
-    def close(self):
-        """Close the Snowflake connection."""
+    # Error numbers Snowflake raises when a session or its token is no longer valid
+    SESSION_EXPIRED_ERRNOS = {390111, 390112, 390114}
+
+    @classmethod
+    def _is_session_expired(cls, error: Exception) -> bool:
+        return getattr(error, "errno", None) in cls.SESSION_EXPIRED_ERRNOS
+
+    def reconnect(self):
+        """Close and re-open the Snowflake connection (re-authenticates)."""
+        self.close(discard=True)
+        return self.connect(validate=True)
+
+    def ping(self) -> bool:
+        """
+        Check that the session is usable, reconnecting once if it has expired or been closed.
+
+        Returns:
+            bool: True if a trivial query succeeds, False otherwise
+        """
+        try:
+            self._execute("SELECT 1").fetchone()
+            return True
+        except Exception as e:
+            logger.warning(f"Snowflake health check failed: {str(e)}")
+            return False
+
+    def _cursor(self):
+        """A new cursor on the hook's connection, connecting first if needed."""
+        with self._connect_lock:
+            if not self.conn or self.conn.is_closed():
+                self.connect()
+            cursor = self.conn.cursor()
+            self.cursor = cursor
+            return cursor
+
+    def _track_statement(self, query: str):
+        """Mark the session as not reusable by other borrowers unless ``query`` is session-neutral."""
+        if not is_session_neutral(query):
+            self._session_dirty = True
+
+    def _execute(self, query: str, asynchronous: bool = False):
+        """
+        Execute a query on a new cursor, reconnecting once if the session has expired.
+
+        Args:
+            query: SQL query to execute
+            asynchronous: Submit the query with execute_async and return without waiting
+                for it (the query id is cursor.sfqid)
+
+        Returns:
+            The cursor holding the results (use it rather than self.cursor when
+            the hook is shared between threads).
+        """
+        def run(cursor):
+            self._track_statement(query)
+            if asynchronous:
+                cursor.execute_async(query)
+            else:
+                cursor.execute(query)
+            return cursor
+
+        try:
+            return run(self._cursor())
+        except snowflake.connector.errors.DatabaseError as e:
+            if not self._is_session_expired(e):
+                raise
+            logger.warning("Snowflake session expired, reconnecting")
+            with self._connect_lock:
+                self.reconnect()
+            return run(self._cursor())
+
+    def close(self, discard: bool = False):
+        """
+        Close the Snowflake connection, or return it to the pool when pooling.
+
+        Args:
+            discard: Close a pooled connection instead of returning it (e.g. expired session).
+                Sessions that ran a statement other than SELECT / WITH / SHOW / DESCRIBE /
+                EXPLAIN are always closed.
+        """
         if self.cursor:
-            self.cursor.close()
+            try:
+                self.cursor.close()
+            except Exception as e:
+                logger.warning(f"Error closing Snowflake cursor: {str(e)}")
             self.cursor = None
 
         if self.conn:
-            self.conn.close()
-            self.conn = None
-            logger.info("Snowflake connection closed")
+            conn, self.conn = self.conn, None
+            if self.use_pool:
+                discard = discard or self._session_dirty
+                self._session_dirty = False
+                get_connection_pool().release(self.params, conn, discard=discard)
+                logger.debug("Closed pooled Snowflake connection" if discard
+                             else "Returned Snowflake connection to the pool")
+            else:
+                conn.close()
+                logger.info("Snowflake connection closed")
+
+    def __del__(self):
+        # Hooks used without `with`/close() must not keep a pooled session borrowed forever
+        try:
+            if getattr(self, "conn", None) is not None and getattr(self, "use_pool", False):
+                self.close()
+        except Exception:
+            pass
 
     @staticmethod
     def create_optimized_spark_session(app_name: str = "SnowflakeHook",
@@ -288,7 +557,8 @@ class SnowflakeHook:
             logger.error(f"Failed to create optimized Spark session: {str(e)}")
             raise
 
-    def query_snowflake(self, query: str, method: Optional[str] = 'pandas'):
+    def query_snowflake(self, query: str, method: Optional[str] = 'pandas',
+                        cache_ttl: Optional[float] = None, bypass_cache: Optional[bool] = None):
         """
         Execute a query against Snowflake.
 
@@ -298,9 +568,17 @@ class SnowflakeHook:
                 - 'pandas': Uses the Snowflake connector with pandas (default)
                 - 'spark': Uses PySpark with optimized network settings for local execution
                 - 'polars': Uses Polars DataFrame library (if available)
+                - 'batches': Streams Arrow result batches; returns an ArrowBatchStream to
+                  iterate (pyarrow Tables) or convert with to_pandas()/to_polars()
+                - 'arrow': The whole result as one pyarrow Table
+            cache_ttl: Seconds to cache this query's result, overriding the table TTLs
+                (pandas method; caches even on a hook without result_cache)
+            bypass_cache: Run the query even if a cached result exists and store the fresh
+                result (default: the hook's bypass_cache)
 
         Returns:
-            pandas.DataFrame, pyspark.sql.DataFrame, polars.DataFrame: Query results
+            pandas.DataFrame, pyspark.sql.DataFrame, polars.DataFrame, pyarrow.Table,
+            ArrowBatchStream: Query results
             Return type depends on the method parameter
         """
 
@@ -331,25 +609,221 @@ class SnowflakeHook:
             except Exception as e:
                 logger.error(f"Error executing polars query: {str(e)}")
                 raise
+
         else:
-            # Pandas method
+            # Pandas method, or Arrow batches / table
+            if method not in ('batches', 'arrow'):
+                method = 'pandas'
+            ttl, cached = self._cached_result(query, method, cache_ttl, bypass_cache)
+            if cached is not None:
+                return cached
             try:
-                # Connect if not already connected
-                if not self.conn:
-                    self.connect()
+                # Execute query (connects if not already connected)
+                logger.info(f"Executing query ({method})")
+                result = self._fetch(self._execute(query), method)
+            except Exception as e:
+                logger.error(f"Error executing {method} query: {str(e)}")
+                raise
+            if ttl > 0:
+                self.result_cache_for(method, cache_ttl).put(query, self.params, result, ttl)
+            return result
+
+    @staticmethod
+    def _fetch(cursor, method: str = 'pandas'):
+        """
+        Results of an executed cursor: a pandas DataFrame, an ArrowBatchStream ('batches')
+        or a pyarrow Table ('arrow'), with lowercase column names.
+        """
+        if method in ('batches', 'arrow'):
+            if not PYARROW_AVAILABLE:
+                raise RuntimeError("pyarrow is not available. Please install it with 'pip install pyarrow'")
+            stream = ArrowBatchStream(cursor)
+            return stream if method == 'batches' else stream.to_arrow()
+
+        df = cursor.fetch_pandas_all()
+        # Convert column names to lowercase
+        df.columns = map(str.lower, df.columns)
+        return df
+
+    def result_cache_for(self, method: str, cache_ttl: Optional[float] = None):
+        """The result cache a query uses: pandas queries on a caching hook or with an explicit TTL."""
+        if method != 'pandas':
+            return None
+        if self.result_cache is None and cache_ttl is not None:
+            return get_result_cache()
+        return self.result_cache
+
+    def _cached_result(self, query: str, method: str, cache_ttl: Optional[float],
+                       bypass_cache: Optional[bool]) -> Tuple[float, Optional[pd.DataFrame]]:
+        """
+        Look a query up in the result cache.
 
-                # Execute query
-                logger.info("Executing query (pandas)")
-                self.cursor = self.conn.cursor()
-                self.cursor.execute(query)
-                df = self.cursor.fetch_pandas_all()
+        Returns:
+            Tuple of (TTL to cache the fresh result for, 0 if it is not cached; cached result or None)
+        """
+        cache = self.result_cache_for(method, cache_ttl)
+        if cache is None:
+            return 0.0, None
+        ttl = cache.ttl_for(query, cache_ttl)
+        if ttl <= 0:
+            return 0.0, None
+
+        if self.bypass_cache if bypass_cache is None else bypass_cache:
+            cache.record_bypass()
+            return ttl, None
+        df = cache.get(query, self.params)
+        if df is not None:
+            logger.info("Serving query from the result cache")
+        return ttl, df
+
+    def submit_query(self, query: str) -> str:
+        """
+        Submit a query without waiting for it to finish (cursor.execute_async).
 
-                # Convert column names to lowercase
-                df.columns = map(str.lower, df.columns)
-                return df
+        Args:
+            query: SQL query to execute
+
+        Returns:
+            str: Snowflake query id, for fetch_query_results
+        """
+        try:
+            cursor = self._execute(query, asynchronous=True)
+            logger.info(f"Submitted query {cursor.sfqid}")
+            return cursor.sfqid
+        except Exception as e:
+            logger.error(f"Error submitting query: {str(e)}")
+            raise
+
+    def fetch_query_results(self, query_id: str, method: str = 'pandas', offset: int = 0):
+        """
+        Wait for a submitted query and fetch its results (cursor.get_results_from_sfqid).
+
+        Snowflake keeps query results for 24 hours, so this also re-reads the result of
+        any earlier query of the same user (e.g. from ArrowBatchStream.query_id).
+
+        Args:
+            query_id: Snowflake query id from submit_query
+            method: 'pandas' (default), 'batches' or 'arrow', as in query_snowflake
+            offset: Skip this many leading rows without downloading the chunks holding them
+
+        Returns:
+            pandas.DataFrame, ArrowBatchStream or pyarrow.Table
+
+        Raises:
+            snowflake.connector.errors.ProgrammingError: If the query failed
+        """
+        cursor = self._cursor()
+        cursor.get_results_from_sfqid(query_id)
+        if not offset:
+            return self._fetch(cursor, method if method in ('batches', 'arrow') else 'pandas')
+
+        if not PYARROW_AVAILABLE:
+            raise RuntimeError("pyarrow is not available. Please install it with 'pip install pyarrow'")
+        stream = ArrowBatchStream(cursor, offset=offset)
+        if method == 'batches':
+            return stream
+        return stream.to_arrow() if method == 'arrow' else stream.to_pandas()
+
+    def query_snowflake_async(self, query: str, method: str = 'pandas',
+                              cache_ttl: Optional[float] = None, bypass_cache: Optional[bool] = None) -> Future:
+        """
+        Submit a query and return a Future of its results.
+
+        The query starts on the warehouse immediately; a background thread waits for it
+        and fetches the results, so several submitted queries run concurrently. Cached
+        results (see query_snowflake) complete the future without submitting anything.
+        Resolve the futures before the hook is closed.
+
+        Args:
+            query: SQL query to execute
+            method: 'pandas' (default), 'batches' or 'arrow'
+            cache_ttl: As in query_snowflake
+            bypass_cache: As in query_snowflake
+
+        Returns:
+            concurrent.futures.Future resolving to the query_snowflake result
+        """
+        if method not in ('batches', 'arrow'):
+            method = 'pandas'
+        ttl, cached = self._cached_result(query, method, cache_ttl, bypass_cache)
+        if cached is not None:
+            future = Future()
+            future.set_result(cached)
+            return future
+
+        query_id = self.submit_query(query)
+
+        def fetch():
+            try:
+                result = self.fetch_query_results(query_id, method)
             except Exception as e:
-                logger.error(f"Error executing pandas query: {str(e)}")
+                logger.error(f"Error fetching results of query {query_id}: {str(e)}")
                 raise
+            if ttl > 0:
+                self.result_cache_for(method, cache_ttl).put(query, self.params, result, ttl)
+            return result
+
+        return get_async_executor().submit(fetch)
+
+    async def aquery_snowflake(self, query: str, method: str = 'pandas',
+                               cache_ttl: Optional[float] = None, bypass_cache: Optional[bool] = None):
+        """asyncio version of query_snowflake; concurrent awaits overlap on the warehouse."""
+        loop = asyncio.get_running_loop()
+        # Submitting is a short round trip; run it off the event loop as well
+        future = await loop.run_in_executor(
+            None, lambda: self.query_snowflake_async(query, method, cache_ttl, bypass_cache)
+        )
+        return await asyncio.wrap_future(future)
+
+    def gather_queries(self, queries: Union[List[str], Dict[Any, str]], method: str = 'pandas',
+                       return_exceptions: bool = False, bypass_cache: Optional[bool] = None):
+        """
+        Run independent queries concurrently and wait for all of them.
+
+        Args:
+            queries: List of queries, or dict of name -> query
+            method: 'pandas' (default), 'batches' or 'arrow'
+            return_exceptions: Return a failed query's exception in its place instead of raising
+            bypass_cache: As in query_snowflake
+
+        Returns:
+            Results in the same shape as ``queries`` (list in order, or dict by name)
+
+        Raises:
+            Exception: The first failed query's error (after every query has finished),
+                unless return_exceptions is set
+        """
+        names = list(queries.keys()) if isinstance(queries, dict) else list(range(len(queries)))
+        texts = list(queries.values()) if isinstance(queries, dict) else list(queries)
+
+        futures = []
+        for query in texts:
+            try:
+                futures.append(self.query_snowflake_async(query, method, bypass_cache=bypass_cache))
+            except Exception as e:
+                # Submission failed (e.g. a compilation error); report it like a failed query
+                future = Future()
+                future.set_exception(e)
+                futures.append(future)
+        wait(futures)
+
+        results = []
+        for future in futures:
+            error = future.exception()
+            if error is not None and not return_exceptions:
+                raise error
+            results.append(error if error is not None else future.result())
+        return dict(zip(names, results)) if isinstance(queries, dict) else results
+
+    async def agather_queries(self, queries: Union[List[str], Dict[Any, str]], method: str = 'pandas',
+                              return_exceptions: bool = False, bypass_cache: Optional[bool] = None):
+        """asyncio version of gather_queries."""
+        texts = list(queries.values()) if isinstance(queries, dict) else list(queries)
+        results = await asyncio.gather(
+            *(self.aquery_snowflake(query, method, bypass_cache=bypass_cache) for query in texts),
+            return_exceptions=return_exceptions,
+        )
+        return dict(zip(queries.keys(), results)) if isinstance(queries, dict) else list(results)
 
     def query_without_result(self, query: str):
         """
@@ -359,11 +833,8 @@ class SnowflakeHook:
             query: SQL query to execute
         """
         try:
-            # Connect if not already connected
-            if not self.conn:
-                self.connect()
-            self.cursor = self.conn.cursor()
-            self.cursor.execute(query)
+            # Connects if not already connected
+            self._execute(query)
         except Exception as e:
             logger.error(f"Error executing query: {str(e)}")
             raise
@@ -426,6 +897,8 @@ class SnowflakeHook:
                     self.connect()
 
                 logger.info(f"Writing DataFrame to Snowflake table {table_name} using pandas")
+                # write_pandas creates a temporary stage (and possibly file format) in the session
+                self._session_dirty = True
                 success, num_chunks, num_rows, output = write_pandas(
                     conn=self.conn,
                     df=df,
@@ -684,6 +1157,7 @@ class SnowflakeHook:
         # Ensure we have a cursor
         if not hasattr(self, 'cursor') or self.cursor is None:
             self.cursor = self.conn.cursor()
+        self._track_statement(query)
         self.cursor.execute(query, params)
         return self.cursor.fetch_pandas_all()
 
@@ -0,0 +1,282 @@
+"""
+Process-wide pool of Snowflake connections.
+
+Opening a Snowflake session costs a TLS handshake plus authentication, which used to
+be paid by every ``with SnowflakeHook(...)`` block. ``SnowflakeConnectionPool`` keeps
+authenticated sessions per connection context (account, user, database, schema,
+warehouse, role) and hands them out again:
+
+- at most ``max_size`` sessions per context; further borrowers wait for a return
+- sessions idle for longer than ``idle_timeout`` seconds are closed
+- sessions run with ``client_session_keep_alive`` so the token does not lapse while
+  pooled, and a session idle for more than ``validate_after`` seconds is checked with
+  ``SELECT 1`` before reuse; a dead or expired session is replaced by a freshly
+  authenticated one without the caller noticing
+- a session whose database/schema/warehouse/role was changed by the borrower
+  (e.g. a ``USE`` statement) is closed on return instead of being shared
+- a session that ran anything but a single SELECT / WITH / SHOW / DESCRIBE / EXPLAIN
+  statement (``is_session_neutral``) may carry ALTER SESSION parameters, SET variables,
+  temporary tables or an open transaction, so ``SnowflakeHook`` closes it on return too
+"""
+
+import atexit
+import os
+import re
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
+
+import snowflake.connector
+
+from utils.logger import get_logger
+from utils.snowflake_result_cache import is_single_statement, normalize_sql
+
+logger = get_logger(__name__)
+
+PoolKey = Tuple[Optional[str], ...]
+
+_SESSION_NEUTRAL = re.compile(r'^\(*\s*(select|with|show|desc|describe|explain)\b')
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        logger.warning(f"Invalid value for {name}, using {default}")
+        return default
+
+
+def is_session_neutral(query: str) -> bool:
+    """Whether ``query`` is a single statement that leaves no state behind in the session."""
+    return bool(_SESSION_NEUTRAL.match(normalize_sql(query))) and is_single_statement(query)
+
+
+class _KeyState:
+    """Idle sessions and the number of open (idle + borrowed) sessions of one pool key."""
+
+    def __init__(self):
+        self.idle: Deque[Tuple[object, float]] = deque()  # (connection, returned_at), most recent last
+        self.open = 0
+
+
+class SnowflakeConnectionPool:
+    """Thread-safe pool of authenticated Snowflake connections keyed by connection context."""
+
+    def __init__(self, max_size: int = 8, idle_timeout: float = 600.0,
+                 validate_after: float = 60.0, acquire_timeout: float = 30.0):
+        """
+        Args:
+            max_size: Maximum open sessions per connection context
+            idle_timeout: Seconds an unused session stays open
+            validate_after: Idle seconds after which a session is pinged before reuse
+            acquire_timeout: Seconds to wait for a session when all are borrowed
+        """
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.validate_after = validate_after
+        self.acquire_timeout = acquire_timeout
+        self._states: Dict[PoolKey, _KeyState] = {}
+        self._condition = threading.Condition()
+        self._stats = {"created": 0, "reused": 0, "evicted": 0, "discarded": 0, "revalidated": 0}
+
+    @staticmethod
+    def key_for(params: dict) -> PoolKey:
+        """Pool key of a connection parameter dict (as built by SnowflakeHook)."""
+        return tuple(
+            str(params[name]).upper() if params.get(name) is not None else None
+            for name in ("account", "user", "database", "schema", "warehouse", "role")
+        )
+
+    def acquire(self, params: dict, validate: bool = False):
+        """
+        Borrow a connection for ``params``, reusing an idle session when possible.
+
+        Args:
+            params: snowflake.connector.connect parameters
+            validate: Ping a reused session however recently it was returned (used
+                after an expired-session error, when sibling sessions may be stale too)
+
+        Raises:
+            TimeoutError: If every session of this context stays borrowed for acquire_timeout seconds
+            Exception: If a new session cannot be opened
+        """
+        key = self.key_for(params)
+        deadline = time.monotonic() + self.acquire_timeout
+
+        while True:
+            with self._condition:
+                self._evict_idle()
+                state = self._states.setdefault(key, _KeyState())
+                while not state.idle and state.open >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise TimeoutError(
+                            f"No Snowflake connection available after {self.acquire_timeout:.0f}s "
+                            f"({self.max_size} in use for {key[2]}.{key[3]})"
+                        )
+                    self._condition.wait(remaining)
+                    self._evict_idle()
+
+                if state.idle:
+                    conn, returned_at = state.idle.pop()
+                else:
+                    # Reserve the slot before connecting outside the lock
+                    state.open += 1
+                    conn, returned_at = None, None
+
+            if conn is None:
+                try:
+                    conn = self._connect(params)
+                except Exception:
+                    self._forget(key)
+                    raise
+                return conn
+
+            if self._usable(conn, returned_at, validate):
+                with self._condition:
+                    self._stats["reused"] += 1
+                return conn
+
+            # Stale session: drop it and retry (re-authenticates through a new session)
+            self._close_quietly(conn)
+            self._forget(key)
+            with self._condition:
+                self._stats["revalidated"] += 1
+
+    def release(self, params: dict, conn, discard: bool = False):
+        """
+        Return a borrowed connection.
+
+        Args:
+            params: Parameters the connection was acquired with
+            conn: The connection
+            discard: Close the connection instead of pooling it (e.g. after an auth error)
+        """
+        key = self.key_for(params)
+        if discard or self._is_closed(conn) or not self._context_matches(conn, key):
+            self._close_quietly(conn)
+            self._forget(key)
+            with self._condition:
+                self._stats["discarded"] += 1
+            return
+
+        with self._condition:
+            state = self._states.setdefault(key, _KeyState())
+            state.idle.append((conn, time.monotonic()))
+            self._condition.notify()
+
+    def close_all(self):
+        """Close every idle session (borrowed sessions are closed when returned)."""
+        with self._condition:
+            idle = [conn for state in self._states.values() for conn, _ in state.idle]
+            for state in self._states.values():
+                state.open -= len(state.idle)
+                state.idle.clear()
+            self._condition.notify_all()
+        for conn in idle:
+            self._close_quietly(conn)
+
+    def stats(self) -> dict:
+        """Counters plus open/idle sessions per context (database.schema, warehouse, role)."""
+        with self._condition:
+            contexts = {
+                f"{key[2]}.{key[3]} ({key[4]}, {key[5]})": {"open": state.open, "idle": len(state.idle)}
+                for key, state in self._states.items() if state.open
+            }
+            return dict(self._stats, contexts=contexts)
+
+    def _connect(self, params: dict):
+        conn = snowflake.connector.connect(client_session_keep_alive=True, **params)
+        with self._condition:
+            self._stats["created"] += 1
+        logger.info("Opened pooled Snowflake connection")
+        return conn
+
+    def _forget(self, key: PoolKey):
+        """Give back the slot of a session that was closed or never opened."""
+        with self._condition:
+            state = self._states.get(key)
+            if state is not None:
+                state.open = max(state.open - 1, 0)
+            self._condition.notify()
+
+    def _evict_idle(self):
+        """Close sessions idle for longer than idle_timeout (caller holds the lock)."""
+        cutoff = time.monotonic() - self.idle_timeout
+        for state in self._states.values():
+            while state.idle and state.idle[0][1] < cutoff:
+                conn, _ = state.idle.popleft()
+                state.open -= 1
+                self._stats["evicted"] += 1
+                # Closing is a network call; do it off the lock's critical path
+                threading.Thread(target=self._close_quietly, args=(conn,), daemon=True).start()
+
+    def _usable(self, conn, returned_at: float, validate: bool = False) -> bool:
+        if self._is_closed(conn):
+            return False
+        if not validate and time.monotonic() - returned_at < self.validate_after:
+            return True
+        try:
+            cursor = conn.cursor()
+            try:
+                cursor.execute("SELECT 1")
+            finally:
+                cursor.close()
+            return True
+        except Exception as e:
+            logger.info(f"Pooled Snowflake session is no longer valid, reconnecting: {str(e)}")
+            return False
+
+    @staticmethod
+    def _context_matches(conn, key: PoolKey) -> bool:
+        """False if the borrower switched the session's database/schema/warehouse/role."""
+        for attribute, expected in zip(("database", "schema", "warehouse", "role"), key[2:]):
+            current = getattr(conn, attribute, None)
+            if expected is not None and current is not None and str(current).upper() != expected:
+                return False
+        return True
+
+    @staticmethod
+    def _is_closed(conn) -> bool:
+        try:
+            return conn.is_closed()
+        except Exception:
+            return True
+
+    @staticmethod
+    def _close_quietly(conn):
+        try:
+            conn.close()
+        except Exception as e:
+            logger.warning(f"Error closing Snowflake connection: {str(e)}")
+
+
+_pool: Optional[SnowflakeConnectionPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_connection_pool() -> SnowflakeConnectionPool:
+    """
+    The process-wide pool, created on first use.
+
+    Sized by SNOWFLAKE_POOL_MAX_SIZE (default 8), SNOWFLAKE_POOL_IDLE_TIMEOUT_SECONDS
+    (600), SNOWFLAKE_POOL_VALIDATE_AFTER_SECONDS (60) and
+    SNOWFLAKE_POOL_ACQUIRE_TIMEOUT_SECONDS (30).
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = SnowflakeConnectionPool(
+                max_size=int(_env_float("SNOWFLAKE_POOL_MAX_SIZE", 8)),
+                idle_timeout=_env_float("SNOWFLAKE_POOL_IDLE_TIMEOUT_SECONDS", 600),
+                validate_after=_env_float("SNOWFLAKE_POOL_VALIDATE_AFTER_SECONDS", 60),
+                acquire_timeout=_env_float("SNOWFLAKE_POOL_ACQUIRE_TIMEOUT_SECONDS", 30),
+            )
+            atexit.register(_pool.close_all)
+        return _pool
+
+
+def pooling_enabled() -> bool:
+    """Pooling is on unless SNOWFLAKE_POOL_ENABLED is false/0/no."""
+    return os.getenv("SNOWFLAKE_POOL_ENABLED", "true").strip().lower() not in ("false", "0", "no")
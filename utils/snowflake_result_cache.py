@@ -0,0 +1,369 @@
+"""
+Disk-backed cache of Snowflake query results.
+
+Many tools re-run the same metadata lookups (``tyleranderson.sf_tables_full``,
+``sf_columns``, ``sf_column_usage``, ``sf_table_usage``) verbatim across calls and
+sessions. ``SnowflakeResultCache`` stores their results as compressed Parquet files:
+
+- entries are keyed by a fingerprint of the normalized SQL (comments dropped,
+  whitespace collapsed, unquoted text lowercased) plus the connection context
+  (account, user, role, database, schema) the query resolves names against
+- a query's TTL is the explicit per-query TTL if given, else the shortest TTL of the
+  tables it reads; tables without a configured TTL use ``default_ttl``, which is 0
+  (not cached) unless configured, so only queries on known slow-changing tables are
+  cached by default
+- only single read-only statements (SELECT / WITH) are cached, and only when every
+  table they read can be named: comma joins (``FROM a, b``), table functions, stages
+  and ``IDENTIFIER()`` references make the query uncacheable unless an explicit TTL
+  is given
+- the cache is bounded by ``max_bytes``; the least recently used entries go first
+"""
+
+import hashlib
+import os
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import pandas as pd
+
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PARQUET_AVAILABLE = True
+except ImportError:
+    logger.warning("pyarrow not available. Snowflake result caching will be disabled.")
+    PARQUET_AVAILABLE = False
+
+DEFAULT_CACHE_DIR = Path.home() / ".cache" / "cursor-analytics-mcp" / "snowflake_results"
+
+# Metadata tables refreshed at most daily; usage tables shift with CURRENT_DATE windows
+DEFAULT_TABLE_TTLS = {
+    "tyleranderson.sf_tables_full": 24 * 3600,
+    "tyleranderson.sf_columns": 24 * 3600,
+    "tyleranderson.sf_column_usage": 6 * 3600,
+    "tyleranderson.sf_table_usage": 6 * 3600,
+}
+
+_SQL_TOKEN = re.compile(
+    r"(?P<string>'(?:[^'\\]|\\.|'')*')"
+    r"|(?P<quoted>\"(?:[^\"]|\"\")*\")"
+    r"|(?P<comment>--[^\n]*|//[^\n]*|/\*.*?\*/)"
+    r"|(?P<space>\s+)"
+    r"|(?P<other>[^'\"\s/-]+|[/-])",
+    re.DOTALL,
+)
+_TABLE_REFERENCE = re.compile(r'\b(?:from|join)\s+((?:"[^"]+"|[\w$]+)(?:\s*\.\s*(?:"[^"]+"|[\w$]+))*)')
+_CTE_NAME = re.compile(r'\b([\w$]+)\s+as\s*\(')
+_READ_ONLY = re.compile(r'^\(*\s*(select|with)\b')
+_SQL_WORD = re.compile(r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"]|\"\")*\"|[\w$]+|\S")
+# Keywords ending a FROM clause at its parenthesis level
+_FROM_CLAUSE_END = frozenset({
+    "where", "group", "having", "qualify", "order", "limit", "offset", "fetch",
+    "union", "intersect", "except", "minus", "window",
+})
+# FROM/JOIN items that are not a table name _TABLE_REFERENCE can resolve
+_NOT_A_TABLE = frozenset({"table", "identifier", "lateral", "values", "@", "$"})
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        logger.warning(f"Invalid value for {name}, using {default}")
+        return default
+
+
+def normalize_sql(query: str) -> str:
+    """SQL with comments removed, whitespace collapsed and unquoted text lowercased."""
+    parts = []
+    for match in _SQL_TOKEN.finditer(query):
+        kind = match.lastgroup
+        if kind in ("comment", "space"):
+            if parts and parts[-1] != " ":
+                parts.append(" ")
+        elif kind == "other":
+            parts.append(match.group().lower())
+        else:
+            parts.append(match.group())
+    return "".join(parts).strip().rstrip(";").strip()
+
+
+def is_single_statement(query: str) -> bool:
+    """False if ``query`` holds more than one statement (a ';' outside literals and comments)."""
+    code = "".join(match.group() for match in _SQL_TOKEN.finditer(query) if match.lastgroup == "other")
+    return ";" not in code.rstrip(";")
+
+
+def referenced_tables(normalized_query: str) -> List[str]:
+    """Tables read by a normalized query (CTE names excluded), as lowercase dotted names."""
+    ctes = set(_CTE_NAME.findall(normalized_query))
+    tables = []
+    for reference in _TABLE_REFERENCE.findall(normalized_query):
+        name = ".".join(part.strip().strip('"').lower() for part in reference.split("."))
+        if name not in ctes and name not in tables:
+            tables.append(name)
+    return tables
+
+
+def has_unresolved_tables(normalized_query: str) -> bool:
+    """
+    Whether a normalized query reads tables ``referenced_tables`` does not report.
+
+    True for comma joins (a ',' directly in a FROM clause, e.g. ``FROM a x, b y``) and for
+    FROM/JOIN items that are table functions, stages, literals or IDENTIFIER() references.
+    """
+    in_from = [False]  # Per parenthesis level: inside a FROM clause
+    expect_item = False
+    for token in _SQL_WORD.findall(normalized_query):
+        if expect_item:
+            expect_item = False
+            if token in _NOT_A_TABLE or token.startswith("'"):
+                return True
+        if token == "(":
+            in_from.append(False)
+        elif token == ")":
+            if len(in_from) > 1:
+                in_from.pop()
+        elif token in ("from", "join"):
+            in_from[-1] = True
+            expect_item = True
+        elif token in _FROM_CLAUSE_END:
+            in_from[-1] = False
+        elif token == "," and in_from[-1]:
+            return True
+    return False
+
+
+def parse_table_ttls(value: Optional[str]) -> Dict[str, float]:
+    """Parse "schema.table=seconds,other_table=seconds" (SNOWFLAKE_RESULT_CACHE_TABLE_TTLS)."""
+    ttls = {}
+    for item in (value or "").split(","):
+        if not item.strip():
+            continue
+        name, _, seconds = item.partition("=")
+        try:
+            ttls[name.strip().lower()] = float(seconds)
+        except ValueError:
+            logger.warning(f"Ignoring invalid table TTL: {item.strip()}")
+    return ttls
+
+
+class SnowflakeResultCache:
+    """Thread-safe Parquet cache of query results keyed by SQL fingerprint and connection context."""
+
+    def __init__(self, cache_dir: Path = DEFAULT_CACHE_DIR, default_ttl: float = 0.0,
+                 table_ttls: Optional[Dict[str, float]] = None, max_bytes: int = 512 * 1024 * 1024):
+        """
+        Args:
+            cache_dir: Directory holding the Parquet files
+            default_ttl: Seconds to cache results of tables without a configured TTL (0: never)
+            table_ttls: Seconds to cache results per table ("schema.table" or "database.schema.table")
+            max_bytes: Total size of cached files before the least recently used are removed
+        """
+        self.cache_dir = Path(cache_dir)
+        self.default_ttl = default_ttl
+        self.table_ttls = {name.lower(): ttl for name, ttl in (table_ttls or {}).items()}
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "expired": 0, "stores": 0, "bypassed": 0, "errors": 0}
+
+    @staticmethod
+    def context_for(params: dict) -> Tuple[Optional[str], ...]:
+        """Connection context that affects query results (the warehouse does not)."""
+        return tuple(
+            str(params[name]).upper() if params.get(name) is not None else None
+            for name in ("account", "user", "role", "database", "schema")
+        )
+
+    def key_for(self, query: str, params: dict) -> str:
+        fingerprint = normalize_sql(query) + "\x00" + "\x00".join(str(part) for part in self.context_for(params))
+        return hashlib.sha256(fingerprint.encode("utf-8")).hexdigest()
+
+    def ttl_for(self, query: str, ttl: Optional[float] = None) -> float:
+        """
+        Seconds to cache the result of ``query`` (0 if it should not be cached).
+
+        Args:
+            query: SQL query
+            ttl: Explicit TTL for this query, overriding the table TTLs
+        """
+        normalized = normalize_sql(query)
+        if not _READ_ONLY.match(normalized) or not is_single_statement(query):
+            return 0.0
+        if ttl is not None:
+            return max(ttl, 0.0)
+        tables = referenced_tables(normalized)
+        if not tables or has_unresolved_tables(normalized):
+            return 0.0
+        return min(self._table_ttl(table) for table in tables)
+
+    def _table_ttl(self, table: str) -> float:
+        parts = table.split(".")
+        for name, ttl in self.table_ttls.items():
+            configured = name.split(".")
+            # A reference may be more or less qualified than the configured name
+            common = min(len(parts), len(configured))
+            if parts[-common:] == configured[-common:]:
+                return ttl
+        return self.default_ttl
+
+    def get(self, query: str, params: dict) -> Optional[pd.DataFrame]:
+        """Cached result of ``query`` under ``params``, or None if missing or expired."""
+        path = self._path(self.key_for(query, params))
+        try:
+            metadata = pq.read_schema(path).metadata or {}
+            expires_at = float(metadata.get(b"expires_at", 0))
+            if expires_at <= time.time():
+                self._count("expired")
+                self._remove(path)
+                return None
+            df = pq.read_table(path).to_pandas()
+            os.utime(path)  # Recently used entries survive size-based pruning
+        except FileNotFoundError:
+            self._count("misses")
+            return None
+        except Exception as e:
+            logger.warning(f"Unreadable cached Snowflake result {path.name}: {str(e)}")
+            self._count("errors")
+            self._remove(path)
+            return None
+
+        self._count("hits")
+        return df
+
+    def put(self, query: str, params: dict, df: pd.DataFrame, ttl: float) -> bool:
+        """
+        Store a query result for ``ttl`` seconds.
+
+        Returns:
+            bool: True if the result was written
+        """
+        if ttl <= 0:
+            return False
+        path = self._path(self.key_for(query, params))
+        try:
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            table = table.replace_schema_metadata(dict(
+                table.schema.metadata or {},
+                expires_at=str(time.time() + ttl),
+                query=normalize_sql(query)[:2000],
+            ))
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+            pq.write_table(table, tmp_path, compression="zstd")
+            os.replace(tmp_path, path)
+        except Exception as e:
+            # e.g. object columns pyarrow cannot convert; the result is simply not cached
+            logger.warning(f"Could not cache Snowflake result: {str(e)}")
+            self._count("errors")
+            return False
+
+        self._count("stores")
+        self._prune()
+        return True
+
+    def record_bypass(self):
+        self._count("bypassed")
+
+    def invalidate(self, query: str, params: dict):
+        """Drop the cached result of one query."""
+        self._remove(self._path(self.key_for(query, params)))
+
+    def clear(self):
+        """Remove every cached result."""
+        for path in self._entries():
+            self._remove(path)
+
+    def stats(self) -> dict:
+        """Hit/miss counters plus the number and total size of cached results."""
+        entries = list(self._entries())
+        size = sum(self._size(path) for path in entries)
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"] + self._stats["expired"]
+            return dict(self._stats, entries=len(entries), bytes=size,
+                        hit_rate=self._stats["hits"] / lookups if lookups else 0.0)
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.parquet"
+
+    def _entries(self) -> Iterable[Path]:
+        if not self.cache_dir.exists():
+            return []
+        return self.cache_dir.glob("*/*.parquet")
+
+    def _prune(self):
+        """Remove the least recently used entries while the cache exceeds max_bytes."""
+        entries = []
+        for path in self._entries():
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
+
+    def _count(self, name: str):
+        with self._lock:
+            self._stats[name] += 1
+
+    @staticmethod
+    def _size(path: Path) -> int:
+        try:
+            return path.stat().st_size
+        except FileNotFoundError:
+            return 0
+
+    @staticmethod
+    def _remove(path: Path):
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"Could not remove cached Snowflake result {path.name}: {str(e)}")
+
+
+_cache: Optional[SnowflakeResultCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_result_cache() -> Optional[SnowflakeResultCache]:
+    """
+    The process-wide result cache, created on first use (None if disabled or pyarrow is missing).
+
+    Configured by SNOWFLAKE_RESULT_CACHE_DIR, SNOWFLAKE_RESULT_CACHE_DEFAULT_TTL_SECONDS
+    (default 0: only tables with a TTL are cached), SNOWFLAKE_RESULT_CACHE_TABLE_TTLS
+    ("schema.table=seconds,..."; added to / overriding the tyleranderson metadata table
+    defaults) and SNOWFLAKE_RESULT_CACHE_MAX_MB (512).
+    """
+    global _cache
+    if not PARQUET_AVAILABLE or not result_cache_enabled():
+        return None
+    with _cache_lock:
+        if _cache is None:
+            table_ttls = dict(DEFAULT_TABLE_TTLS)
+            table_ttls.update(parse_table_ttls(os.getenv("SNOWFLAKE_RESULT_CACHE_TABLE_TTLS")))
+            _cache = SnowflakeResultCache(
+                cache_dir=Path(os.getenv("SNOWFLAKE_RESULT_CACHE_DIR") or DEFAULT_CACHE_DIR).expanduser(),
+                default_ttl=_env_float("SNOWFLAKE_RESULT_CACHE_DEFAULT_TTL_SECONDS", 0),
+                table_ttls=table_ttls,
+                max_bytes=int(_env_float("SNOWFLAKE_RESULT_CACHE_MAX_MB", 512) * 1024 * 1024),
+            )
+        return _cache
+
+
+def result_cache_enabled() -> bool:
+    """Hooks that opt into caching use it unless SNOWFLAKE_RESULT_CACHE_ENABLED is false/0/no."""
+    return os.getenv("SNOWFLAKE_RESULT_CACHE_ENABLED", "true").strip().lower() not in ("false", "0", "no")